@@ -297,14 +297,10 @@ class Client(object):
 
     def _get_maxLevel(self):
         if self._maxLevel is None:
-            if self.groups and len(self.groups):
-                m = -1
-                for g in self.groups:
-                    if g.level > m:
-                        m = g.level
-                        self._maxGroup = g
-
-                self._maxLevel = m
+            group = self.console.storage.getMaxGroup(self._groupBits)
+            if group is not None:
+                self._maxGroup = group
+                self._maxLevel = group.level
             elif self._tempLevel:
                 self._maxGroup = Group(id=-1, name='Unspecified', level=self._tempLevel)
                 return self._tempLevel
@@ -436,13 +432,24 @@ class Client(object):
                 self.authed = False
             elif not self._guid:
                 self._guid = guid
+                self._reindex()
         else:
             self.authed = False
-            self._guid = ''
+            if self._guid:
+                self._guid = ''
+                self._reindex()
 
     def _get_guid(self):
         return self._guid
 
+    def _reindex(self):
+        """
+        Update the online clients indexes after a name or GUID change.
+        """
+        clients = getattr(self.console, 'clients', None)
+        if isinstance(clients, Clients):
+            clients.reindex(self)
+
     guid = property(_get_guid, _set_guid)
 
     # -----------------------
@@ -554,6 +561,7 @@ class Client(object):
         self.makeAlias(self._name)
         self._name = newName
         self._exactName = name + '^7'
+        self._reindex()
 
         if self.console and self.authed:
             self.console.queueEvent(self.console.getEvent('EVT_CLIENT_NAME_CHANGE', self.name, self))
@@ -887,35 +895,55 @@ class Client(object):
                 self.authorizing = False
                 return False
 
-            if inStorage:
-                self.console.bot('Client found in storage %s: welcome back %s', str(self.id), self.name)
-                self.lastVisit = self.timeEdit
-            else:
-                self.console.bot('Client not found in the storage %s: create new', str(self.guid))
-
-            self.connections = int(self.connections) + 1
-            self.name = name
-            self.ip = ip
+            self._authLoaded(inStorage, name, ip)
             self.save()
             self.authed = True
 
             self.console.debug('Client authorized: [%s] %s - %s', self.cid, self.name, self.guid)
 
-            # check for bans
-            if self.numBans > 0:
-                ban = self.lastBan
-                if ban:
-                    self.reBan(ban)
-                    self.authorizing = False
-                    return False
+            # load bans and warnings at once: penalty lookups will not hit the storage while the client is online
+            try:
+                self.console.storage.loadPenaltySummary(self)
+            except Exception, e:
+                self.console.error('Could not load penalties of client @%s: %s', self.id, e)
 
-            self.refreshLevel()
-            self.console.queueEvent(self.console.getEvent('EVT_CLIENT_AUTH', data=self, client=self))
-            self.authorizing = False
-            return self.authed
+            return self._authCompleted()
+        else:
+            return False
+
+    def _authLoaded(self, inStorage, name, ip):
+        """
+        Update the client once its storage data has been loaded (first step of the authorization).
+        :param inStorage: Whether the client was found in the storage.
+        :param name: The client name as it was before loading the storage data.
+        :param ip: The client ip as it was before loading the storage data.
+        """
+        if inStorage:
+            self.console.bot('Client found in storage %s: welcome back %s', str(self.id), self.name)
+            self.lastVisit = self.timeEdit
         else:
+            self.console.bot('Client not found in the storage %s: create new', str(self.guid))
+
+        self.connections = int(self.connections) + 1
+        self.name = name
+        self.ip = ip
+
+    def _authCompleted(self):
+        """
+        Check the bans of the client once it has been saved and complete its authorization (last step).
+        :return: True if the client has been authorized, False if it is banned.
+        """
+        ban = self.lastBan
+        if ban:
+            self.reBan(ban)
+            self.authorizing = False
             return False
 
+        self.refreshLevel()
+        self.console.queueEvent(self.console.getEvent('EVT_CLIENT_AUTH', data=self, client=self))
+        self.authorizing = False
+        return self.authed
+
     def __str__(self):
         return "Client<@%s:%s|%s:\"%s\":%s>" % (self.id, self.guid, self.pbid, self.name, self.cid)
 
@@ -1264,8 +1292,13 @@ class Clients(dict):
 
     _authorizing = False
     _exactNameIndex = None
+    _fuzzyGuidIndex = None
     _guidIndex = None
+    _indexed = None
+    _indexLock = None
     _nameIndex = None
+    _nameGramIndex = None
+    _nameSearchCache = None
 
     console = None
 
@@ -1276,9 +1309,8 @@ class Clients(dict):
         """
         super(Clients, self).__init__()
         self.console = console
-        self._exactNameIndex = {}
-        self._guidIndex = {}
-        self._nameIndex = {}
+        self._indexLock = threading.RLock()
+        self.resetIndex()
 
         self.escape_table = [unichr(x) for x in range(128)]
         self.escape_table[0] = u'\\0'
@@ -1289,6 +1321,122 @@ class Clients(dict):
         self.escape_table[ord('"')] = u'\\"'
         self.escape_table[ord("'")] = u"\\'"
 
+    def __setitem__(self, cid, client):
+        with self._indexLock:
+            self._unindex(cid)
+            super(Clients, self).__setitem__(cid, client)
+            if client is not None:
+                self._index(cid, client)
+
+    def __delitem__(self, cid):
+        with self._indexLock:
+            super(Clients, self).__delitem__(cid)
+            self._unindex(cid)
+
+    @staticmethod
+    def _fuzzyGuidKeys(guid):
+        """
+        Return the buckets of the fuzzy GUID index a GUID belongs to.
+        Truncated GUIDs (31 chars) are matched against 32 chars ones when off by a single char (see
+        functions.fuzzyGuidMatch): the missing char is either in the last 16 chars (the first 16 chars are the same)
+        or in the first 17 chars (the last 15 chars are the same).
+        :param guid: The uppercased GUID
+        """
+        if len(guid) in (31, 32):
+            return (len(guid), 'prefix', guid[:16]), (len(guid), 'suffix', guid[-15:])
+        return ()
+
+    @staticmethod
+    def _addKey(index, key, cid):
+        if key:
+            index.setdefault(key, []).append(cid)
+
+    @staticmethod
+    def _removeKey(index, key, cid):
+        cids = index.get(key)
+        if cids and cid in cids:
+            cids.remove(cid)
+            if not cids:
+                del index[key]
+
+    @staticmethod
+    def _normalizeName(name):
+        """
+        Return the form of a name used for partial name matching: lowercased with whitespaces removed.
+        """
+        return re.sub(r'\s', '', name.lower())
+
+    @staticmethod
+    def _nameGrams(name):
+        """
+        Return the set of trigrams of a normalized name.
+        """
+        return set(name[i:i + 3] for i in xrange(len(name) - 2))
+
+    def _index(self, cid, client):
+        """
+        Add a client to the indexes.
+        """
+        name = client.name.lower() if client.name else None
+        exact_name = client.exactName.lower() if client.exactName else None
+        guid = client.guid.upper() if client.guid else None
+        normalized = self._normalizeName(name) if name else None
+        self._addKey(self._nameIndex, name, cid)
+        self._addKey(self._exactNameIndex, exact_name, cid)
+        self._addKey(self._guidIndex, guid, cid)
+        if guid:
+            for key in self._fuzzyGuidKeys(guid):
+                self._addKey(self._fuzzyGuidIndex, key, cid)
+        if normalized:
+            for gram in self._nameGrams(normalized):
+                self._nameGramIndex.setdefault(gram, set()).add(cid)
+        self._indexed[cid] = (name, exact_name, guid, normalized)
+        self._nameSearchCache.clear()
+
+    def _unindex(self, cid):
+        """
+        Remove a client from the indexes.
+        """
+        keys = self._indexed.pop(cid, None)
+        if keys:
+            name, exact_name, guid, normalized = keys
+            self._removeKey(self._nameIndex, name, cid)
+            self._removeKey(self._exactNameIndex, exact_name, cid)
+            self._removeKey(self._guidIndex, guid, cid)
+            if guid:
+                for key in self._fuzzyGuidKeys(guid):
+                    self._removeKey(self._fuzzyGuidIndex, key, cid)
+            if normalized:
+                for gram in self._nameGrams(normalized):
+                    cids = self._nameGramIndex.get(gram)
+                    if cids is not None:
+                        cids.discard(cid)
+                        if not cids:
+                            del self._nameGramIndex[gram]
+            self._nameSearchCache.clear()
+
+    def reindex(self, client):
+        """
+        Update the indexes of an online client (called when the client name or GUID changes).
+        :param client: The client whose indexes need to be updated
+        """
+        with self._indexLock:
+            for cid in (client.cid, str(client.cid)):
+                if self.get(cid) is client:
+                    self._unindex(cid)
+                    self._index(cid, client)
+                    break
+
+    def _lookup(self, index, key):
+        """
+        Return the first online client indexed with the given key.
+        """
+        for cid in index.get(key, ()):
+            c = self.get(cid)
+            if c is not None:
+                return c
+        return None
+
     def find(self, handle, maxres=None):
         """
         Search a client.
@@ -1308,34 +1456,14 @@ class Clients(dict):
         Search a client by matching his name.
         :param name: The name to use for the search
         """
-        name = name.lower()
-        try:
-            return self[self._nameIndex[name]]
-        except Exception:
-            for cid, c in self.items():
-                if c.name and c.name.lower() == name:
-                    # self.console.debug('found client by name %s = %s', name, c.name)
-                    self._nameIndex[name] = c.cid
-                    return c
-        return None
+        return self._lookup(self._nameIndex, name.lower())
 
     def getByExactName(self, name):
         """
         Search a client by matching his exact name.
         :param name: The name to use for the search
         """
-        name = name.lower() + '^7'
-        try:
-            c = self[self._exactNameIndex[name]]
-            # self.console.debug('found client by exact name in index %s = %s : %s', name, c.exactName, c.__class__.__name__)
-            return c
-        except Exception:
-            for cid, c in self.items():
-                if c.exactName and c.exactName.lower() == name:
-                    #self.console.debug('Found client by exact name %s = %s', name, c.exactName)
-                    self._exactNameIndex[name] = c.cid
-                    return c
-        return None
+        return self._lookup(self._exactNameIndex, name.lower() + '^7')
 
     def getList(self):
         """
@@ -1373,14 +1501,37 @@ class Clients(dict):
         Return a list of clients matching the given name.
         :param name: The name to match
         """
+        needle = self._normalizeName(name)
+        with self._indexLock:
+            try:
+                cids = self._nameSearchCache[needle]
+            except KeyError:
+                cids = self._searchName(needle)
+                if len(self._nameSearchCache) >= 256:
+                    self._nameSearchCache.clear()
+                self._nameSearchCache[needle] = cids
         clist = []
-        needle = re.sub(r'\s', '', name.lower())
-        for cid,c in self.items():
-            cleanname = re.sub(r'\s', '', c.name.lower())
-            if not c.hide and needle in cleanname:
+        for cid in cids:
+            c = self.get(cid)
+            if c is not None and not c.hide:
                 clist.append(c)
         return clist
 
+    def _searchName(self, needle):
+        """
+        Return the slots of the clients whose normalized name contains the given normalized name.
+        Candidates are the clients sharing all the trigrams of the searched name: short names are
+        matched against every normalized name.
+        :param needle: The normalized name to match
+        """
+        if len(needle) < 3:
+            candidates = self._indexed
+        else:
+            grams = sorted((self._nameGramIndex.get(gram, ()) for gram in self._nameGrams(needle)), key=len)
+            candidates = set(grams[0]).intersection(*grams[1:])
+        # keep the order of the clients dict so the first match is the same as with a plain scan
+        return [cid for cid in self if cid in candidates and needle in (self._indexed[cid][3] or '')]
+
     def getClientLikeName(self, name):
         """
         Return the client who has the given name in its name (match substring).
@@ -1461,17 +1612,16 @@ class Clients(dict):
         :param guid: The GUID to match
         """
         guid = guid.upper()
-        try:
-            return self[self._guidIndex[guid]]
-        except Exception:
-            for cid,c in self.items():
-                if c.guid and c.guid == guid:
-                    self._guidIndex[guid] = c.cid
-                    return c
-                elif functions.fuzzyGuidMatch(c.guid, guid):
-                    # found by fuzzy matching: don't index
-                    return c
-        return None
+        c = self._lookup(self._guidIndex, guid)
+        if c is None and len(guid) in (31, 32):
+            # look for a truncated GUID among the clients sharing the GUID head or tail
+            other = 63 - len(guid)
+            for _, bucket, part in self._fuzzyGuidKeys(guid):
+                for cid in self._fuzzyGuidIndex.get((other, bucket, part), ()):
+                    client = self.get(cid)
+                    if client is not None and functions.fuzzyGuidMatch(client.guid, guid):
+                        return client
+        return c
 
     def getByCID(self, cid):
         """
@@ -1575,21 +1725,32 @@ class Clients(dict):
         if client.cid is None:
             return
         
+        if client.id:
+            self.console.storage.dropPenaltySummary(client)
+
         cid = client.cid
         if cid in self:
             self[cid] = None
             del self[cid]
             self.console.queueEvent(self.console.getEvent('EVT_CLIENT_DISCONNECT', data=cid, client=client))
 
-        self.resetIndex()
-
     def resetIndex(self):
         """
-        Reset the indexes.
-        """
-        self._nameIndex    = {}
-        self._guidIndex    = {}
-        self._exactNameIndex = {}
+        Rebuild the indexes from scratch.
+        The indexes are kept up to date as clients connect, disconnect and change name or GUID:
+        this is needed only if clients have been altered bypassing their properties.
+        """
+        with self._indexLock:
+            self._nameIndex = {}
+            self._nameGramIndex = {}
+            self._nameSearchCache = {}
+            self._exactNameIndex = {}
+            self._guidIndex = {}
+            self._fuzzyGuidIndex = {}
+            self._indexed = {}
+            for cid, c in self.items():
+                if c is not None:
+                    self._index(cid, c)
 
     def newClient(self, cid, **kwargs):
         """
@@ -1599,7 +1760,6 @@ class Clients(dict):
         """
         client = Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
         self[client.cid] = client
-        self.resetIndex()
         self.console.debug('Client connected: [%s] %s - %s (%s)', self[client.cid].cid,
                            self[client.cid].name, self[client.cid].guid, self[client.cid].data)
         self.console.queueEvent(self.console.getEvent('EVT_CLIENT_CONNECT', data=client, client=client))
@@ -1618,11 +1778,12 @@ class Clients(dict):
 
     def clear(self):
         """
-        Empty the clients list and reset the indexes.
+        Empty the clients list (hidden clients are kept).
         """
-        self.resetIndex()
         for cid, c in self.items():
             if not c.hide:
+                if c.id:
+                    self.console.storage.dropPenaltySummary(c)
                 del self[cid]
 
     def sync(self):
@@ -1648,6 +1809,58 @@ class Clients(dict):
             t = threading.Timer(5, self._authorizeClients)
             t.start()
 
+    def authorize(self, clients):
+        """
+        Authorize several clients at once (i.e: the players found on the server after a map change or a B3 restart).
+        Storage data and active penalties of all the clients are loaded with a single query each, and the clients
+        already in the storage are saved back with a single statement.
+        :param clients: The clients to authorize.
+        """
+        pending = [c for c in clients if not c.authed and c.guid and str(c.guid) != '0' and not c.authorizing]
+        if len(pending) < 2:
+            for client in pending:
+                client.auth()
+            return
+
+        for client in pending:
+            client.authorizing = True
+
+        previous = [(c, c.name, c.ip) for c in pending]
+        try:
+            found = self.console.storage.getClientsByGuid(pending)
+        except Exception, e:
+            self.console.error('Could not load clients from the storage: %s', e)
+            for client in pending:
+                client.authorizing = False
+                client.auth()
+            return
+
+        for client, name, ip in previous:
+            client._authLoaded(client in found, name, ip)
+            client.timeEdit = time.time()
+            if client.pbid is None:
+                client.pbid = ''
+
+        try:
+            self.console.storage.setClients(pending)
+        except Exception, e:
+            self.console.error('Could not save clients in the storage: %s', e)
+            for client in pending:
+                client.authorizing = False
+            return
+
+        for client in pending:
+            client.authed = True
+            self.console.debug('Client authorized: [%s] %s - %s', client.cid, client.name, client.guid)
+
+        try:
+            self.console.storage.loadPenaltySummaries(pending)
+        except Exception, e:
+            self.console.error('Could not load penalties of clients: %s', e)
+
+        for client in pending:
+            client._authCompleted()
+
     def _authorizeClients(self):
         """
         Authorize the online clients.
@@ -25,13 +25,33 @@
 __author__ = 'ThorN, Courgette'
 __version__ = '1.5'
 
+import Queue
+import bisect
+import errno
+import heapq
+import os
 import re
 import thread
 import threading
 import time
 import traceback
+import select
 import sys
 
+from b3.events import LatencyHistogram
+from b3.functions import monotonic
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # not available on Windows
+
+
+# what to do when a crontab is due while its previous run is not over yet
+OVERLAP_SKIP = 'skip'  # skip the run
+OVERLAP_QUEUE = 'queue'  # run again as soon as the previous run is over (at most one pending run)
+OVERLAP_PARALLEL = 'parallel'  # run in parallel
+
 
 class ReMatcher(object):
 
@@ -62,9 +82,12 @@ class CronTab(object):
     _month = None
     _dow = None
 
+    _cron = None  # the Cron instance scheduling this tab
+
     command = None
     maxRuns = 0
     numRuns = 0
+    overlap = OVERLAP_QUEUE  # overlap policy used when running in the cron worker threads
 
     def __init__(self, command, second=0, minute='*', hour='*', day='*', month='*', dow='*'):
         """
@@ -86,36 +109,42 @@ class CronTab(object):
 
     def _set_second(self, value):
         self._second = self._getRate(value, 60)
+        self._changed()
 
     def _get_second(self):
         return self._second
 
     def _set_minute(self, value):
         self._minute = self._getRate(value, 60)
+        self._changed()
 
     def _get_minute(self):
         return self._minute
 
     def _set_hour(self, value):
         self._hour = self._getRate(value, 24)
+        self._changed()
 
     def _get_hour(self):
         return self._hour
 
     def _set_day(self, value):
         self._day = self._getRate(value, 31)
+        self._changed()
 
     def _get_day(self):
         return self._day
 
     def _set_month(self, value):
         self._month = self._getRate(value, 12)
+        self._changed()
 
     def _get_month(self):
         return self._month
 
     def _set_dow(self, value):
         self._dow = self._getRate(value, 7)
+        self._changed()
 
     def _get_dow(self):
         return self._dow
@@ -127,6 +156,13 @@ class CronTab(object):
     month = property(_get_month, _set_month)
     dow = property(_get_dow, _set_dow)
 
+    def _changed(self):
+        """
+        Reschedule this tab if it has been modified while being scheduled.
+        """
+        if self._cron is not None:
+            self._cron.reschedule(self)
+
     def _getRate(self, rate, maxrate=None):
         """
         >>> o = CronTab(lambda: None)
@@ -214,6 +250,55 @@ class CronTab(object):
             return True
         return False
 
+    @staticmethod
+    def _next(unit, value):
+        """
+        Return the smallest value accepted by the given unit which is not lower than the given value.
+        Return None if there is no such value.
+        """
+        if type(unit) == int:
+            if unit == -1:
+                return value
+            return unit if unit >= value else None
+        index = bisect.bisect_left(unit, value)
+        return unit[index] if index < len(unit) else None
+
+    def nextTime(self, after):
+        """
+        Return the first timestamp (in seconds, UTC) after the given one matching this crontab.
+        Return None if the crontab won't match in the next 5 years (i.e: February 31).
+        :param after: The timestamp to start searching from
+        """
+        t = int(after) + 1
+        limit = t + 5 * 366 * 86400
+        while t < limit:
+            tt = time.gmtime(t)
+            elapsed = tt[3] * 3600 + tt[4] * 60 + tt[5]
+            # month, day and weekday (in crontab 0 is Mon)
+            if not (self._match(self.month, tt[1]) and self._match(self.day, tt[2]) and self._match(self.dow, tt[6])):
+                t += 86400 - elapsed
+                continue
+            hour = self._next(self.hour, tt[3])
+            if hour is None:
+                t += 86400 - elapsed
+                continue
+            elif hour != tt[3]:
+                t += (hour - tt[3]) * 3600 - tt[4] * 60 - tt[5]
+                continue
+            minute = self._next(self.minute, tt[4])
+            if minute is None:
+                t += 3600 - tt[4] * 60 - tt[5]
+                continue
+            elif minute != tt[4]:
+                t += (minute - tt[4]) * 60 - tt[5]
+                continue
+            second = self._next(self.second, tt[5])
+            if second is None:
+                t += 60 - tt[5]
+                continue
+            return t + second - tt[5]
+        return None
+
     def match(self, timetuple):
         # second
         timematch = self._match(self.second, timetuple[5] - (timetuple[5] % 1))
@@ -267,13 +352,96 @@ class PluginCronTab(CronTab):
         if self.plugin.isEnabled():
             CronTab.run(self)
 
-class Cron(object):
+class Waker(object):
+    """
+    Interruptible sleep.
+    On POSIX systems the sleeping thread blocks on a pipe (no polling), elsewhere on a threading.Event.
+    """
 
-    def __init__(self, console):
+    def __init__(self):
         """
         Object constructor.
         """
+        self._lock = threading.Lock()
+        self._pipe = None
+        self._event = threading.Event()
+
+    def open(self):
+        """
+        Create the pipe used to wake up the sleeping thread.
+        """
+        if fcntl is not None:
+            with self._lock:
+                if self._pipe is None:
+                    self._pipe = os.pipe()
+                    # never block when waking up: a pending wake up is enough
+                    flags = fcntl.fcntl(self._pipe[1], fcntl.F_GETFL)
+                    fcntl.fcntl(self._pipe[1], fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def sleep(self, timeout):
+        """
+        Sleep until the given timeout expires or wake() gets called.
+        :param timeout: The max amount of seconds to sleep
+        """
+        pipe = self._pipe
+        if pipe:
+            try:
+                readable, _, _ = select.select([pipe[0]], [], [], max(timeout, 0))
+            except select.error:
+                return  # interrupted by a signal
+            if readable:
+                os.read(pipe[0], 512)
+        else:
+            self._event.wait(max(timeout, 0))
+            self._event.clear()
+
+    def wake(self):
+        """
+        Wake up the sleeping thread.
+        """
+        with self._lock:
+            if self._pipe:
+                try:
+                    os.write(self._pipe[1], 'x')
+                except OSError, e:
+                    if e.errno != errno.EAGAIN:
+                        raise
+            else:
+                self._event.set()
+
+    def close(self):
+        """
+        Release the pipe.
+        """
+        with self._lock:
+            if self._pipe:
+                for fd in self._pipe:
+                    os.close(fd)
+                self._pipe = None
+
+
+class Cron(object):
+
+    maxSleep = 60  # max amount of seconds between clock checks
+    slowJob = 1.0  # amount of seconds after which a crontab run is logged as slow
+
+    def __init__(self, console, workers=0):
+        """
+        Object constructor.
+        :param console: The console class instance
+        :param workers: The number of threads running the crontabs (0 = crontabs run by the cron thread)
+        """
+        self._workers = workers
+        self._jobs = Queue.Queue()  # crontabs waiting for a worker thread
+        self._running = {}  # tab id => number of runs in progress
+        self._pending = set()  # ids of the tabs to run again once their current run is over
+        self._skipped = {}  # job name => number of runs skipped because of the overlap policy
+        self._runTimes = {}  # job name => LatencyHistogram
         self._tabs = {}
+        self._heap = []  # [fire time, tab id] entries sorted by fire time
+        self._entries = {}  # tab id => heap entry
+        self._lock = threading.RLock()
+        self._waker = Waker()
         self.console = console
 
         # thread will stop if this event gets set
@@ -290,7 +458,10 @@ class Cron(object):
         """
         Add a CronTab to the list of active cron tabs.
         """
-        self._tabs[id(tab)] = tab
+        with self._lock:
+            self._tabs[id(tab)] = tab
+            tab._cron = self
+            self._schedule(id(tab), tab.nextTime(self.time()))
         self.console.verbose('Added crontab %s (%s) - %ss %sm %sh %sd %sM %sDOW' % (tab.command, id(tab), tab.second,
                                                                                     tab.minute, tab.hour, tab.day,
                                                                                     tab.month, tab.dow))
@@ -300,11 +471,59 @@ class Cron(object):
         """
         Remove a CronTab from the list of active cron tabs.
         """
-        try:
-            del self._tabs[tab_id]
-            self.console.verbose('Removed crontab %s' % tab_id)
-        except KeyError:
-            self.console.verbose('Crontab %s not found' % tab_id)
+        with self._lock:
+            try:
+                tab = self._tabs.pop(tab_id)
+            except KeyError:
+                self.console.verbose('Crontab %s not found' % tab_id)
+                return
+            if tab._cron is self:
+                tab._cron = None
+            self._schedule(tab_id, None)
+        self.console.verbose('Removed crontab %s' % tab_id)
+
+    def reschedule(self, tab):
+        """
+        Compute again the next fire time of a cron tab (called when the tab gets modified).
+        """
+        with self._lock:
+            if id(tab) in self._tabs:
+                self._schedule(id(tab), tab.nextTime(self.time()))
+
+    def _schedule(self, tab_id, firetime):
+        """
+        Set the next fire time of a cron tab: waking up the cron thread if the tab is now the first one to fire.
+        :param tab_id: The cron tab id
+        :param firetime: The timestamp when the tab fires next, None to unschedule the tab
+        """
+        entry = self._entries.pop(tab_id, None)
+        if entry is not None:
+            entry[1] = None  # heap entries are discarded lazily
+        if firetime is not None:
+            entry = [firetime, tab_id]
+            self._entries[tab_id] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._waker.wake()
+
+    def _nextFireTime(self):
+        """
+        Return the time of the next scheduled cron tab (None if no tab is scheduled).
+        """
+        with self._lock:
+            while self._heap and self._heap[0][1] is None:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _rescheduleAll(self, now):
+        """
+        Compute again the next fire time of all the cron tabs.
+        """
+        with self._lock:
+            self._heap = []
+            self._entries = {}
+            for tab_id, tab in self._tabs.items():
+                self._schedule(tab_id, tab.nextTime(now))
 
     def __add__(self, tab):
         self.add(tab)
@@ -316,6 +535,10 @@ class Cron(object):
         """
         Start the cron scheduler in a separate thread.
         """
+        for i in range(self._workers):
+            worker = threading.Thread(target=self._work, name='b3-cron-%s' % (i + 1))
+            worker.setDaemon(True)
+            worker.start()
         thread.start_new_thread(self.run, ())
 
     @staticmethod
@@ -330,45 +553,168 @@ class Cron(object):
         Stop the cron scheduler.
         """
         self._stopEvent.set()
+        self._waker.wake()
+        for _ in range(self._workers):
+            self._jobs.put(None)
 
     def run(self):
         """
         Main cron loop.
+        Sleeps until the first cron tab is due (or until woken up by a newly added tab).
         Will terminate when stop event is set.
         """
         self.console.info("Cron scheduler started")
-        nexttime = self.getNextTime()
+        self._waker.open()
         while not self._stopEvent.isSet():
+            firetime = self._nextFireTime()
             now = self.time()
-            if now < nexttime:
-                self._stopEvent.wait(nexttime - now + .1)
-
-            # Check if the time has changed by more than two minutes. This
-            # case arises when the system clock is changed. We must reset the timer.
-            if abs(self.time() - nexttime) > 120:
-                nexttime = self.getNextTime()
-
-            t = time.gmtime(nexttime)
-            for k, c in self._tabs.items():
-                if c.match(t):
-                    if 0 < c.maxRuns < c.numRuns + 1:
-                        # reached max executions, remove tab
-                        del self._tabs[k]
-                    else:
-                        c.numRuns += 1
-                        try:
-                            c.run()
-                        except Exception, msg:
-                            self.console.error('Exception raised while executing crontab %s: %s\n%s', c.command,
-                                               msg, traceback.extract_tb(sys.exc_info()[2]))
-            nexttime += 1
-
+            timeout = self.maxSleep if firetime is None else min(firetime - now, self.maxSleep)
+            if timeout > 0:
+                before = monotonic()
+                self._waker.sleep(timeout)
+                if self._stopEvent.isSet():
+                    break
+
+                # Check if the time has changed by more than two minutes. This
+                # case arises when the system clock is changed. We must reset the timer.
+                drift = self.time() - now - (monotonic() - before)
+                if abs(drift) > 120:
+                    self.console.verbose('System clock changed by %ds: rescheduling crontabs' % drift)
+                    self._rescheduleAll(self.time())
+                continue
+
+            if now - firetime > 120:
+                # the clock moved forward while the crontabs were running: do not run all the missed tabs
+                self.console.verbose('System clock changed by %ds: rescheduling crontabs' % (now - firetime))
+                self._rescheduleAll(now)
+                continue
+
+            self._runDue(now)
+
+        self._waker.close()
         self.console.info("Cron scheduler ended")
 
+    def _runDue(self, now):
+        """
+        Run the cron tabs due at the given time.
+        """
+        while True:
+            with self._lock:
+                firetime = self._nextFireTime()
+                if firetime is None or firetime > now:
+                    return
+                entry = heapq.heappop(self._heap)
+                tab_id = entry[1]
+                del self._entries[tab_id]
+                c = self._tabs[tab_id]
+
+            if c.match(time.gmtime(firetime)) and self._submit(tab_id, c):
+                c.numRuns += 1
+
+            with self._lock:
+                if self._tabs.get(tab_id) is not c or tab_id in self._entries:
+                    continue  # cancelled or rescheduled while running
+                if 0 < c.maxRuns <= c.numRuns:
+                    # reached max executions, remove tab
+                    del self._tabs[tab_id]
+                    c._cron = None
+                else:
+                    self._schedule(tab_id, c.nextTime(firetime))
+
+    def _submit(self, tab_id, tab):
+        """
+        Run a cron tab, in a worker thread if the worker pool is enabled.
+        :return: False if the run has been skipped because of the tab overlap policy, True otherwise
+        """
+        if not self._workers:
+            self._execute(tab)
+            return True
+
+        with self._lock:
+            if self._running.get(tab_id) and tab.overlap != OVERLAP_PARALLEL:
+                if tab.overlap == OVERLAP_QUEUE:
+                    self._pending.add(tab_id)
+                    return True
+                name = self.getJobName(tab)
+                self._skipped[name] = self._skipped.get(name, 0) + 1
+                self.console.verbose('Crontab %s still running: skipping' % name)
+                return False
+            self._running[tab_id] = self._running.get(tab_id, 0) + 1
+        self._jobs.put((tab_id, tab))
+        return True
+
+    def _work(self):
+        """
+        Worker thread main loop: run the submitted cron tabs until stopped.
+        """
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            tab_id, tab = job
+            self._execute(tab)
+            with self._lock:
+                if tab_id in self._pending and self._tabs.get(tab_id) is tab:
+                    # run again right away, keeping the run slot
+                    self._pending.discard(tab_id)
+                    self._jobs.put(job)
+                elif self._running.get(tab_id, 0) > 1:
+                    self._running[tab_id] -= 1
+                else:
+                    self._running.pop(tab_id, None)
+                    self._pending.discard(tab_id)
+
+    def _execute(self, tab):
+        """
+        Run a cron tab, recording the time it takes.
+        """
+        name = self.getJobName(tab)
+        start = monotonic()
+        try:
+            tab.run()
+        except Exception, msg:
+            self.console.error('Exception raised while executing crontab %s: %s\n%s', tab.command,
+                               msg, traceback.extract_tb(sys.exc_info()[2]))
+        finally:
+            elapsed = monotonic() - start
+            with self._lock:
+                histogram = self._runTimes.get(name)
+                if histogram is None:
+                    histogram = self._runTimes[name] = LatencyHistogram()
+                histogram.record(elapsed * 1000)
+            if elapsed > self.slowJob:
+                self.console.warning('Crontab %s took %0.3f seconds to run' % (name, elapsed))
+
+    @staticmethod
+    def getJobName(tab):
+        """
+        Return a name identifying the command of a cron tab in statistics.
+        """
+        command = tab.command
+        owner = getattr(command, 'im_self', None)
+        name = getattr(command, '__name__', None) or command.__class__.__name__
+        if owner is not None:
+            return '%s.%s' % (owner.__class__.__name__, name)
+        return name
+
+    def getStats(self):
+        """
+        Return a snapshot of the crontabs run statistics as a dict (suitable for JSON serialization).
+        """
+        with self._lock:
+            return {
+                'tabs': len(self._tabs),
+                'workers': self._workers,
+                'backlog': self._jobs.qsize(),
+                'running': sum(self._running.values()),
+                'jobs': dict((k, v.summary()) for k, v in self._runTimes.iteritems()),
+                'skipped': dict(self._skipped),
+            }
+
     @staticmethod
     def getNextTime():
         # store the time first, we don't want it to change on us
         t = time.time()
         # current time, minus it's 1 second remainder, plus 1 seconds
         # will round to the next nearest 1 seconds
-        return (t - t % 1) + 1
\ No newline at end of file
+        return (t - t % 1) + 1
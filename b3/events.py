@@ -25,13 +25,14 @@
 __author__ = 'ThorN, xlr8or, Courgette'
 __version__ = '1.8.2'
 
+import math
 import re
 import time
+import threading
+import Queue
 
-from b3.functions import meanstdv
 from b3.decorators import Memoize
 from b3.output import VERBOSE
-from collections import deque
 from logging import DEBUG
 
 
@@ -182,19 +183,129 @@ class Event(object):
         return "Event<%s>(%r, %s, %s)" % (eventManager.getKey(self.type), self.data, self.client, self.target)
 
 
+class LatencyHistogram(object):
+    """
+    Fixed memory histogram of latencies (HDR style).
+    Samples are recorded with microsecond resolution into log-linear buckets: values smaller than 32us are
+    recorded exactly while greater ones are recorded with a relative error lower than 1/16.
+    """
+    _subBits = 5
+    _subCount = 1 << _subBits
+    _subHalf = _subCount >> 1
+    _maxValue = (1 << 32) - 1  # ~71 minutes
+
+    def __init__(self):
+        """
+        Object constructor.
+        """
+        self._buckets = [0] * self._bucketIndex(self._maxValue + 1)
+        self.count = 0
+        self.total = 0.0
+        self.total2 = 0.0
+        self.min = None
+        self.max = None
+
+    def _bucketIndex(self, value):
+        """
+        Return the index of the bucket holding the given value.
+        :param value: The value in microseconds
+        """
+        if value < self._subCount:
+            return value
+        shift = value.bit_length() - self._subBits
+        return shift * self._subHalf + (value >> shift)
+
+    def _bucketRange(self, index):
+        """
+        Return the lowest and highest values (in microseconds) recorded into the given bucket.
+        :param index: The bucket index
+        """
+        if index < self._subCount:
+            return index, index
+        shift = index // self._subHalf - 1
+        lowest = (self._subHalf + index % self._subHalf) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, milliseconds):
+        """
+        Record a latency sample.
+        :param milliseconds: The latency in milliseconds
+        """
+        value = min(max(int(milliseconds * 1000), 0), self._maxValue)
+        self._buckets[self._bucketIndex(value)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.total2 += milliseconds * milliseconds
+        if self.min is None or milliseconds < self.min:
+            self.min = milliseconds
+        if self.max is None or milliseconds > self.max:
+            self.max = milliseconds
+
+    def mean(self):
+        """
+        Return the mean of the recorded samples (in milliseconds).
+        """
+        return self.total / self.count if self.count else 0
+
+    def stddev(self):
+        """
+        Return the standard deviation of the recorded samples (in milliseconds).
+        """
+        if self.count < 2:
+            return 0
+        variance = (self.total2 - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0))
+
+    def percentile(self, percent):
+        """
+        Return the value (in milliseconds) below which the given percentage of the samples falls.
+        :param percent: The percentage (0-100)
+        """
+        if not self.count:
+            return 0
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        if rank >= self.count:
+            return self.max
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank:
+                lowest, highest = self._bucketRange(index)
+                value = (lowest + highest) / 2000.0
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Return a dict summarizing the recorded samples.
+        """
+        return {
+            'count': self.count,
+            'min': self.min or 0,
+            'max': self.max or 0,
+            'mean': self.mean(),
+            'stddev': self.stddev(),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
 class EventsStats(object):
 
-    def __init__(self, console, max_samples=100):
+    def __init__(self, console):
         """
         Object constructor.
         :param console: The console class instance
-        :param max_samples: The size of the event queue
         """
         self.console = console
-        self._max_samples = max_samples
+        self._lock = threading.Lock()
         self._handling_timers = {}
-        self._queue_wait = deque(maxlen=max_samples)
-        
+        self._queue_wait = LatencyHistogram()
+        self._expired = {}
+        self._vetoed = {}
+        self._started = time.time()
+
     def add_event_handled(self, plugin_name, event_name, milliseconds_elapsed):
         """
         Add an event to the dict of handled ones.
@@ -202,39 +313,214 @@ class EventsStats(object):
         :param event_name: The event name
         :param milliseconds_elapsed: The amount of milliseconds necessary to handle the event
         """
-        if plugin_name not in self._handling_timers:
-            self._handling_timers[plugin_name] = {}
-        if event_name not in self._handling_timers[plugin_name]:
-            self._handling_timers[plugin_name][event_name] = deque(maxlen=self._max_samples)
-        self._handling_timers[plugin_name][event_name].append(milliseconds_elapsed)
+        # events may be handled by several worker threads
+        with self._lock:
+            plugin_timers = self._handling_timers.setdefault(plugin_name, {})
+            event_timers = plugin_timers.get(event_name)
+            if event_timers is None:
+                event_timers = plugin_timers[event_name] = LatencyHistogram()
+            event_timers.record(milliseconds_elapsed)
         self.console.verbose2("%s event handled by %s in %0.3f ms", event_name, plugin_name, milliseconds_elapsed)
 
     def add_event_wait(self, milliseconds_wait):
         """
         Add delay to the event processing.
-        :param milliseconds_wait: The amount of milliseconds to wait
+        :param milliseconds_wait: The amount of milliseconds the event waited in the queue
+        """
+        with self._lock:
+            self._queue_wait.record(milliseconds_wait)
+
+    def add_event_expired(self, event_name):
+        """
+        Count an event which sat in the queue too long to be handled.
+        :param event_name: The event name
+        """
+        with self._lock:
+            self._expired[event_name] = self._expired.get(event_name, 0) + 1
+
+    def add_event_vetoed(self, plugin_name, event_name):
+        """
+        Count an event vetoed by a plugin.
+        :param plugin_name: The name of the plugin which vetoed the event
+        :param event_name: The event name
+        """
+        with self._lock:
+            plugin_vetoes = self._vetoed.setdefault(plugin_name, {})
+            plugin_vetoes[event_name] = plugin_vetoes.get(event_name, 0) + 1
+
+    def getStats(self):
         """
-        self._queue_wait.append(milliseconds_wait)
-        
+        Return a snapshot of the event statistics as a dict (suitable for JSON serialization).
+        """
+        queue = getattr(self.console, 'queue', None)
+        with self._lock:
+            handlers = {}
+            for plugin_name, plugin_timers in self._handling_timers.iteritems():
+                handlers[plugin_name] = dict((k, v.summary()) for k, v in plugin_timers.iteritems())
+            return {
+                'uptime': time.time() - self._started,
+                'queue': {
+                    'size': queue.qsize() if queue is not None else 0,
+                    'maxsize': queue.maxsize if queue is not None else 0,
+                    'wait': self._queue_wait.summary(),
+                },
+                'handlers': handlers,
+                'expired': dict(self._expired),
+                'vetoed': dict((k, dict(v)) for k, v in self._vetoed.iteritems()),
+            }
+
     def dumpStats(self):
         """
         Print event stats in the log file.
         """
         if self.console.log.isEnabledFor(VERBOSE):
-            for plugin_name, plugin_timers in self._handling_timers.iteritems():
-                for event_name, event_timers in plugin_timers.iteritems():
-                    mean, stdv = meanstdv(event_timers)
-                    if len(event_timers):
-                        self.console.verbose("%s %s : (ms) min(%0.1f), max(%0.1f), mean(%0.1f), "
-                                             "stddev(%0.1f)", plugin_name, event_name, min(event_timers),
-                                             max(event_timers), mean, stdv)
+            for plugin_name, plugin_timers in self._handling_timers.items():
+                for event_name, event_timers in plugin_timers.items():
+                    if event_timers.count:
+                        self.console.verbose("%s %s : (ms) min(%0.1f), max(%0.1f), mean(%0.1f), stddev(%0.1f), "
+                                             "p50(%0.1f), p95(%0.1f), p99(%0.1f)", plugin_name, event_name,
+                                             event_timers.min, event_timers.max, event_timers.mean(),
+                                             event_timers.stddev(), event_timers.percentile(50),
+                                             event_timers.percentile(95), event_timers.percentile(99))
 
         if self.console.log.isEnabledFor(DEBUG):
-            mean, stdv = meanstdv(self._queue_wait)
-            if len(self._queue_wait):
+            if self._queue_wait.count:
                 self.console.debug("Events waiting in queue stats : (ms) min(%0.1f), max(%0.1f), mean(%0.1f), "
-                                   "stddev(%0.1f)", min(self._queue_wait), max(self._queue_wait), mean, stdv)
-    
+                                   "stddev(%0.1f), p50(%0.1f), p95(%0.1f), p99(%0.1f)", self._queue_wait.min,
+                                   self._queue_wait.max, self._queue_wait.mean(), self._queue_wait.stddev(),
+                                   self._queue_wait.percentile(50), self._queue_wait.percentile(95),
+                                   self._queue_wait.percentile(99))
+
+
+class EventQueue(Queue.Queue):
+    """
+    FIFO queue holding the events waiting to be handled.
+    Events are handled in the order they have been queued no matter how close in time they have been queued,
+    and several events can be queued at once with put_many.
+    """
+
+    def put_many(self, items, block=True, timeout=None):
+        """
+        Put several items into the queue, acquiring the queue lock once for all of them.
+        :param items: The items to put into the queue
+        :param block: Whether to wait for free slots if the queue is full
+        :param timeout: The max time to wait for a free slot, for each item (in seconds)
+        :raise Queue.Full: If some items could not be put into the queue
+        :return: The number of items put into the queue
+        """
+        count = 0
+        self.not_full.acquire()
+        try:
+            for item in items:
+                endtime = None
+                while 0 < self.maxsize <= self._qsize():
+                    # let the consumers handle the items queued so far
+                    self.not_empty.notifyAll()
+                    if not block:
+                        raise Queue.Full
+                    if timeout is None:
+                        self.not_full.wait()
+                    else:
+                        if endtime is None:
+                            endtime = time.time() + timeout
+                        remaining = endtime - time.time()
+                        if remaining <= 0.0:
+                            raise Queue.Full
+                        self.not_full.wait(remaining)
+                self._put(item)
+                self.unfinished_tasks += 1
+                count += 1
+            return count
+        finally:
+            if count:
+                self.not_empty.notifyAll()
+            self.not_full.release()
+
+
+class EventWorkers(object):
+    """
+    Pool of threads running event handlers.
+    Events related to the same client are always handled by the same worker thread, hence in the order they have
+    been queued, while events with no client (game events, plugin events, B3 stop...) and events whose target is
+    handled by another worker than the client (kills, damages...) are handled by the dispatching thread once all the
+    previously dispatched events have been handled. All the handlers of a given event run in the
+    same thread, in the order they registered, so a plugin raising VetoEvent still stops the following handlers.
+    """
+
+    def __init__(self, console, size):
+        """
+        Object constructor.
+        :param console: The console class instance
+        :param size: The number of worker threads
+        """
+        self.console = console
+        self._queues = []
+        self._threads = []
+        for i in xrange(size):
+            queue = Queue.Queue()
+            worker = threading.Thread(target=self._work, args=(queue,), name='EventWorker-%s' % i)
+            worker.daemon = True
+            self._queues.append(queue)
+            self._threads.append(worker)
+            worker.start()
+
+    def _work(self, queue):
+        """
+        Worker thread main loop.
+        :param queue: The queue holding the events dispatched to this worker
+        """
+        while True:
+            item = queue.get(True)
+            try:
+                if item is None:
+                    break
+                self.console.handleEvent(*item)
+            finally:
+                queue.task_done()
+
+    def dispatch(self, added, expire, event):
+        """
+        Dispatch an event to the worker in charge of the event client (and target).
+        :param added: The time the event has been queued
+        :param expire: The time the event expires
+        :param event: The event to be handled
+        """
+        queue = None
+        if event.client is not None:
+            queue = self._queueFor(event.client)
+            if event.target is not None and event.target is not event.client:
+                if self._queueFor(event.target) is not queue:
+                    # the target events must be handled in order as well
+                    queue = None
+        if queue is None:
+            self.join()
+            self.console.handleEvent(added, expire, event)
+        else:
+            queue.put((added, expire, event))
+
+    def _queueFor(self, client):
+        """
+        Return the queue of the worker in charge of the given client.
+        """
+        return self._queues[hash(getattr(client, 'cid', None)) % len(self._queues)]
+
+    def join(self):
+        """
+        Wait for all the dispatched events to be handled.
+        """
+        for queue in self._queues:
+            queue.join()
+
+    def stop(self, timeout=10):
+        """
+        Stop the worker threads once they handled the events already dispatched.
+        :param timeout: The max time to wait for each worker thread to end
+        """
+        for queue in self._queues:
+            queue.put(None)
+        for worker in self._threads:
+            worker.join(timeout)
+
 
 class VetoEvent(Exception):
     """
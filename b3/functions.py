@@ -31,6 +31,7 @@ import re
 import sys
 import shutil
 import string
+import time
 import urllib2
 import zipfile
 
@@ -679,4 +680,57 @@ def topological_sort(source):
         if not next_emitted: # all entries have unmet deps, one of two things is wrong...
             raise ProgrammingError("cyclic or missing dependancy detected: %r" % (next_pending,))
         pending = next_pending
-        emitted = next_emitted
\ No newline at end of file
+        emitted = next_emitted
+
+
+def _get_monotonic():
+    """
+    Return a function reading a monotonic clock (in seconds), not affected by system clock updates.
+    Fallback to time.time on systems where no monotonic clock can be found.
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+
+    try:
+        import ctypes
+        import ctypes.util
+
+        if sys.platform.startswith('win'):
+            kernel32 = ctypes.windll.kernel32
+            frequency = ctypes.c_int64()
+            if not kernel32.QueryPerformanceFrequency(ctypes.byref(frequency)):
+                raise OSError('QueryPerformanceFrequency failed')
+
+            def _monotonic():
+                counter = ctypes.c_int64()
+                kernel32.QueryPerformanceCounter(ctypes.byref(counter))
+                return counter.value / float(frequency.value)
+
+            return _monotonic
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        try:
+            clock_gettime = libc.clock_gettime
+        except AttributeError:
+            clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt'), use_errno=True).clock_gettime
+
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        clock_id = 6 if sys.platform == 'darwin' else 1  # CLOCK_MONOTONIC
+        ts = timespec()
+        if clock_gettime(clock_id, ctypes.byref(ts)) != 0:
+            raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+
+        def _monotonic():
+            t = timespec()
+            clock_gettime(clock_id, ctypes.byref(t))
+            return t.tv_sec + t.tv_nsec * 1e-9
+
+        return _monotonic
+
+    except Exception:
+        return time.time
+
+monotonic = _get_monotonic()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+__version__ = '1.0'
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import sys
+
+# inotify event masks (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVE_SELF = 0x00000800
+IN_DELETE_SELF = 0x00000400
+
+# inotify_init1 flags
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+
+class InotifyError(Exception):
+    pass
+
+
+class FileWatcher(object):
+    """
+    Watch a file for changes using the Linux inotify API.
+    USAGE:
+        watcher = FileWatcher('/path/to/games_mp.log')
+        if watcher.wait(0.33):
+            # the file has been modified
+        watcher.close()
+    """
+    _libc = None
+
+    def __init__(self, path):
+        """
+        Object constructor.
+        :param path: The path of the file to watch
+        :raise InotifyError: If inotify is not available on this system
+        """
+        if not sys.platform.startswith('linux'):
+            raise InotifyError('inotify is only available on Linux')
+
+        if FileWatcher._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1
+                libc.inotify_add_watch
+            except (OSError, AttributeError), e:
+                raise InotifyError('could not load inotify functions from libc: %s' % e)
+            FileWatcher._libc = libc
+
+        self._fd = FileWatcher._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise InotifyError('inotify_init1 failed: %s' % os.strerror(ctypes.get_errno()))
+
+        mask = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+        if FileWatcher._libc.inotify_add_watch(self._fd, path, mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            self._fd = None
+            raise InotifyError('could not watch %s: %s' % (path, os.strerror(err)))
+
+    def wait(self, timeout):
+        """
+        Block until the watched file changes or the timeout expires.
+        :param timeout: The max time to wait (in seconds)
+        :return: True if the file changed, False otherwise
+        """
+        if self._fd is None:
+            return False
+
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return False
+            raise
+
+        if not readable:
+            return False
+
+        # drain pending notifications: we don't care about their content
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except OSError, e:
+            if e.errno != errno.EAGAIN:
+                raise
+        return True
+
+    def close(self):
+        """
+        Stop watching the file.
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -54,15 +54,18 @@ from collections import OrderedDict
 from b3 import __version__ as currentVersion
 from b3.clients import Clients
 from b3.clients import Group
-from b3.decorators import Memoize
 from b3.exceptions import MissingRequirement
 from b3.functions import getModule
 from b3.functions import vars2printf
 from b3.functions import main_is_frozen
+from b3.functions import monotonic
 from b3.functions import splitDSN
 from b3.functions import right_cut
 from b3.functions import topological_sort
+from b3.lib.inotify import FileWatcher
+from b3.lib.inotify import InotifyError
 from b3.plugin import PluginData
+from b3.statsserver import StatsServer
 from b3.update import B3version
 from textwrap import TextWrapper
 from traceback import extract_tb
@@ -80,13 +83,21 @@ class Parser(object):
 
     _commands = {}  # will hold RCON commands for the current game
     _cron = None  # cron instance
+    _cronWorkers = 0  # number of threads running crontabs (0 = crontabs run by the cron thread)
     _events = {}  # available events (K=>EVENT)
+    _eventsBuffer = None  # events produced by the game log lines being parsed (batch read mode)
+    _eventsBufferThread = None  # identifier of the thread filling the events buffer
     _eventNames = {}  # available event names (K=>NAME)
     _eventsStats_cronTab = None  # crontab used to log event statistics
+    _eventsStatsServer = None  # local HTTP server exposing event statistics
+    _eventsSubscribed = 0  # bitmap of the event IDs having at least one enabled handler
+    _eventWorkers = 0  # number of threads handling events (0 = events handled by the event dispatching thread)
     _handlers = {}  # event handlers
     _lineTime = None  # used to track log file time changes
     _lineFormat = re.compile('^([a-z ]+): (.*?)', re.IGNORECASE)
     _line_color_prefix = ''  # a color code prefix to be added to every line resulting from getWrap
+    _lineBuffer = ''  # incomplete trailing line of the last batch read (batch read mode)
+    _linesPending = None  # lines read from the game log but not parsed yet (batch read mode)
     _line_length = 80  # max wrap length
     _messages = {}  # message template cache
     _message_delay = 0  # delay between consequent sent say messages (apply also to private messages)
@@ -105,6 +116,8 @@ class Parser(object):
     _use_color_codes = True  # whether the game supports color codes or not
 
     autorestart = False  # whether B3 has been started in autorestart mode
+    batchRead = False  # whether to read the game log in batch mode (sleep only when there is nothing new)
+    batchMaxLines = 1000  # max number of lines parsed in a single batch (batch read mode)
     clients = None
     config = None  # parser configuration file instance
     delay = 0.33  # time between each game log lines fetching
@@ -112,6 +125,7 @@ class Parser(object):
     encoding = 'latin-1'
     game = None
     gameName = None # console name
+    inputWatcher = None  # inotify watcher notifying game log changes (batch read mode on Linux)
     log = None  # logger instance
     logTime = 0  # time in seconds of epoch of game log
     name = 'b3'  # bot name
@@ -309,6 +323,19 @@ class Parser(object):
             if delay2 > 0:
                 self.delay2 = 1/delay2
 
+        # read the game log in batch mode
+        if self.config.has_option('server', 'batch_read'):
+            self.batchRead = self.config.getboolean('server', 'batch_read')
+
+        # max number of lines parsed back to back in batch read mode
+        if self.config.has_option('server', 'batch_max_lines'):
+            try:
+                batch_max_lines = self.config.getint('server', 'batch_max_lines')
+                if batch_max_lines > 0:
+                    self.batchMaxLines = batch_max_lines
+            except ValueError, e:
+                self.warning('Could not read batch_max_lines setting: %s', e)
+
         try:
             # setup storage module
             dsn = self.config.get('b3', 'database')
@@ -318,9 +345,42 @@ class Parser(object):
             # Plugin loading so it makes no sense to keep going with the console initialization
             self.critical('Could not setup storage module: %s', e)
 
+        # WAL journal, relaxed syncing and bigger caches for SQLite databases
+        if self.storage.protocol == 'sqlite':
+            try:
+                self.storage.tuned = self.config.getboolean('b3', 'storage_sqlite_tuning')
+            except NoOptionError:
+                pass
+            except ValueError, err:
+                self.warning(err)
+
         # establish a connection with the database
         self.storage.connect()
 
+        # pool of connections so that a slow query doesn't block the other threads
+        try:
+            pool_size = self.config.getint('b3', 'storage_pool_size')
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+        else:
+            if pool_size > 1:
+                self.debug("Creating the storage connection pool with size %s", pool_size)
+                self.storage.startPool(pool_size)
+
+        # write-behind queue for the storage writes which don't need to be waited for
+        try:
+            write_queue = self.config.getint('b3', 'storage_write_queue')
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+        else:
+            if write_queue > 0:
+                self.debug("Creating the storage write queue with size %s", write_queue)
+                self.storage.startWriter(write_queue)
+
         if self.config.has_option('server', 'game_log'):
             # open log file
             game_log = self.config.get('server', 'game_log')
@@ -365,6 +425,16 @@ class Parser(object):
                         self.input.seek(0, os.SEEK_END)
                 else:
                     self.input.seek(0, os.SEEK_END)
+
+                if self.batchRead:
+                    self.bot('Reading game log in batch mode (max %s lines per batch)', self.batchMaxLines)
+                    self.__read = self.__read_input_batch
+                    self._linesPending = []
+                    try:
+                        self.inputWatcher = FileWatcher(f)
+                        self.bot('Using inotify to watch game log changes')
+                    except InotifyError, e:
+                        self.bot('Polling game log every %s seconds: %s', self.delay, e)
             else:
                 self.screen.write(">>> Cannot read file: %s\n" % os.path.abspath(f))
                 self.screen.flush()
@@ -443,7 +513,38 @@ class Parser(object):
             self.warning(err)
 
         self.debug("Creating the event queue with size %s", queuesize)
-        self.queue = Queue.Queue(queuesize)
+        self.queue = b3.events.EventQueue(queuesize)
+
+        try:
+            self._eventWorkers = max(0, self.config.getint('b3', 'event_workers'))
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+
+        try:
+            self._cronWorkers = max(0, self.config.getint('b3', 'cron_workers'))
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+
+        try:
+            stats_port = self.config.getint('b3', 'stats_port')
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+        else:
+            if stats_port > 0:
+                stats_host = '127.0.0.1'
+                if self.config.has_option('b3', 'stats_host'):
+                    stats_host = self.config.get('b3', 'stats_host')
+                try:
+                    providers = {'stats': self._eventsStats.getStats, 'cron': lambda: self.cron.getStats()}
+                    self._eventsStatsServer = StatsServer(self, providers, stats_host, stats_port)
+                except socket.error, err:
+                    self.error('Could not start event statistics server on %s:%s: %s', stats_host, stats_port, err)
 
         atexit.register(self.shutdown)
 
@@ -472,6 +573,12 @@ class Parser(object):
         self.startPlugins()
         self._eventsStats_cronTab = b3.cron.CronTab(self._dumpEventsStats)
         self.cron.add(self._eventsStats_cronTab)
+        if self.storage.protocol == 'sqlite' and self.storage.tuned:
+            # not in __init__: the cron must not be created before the cron_workers setting is loaded
+            self.debug("Scheduling the SQLite database maintenance")
+            self.storage.startMaintenance()
+        if self._eventsStatsServer:
+            self._eventsStatsServer.start()
         self.bot("All plugins started")
         self.pluginsStarted()
         self.bot("Starting event dispatching thread")
@@ -1045,7 +1152,6 @@ class Parser(object):
 
         return cmd % kwargs
 
-    @Memoize
     def getGroup(self, data):
         """
         Return a valid Group from storage.
@@ -1139,6 +1245,11 @@ class Parser(object):
             else:
                 lines = self.read()
                 if lines:
+                    if self.batchRead:
+                        # events produced by this batch of lines are queued all at once
+                        self._eventsBufferThread = thread.get_ident()
+                        self._eventsBuffer = []
+
                     for line in lines:
                         line = str(line).strip()
                         if line and self._lineTime is not None:
@@ -1169,14 +1280,25 @@ class Parser(object):
                                 raise
                             except Exception, msg:
                                 self.error('Could not parse line %s: %s', msg, extract_tb(sys.exc_info()[2]))
-                            
-                            time.sleep(self.delay2)
 
-            time.sleep(self.delay)
+                            if not self.batchRead:
+                                time.sleep(self.delay2)
+
+                    if self.batchRead:
+                        self.flushEvents()
+                        # more data may be available already: do not sleep
+                        continue
+
+            if self.inputWatcher:
+                self.inputWatcher.wait(self.delay)
+            else:
+                time.sleep(self.delay)
 
         self.bot('Stop reading')
 
         with self.exiting:
+            if self.inputWatcher:
+                self.inputWatcher.close()
             self.input.close()
             self.output.close()
 
@@ -1200,6 +1322,7 @@ class Parser(object):
             self._handlers[event_name] = []
         if event_handler not in self._handlers[event_name]:
             self._handlers[event_name].append(event_handler)
+        self.updateEventsSubscriptions()
 
     def unregisterHandler(self, event_handler):
         """
@@ -1209,6 +1332,38 @@ class Parser(object):
             if event_handler in self._handlers[event_name]:
                 self.debug('%s: unregister event <%s>', event_handler.__class__.__name__, self.getEventName(event_name))
                 self._handlers[event_name].remove(event_handler)
+        self.updateEventsSubscriptions()
+
+    def updateEventsSubscriptions(self):
+        """
+        Update the bitmap of the events having at least one enabled handler.
+        Called whenever an event handler is registered/unregistered or a plugin is enabled/disabled.
+        """
+        subscribed = 0
+        for event_id, handlers in self._handlers.items():
+            for hfunc in list(handlers):
+                if hfunc.isEnabled():
+                    subscribed |= 1 << event_id
+                    break
+        self._eventsSubscribed = subscribed
+
+    def isEventSubscribed(self, *keys):
+        """
+        Check whether at least one enabled handler is listening for one of the given events.
+        Parsers can use this to skip building events nobody will handle.
+        :param keys: The event keys or IDs
+        """
+        for key in keys:
+            if isinstance(key, basestring):
+                try:
+                    key = self._events[key]
+                except KeyError:
+                    key = self.getEventID(key)
+                    if key is None:
+                        continue
+            if self._eventsSubscribed >> key & 1:
+                return True
+        return False
 
     def queueEvent(self, event, expire=10):
         """
@@ -1218,9 +1373,14 @@ class Parser(object):
             return False
         elif event.type in self._handlers:  # queue only if there are handlers to listen for this event
             self.verbose('Queueing event %s : %s', self.getEventName(event.type), event.data)
+            now = monotonic()
+            if self._eventsBuffer is not None and self._eventsBufferThread == thread.get_ident():
+                self._eventsBuffer.append((now, now + expire, event))
+                return True
+
             try:
-                time.sleep(0.001)  # wait a bit so event doesnt get jumbled
-                self.queue.put((self.time(), self.time() + expire, event), True, 2)
+                # the event queue is FIFO: no need to wait for events not to get jumbled
+                self.queue.put((now, now + expire, event), True, 2)
                 return True
             except Queue.Full:
                 self.error('**** Event queue was full (%s)', self.queue.qsize())
@@ -1228,51 +1388,85 @@ class Parser(object):
 
         return False
 
+    def flushEvents(self):
+        """
+        Queue the events buffered while parsing a batch of game log lines.
+        """
+        events = self._eventsBuffer
+        self._eventsBuffer = None
+        if events:
+            try:
+                self.queue.put_many(events, True, 2)
+            except Queue.Full:
+                self.error('**** Event queue was full (%s)', self.queue.qsize())
+
     def handleEvents(self):
         """
         Event handler thread.
         """
+        workers = None
+        if self._eventWorkers > 0:
+            self.bot('Handling events with %s worker threads', self._eventWorkers)
+            workers = b3.events.EventWorkers(self, self._eventWorkers)
+
         while self.working:
             added, expire, event = self.queue.get(True)
             if event.type == self.getEventID('EVT_EXIT') or event.type == self.getEventID('EVT_STOP'):
                 self.working = False
 
-            event_name = self.getEventName(event.type)
-            self._eventsStats.add_event_wait((self.time() - added)*1000)
-            if self.time() >= expire:  # events can only sit in the queue until expire time
-                self.error('**** Event sat in queue too long: %s %s', event_name, self.time() - expire)
+            if workers:
+                workers.dispatch(added, expire, event)
             else:
-                nomore = False
-                for hfunc in self._handlers[event.type]:
-                    if not hfunc.isEnabled():
-                        continue
-                    elif nomore:
-                        break
+                self.handleEvent(added, expire, event)
+
+        if workers:
+            workers.stop()
 
-                    self.verbose('Parsing event: %s: %s', event_name, hfunc.__class__.__name__)
-                    timer_plugin_begin = time.clock()
-                    try:
-                        hfunc.parseEvent(event)
-                        time.sleep(0.001)
-                    except b3.events.VetoEvent:
-                        # plugin called for event hault, do not continue processing
-                        self.bot('Event %s vetoed by %s', event_name, str(hfunc))
-                        nomore = True
-                    except SystemExit, e:
-                        self.exitcode = e.code
-                    except Exception, msg:
-                        self.error('Handler %s could not handle event %s: %s: %s %s', hfunc.__class__.__name__,
-                                   event_name, msg.__class__.__name__, msg, extract_tb(sys.exc_info()[2]))
-                    finally:
-                        elapsed = time.clock() - timer_plugin_begin
-                        self._eventsStats.add_event_handled(hfunc.__class__.__name__, event_name, elapsed * 1000)
-                    
         self.bot('Shutting down event handler')
 
         # releasing lock if it was set by self.shutdown() for instance
         if self.exiting.locked():
             self.exiting.release()
 
+    def handleEvent(self, added, expire, event):
+        """
+        Run the handlers registered for the given event.
+        :param added: The time the event has been queued (monotonic clock)
+        :param expire: The time the event expires (monotonic clock)
+        :param event: The event to be handled
+        """
+        event_name = self.getEventName(event.type)
+        now = monotonic()
+        self._eventsStats.add_event_wait((now - added) * 1000)
+        if now >= expire:  # events can only sit in the queue until expire time
+            self.error('**** Event sat in queue too long: %s %s', event_name, now - expire)
+            self._eventsStats.add_event_expired(event_name)
+        else:
+            nomore = False
+            for hfunc in self._handlers[event.type]:
+                if not hfunc.isEnabled():
+                    continue
+                elif nomore:
+                    break
+
+                self.verbose('Parsing event: %s: %s', event_name, hfunc.__class__.__name__)
+                timer_plugin_begin = monotonic()
+                try:
+                    hfunc.parseEvent(event)
+                except b3.events.VetoEvent:
+                    # plugin called for event hault, do not continue processing
+                    self.bot('Event %s vetoed by %s', event_name, str(hfunc))
+                    self._eventsStats.add_event_vetoed(hfunc.__class__.__name__, event_name)
+                    nomore = True
+                except SystemExit, e:
+                    self.exitcode = e.code
+                except Exception, msg:
+                    self.error('Handler %s could not handle event %s: %s: %s %s', hfunc.__class__.__name__,
+                               event_name, msg.__class__.__name__, msg, extract_tb(sys.exc_info()[2]))
+                finally:
+                    elapsed = monotonic() - timer_plugin_begin
+                    self._eventsStats.add_event_handled(hfunc.__class__.__name__, event_name, elapsed * 1000)
+
     def write(self, msg, maxRetries=None, socketTimeout=None):
         """
         Write a message to Rcon/Console
@@ -1306,6 +1500,30 @@ class Parser(object):
         """
         return [game_log.readline()]
 
+    def __read_input_batch(self, game_log):
+        """
+        Read lines from the log file (batch mode).
+        New data is read as a single block: an incomplete trailing line is kept until the rest of it is
+        written in the log file and at most self.batchMaxLines lines are returned at once.
+        :param game_log: The gamelog file pointer
+        """
+        if len(self._linesPending) < self.batchMaxLines:
+            data = game_log.read()
+            if data:
+                if self._lineBuffer:
+                    data = self._lineBuffer + data
+                lines = data.split('\n')
+                self._lineBuffer = lines.pop()
+                self._linesPending.extend(lines)
+
+        if len(self._linesPending) <= self.batchMaxLines:
+            lines = self._linesPending
+            self._linesPending = []
+        else:
+            lines = self._linesPending[:self.batchMaxLines]
+            del self._linesPending[:self.batchMaxLines]
+        return lines
+
     def read(self):
         """
         Read from game server log file
@@ -1324,7 +1542,8 @@ class Parser(object):
                        'the log was probably either rotated or emptied. B3 will now re-adjust to the new '
                        'size of the log' % (str(self.input.tell()), str(filestats.st_size)))
             self.input.seek(0, os.SEEK_END)
-        # NOTE: __read is defined at runtime in __new__
+            self._lineBuffer = ''
+        # NOTE: __read is defined at runtime in __new__ (and overridden in __init__ in batch read mode)
         return self.__read(self.input)
 
     def shutdown(self):
@@ -1340,8 +1559,14 @@ class Parser(object):
                 if self._cron:
                     self.bot('Stopping cron')
                     self._cron.stop()
+                if self._eventsStatsServer:
+                    self.bot('Stopping event statistics server')
+                    self._eventsStatsServer.stop()
                 if self.storage:
                     self.bot('Shutting down database connection')
+                    # write what plugins queued while handling EVT_STOP
+                    self.storage.stopWriter()
+                    self.storage.stopPool()
                     self.storage.shutdown()
         except Exception, e:
             self.error(e)
@@ -1496,7 +1721,7 @@ class Parser(object):
         Instantiate the main Cron object.
         """
         if not self._cron:
-            self._cron = b3.cron.Cron(self)
+            self._cron = b3.cron.Cron(self, self._cronWorkers)
             self._cron.start()
         return self._cron
 
@@ -30,13 +30,13 @@ import socket
 import sys
 import time
 
-from collections import deque
+from threading import BoundedSemaphore
 from threading import Thread
 from threading import Event
 from threading import Lock
 
 __author__ = '82ndab-Bravo17, Courgette'
-__version__ = '1.2.1'
+__version__ = '1.3'
 
 ########################################################################################################################
 ##
@@ -100,6 +100,40 @@ class CommandFailedError(CommandError):
     pass
 
 
+class PendingCommand(object):
+    """
+    A command sent to the BattlEye server and waiting for its response.
+    """
+    def __init__(self, cmd):
+        """
+        Object constructor.
+        :param cmd: The command sent
+        """
+        self.cmd = cmd
+        self.sequence = None
+        self.response = None
+        self._event = Event()
+
+    def set_response(self, response):
+        """
+        Store the command response and wake up the thread waiting for it.
+        """
+        self.response = response
+        self._event.set()
+
+    def cancel(self):
+        """
+        Wake up the thread waiting for the response without any response.
+        """
+        self._event.set()
+
+    def wait(self, timeout):
+        """
+        Block until the response is received, the command is cancelled or the timeout is reached.
+        """
+        return self._event.wait(timeout)
+
+
 class BattleyeServer(Thread):
 
     def __init__(self, host, port, password):
@@ -120,30 +154,32 @@ class BattleyeServer(Thread):
         self.port = port
         self.password = password
 
-        self.command_queue = Queue.Queue([])    # put here commands to be sent
         self.observers = set()                  # functions to call when a BattleEye event is received
         self.read_queue = Queue.Queue([])       # get here packets received
-        self.sent_data_seq = []
+        self.sent_data_seq = {}                 # sequence numbers of the commands not replied to yet, with send time
         self.server = None
-        self.write_queue = deque([])            # put here packets to be sent
 
-        self._command_lock = Lock()             # only one command than be managed at once
         self._isconnected = False               # whether we are connected or not
-        self._multi_packet_response = {}        # some responses comes in multiple parts which are hold in this dict
+        self._multi_packet_response = {}        # parts of the multi packet responses, by sequence number
         self._stopEvent = Event()               # can make the threads stop
-        self._command_reply_event = Event()     # thread event used to notify the thread waiting for a response
+        self._pending_lock = Lock()             # guards the sequence numbers and the pending commands
+        self._send_lock = Lock()                # only one thread writes to the socket at once
 
-
-        self.pending_command = None             # holds the current command we are waitting a response for
-        self.pending_command_response = None    # holds the current command full response once received
+        self.max_pending_commands = 16          # how many commands can wait for their response at once
+        self.pending_commands = {}              # commands waiting for their response, by sequence number
         self.command_timeout = 3                # after how long should the thread waiting for the command response
                                                 # decides that no response will ever come
+        self._pending_slots = BoundedSemaphore(self.max_pending_commands)
 
         self.write_seq = 0
         self.last_write_time = 0
         self.crc_error_count = 0
         self.read_thread = None
-        self.write_thread = None
+
+        self.getLogger().info("connecting to BattlEye server at %s:%s" % (self.host, self.port))
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.connect((self.host, self.port))
+        self.server.settimeout(0.0001)
 
         self.server_thread = Thread(target=self.polling_thread, name="BE_polling")
         self.server_thread.setDaemon(True)
@@ -157,49 +193,33 @@ class BattleyeServer(Thread):
 
     def polling_thread(self):
         """
-        Starts a thread for reading/writing to the Battleye server.
+        Starts a thread reading from the Battleye server (packets are sent by the threads producing them).
         """
-        self.getLogger().info("connecting to BattlEye server at %s:%s" % (self.host, self.port))
-        self._isconnected = False
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.server.connect((self.host, self.port))
-        self.server.settimeout(0.0001)
-
         while not self.isStopped():
-            #self.getLogger().debug("Is socket ready")
-            readable, writable, exception = select.select([self.server],[self.server],[self.server], .5)
-            
-            if not exception:
-                if readable:
-                    try:
-                        while True:
-                            data = self.server.recv(8192)
-                            self.read_queue.put(data)
-                            # self.getLogger().debug("Read data: %s" % repr(data))
-                    except socket.timeout:
-                        # We've read all the data that there is currently, so move on.
-                        pass
-                    except socket.error, err: 
-                        self.getLogger().error("socket error %s" % err)
-                        self.stop()
-                elif writable:
-                    if len(self.write_queue):
-                        data = self.write_queue.popleft()
-                        self.getLogger().debug("data to send: %s" % repr(data))
-                        try:
-                            self.server.send(data)
-                        except Exception, err:
-                            self.getLogger().error("data send error, trying again: %s" % err, exc_info=err)
-                            self.write_queue.appendleft(data)
-                        else:
-                            #store seq_no, type, data
-                            if data[7:8] == chr(1):
-                                seq = ord(data[8:9])
-                                self.getLogger().debug("sent sequence was %s" % seq)
-                                self.sent_data_seq.append(seq)
-                    readable, writable, exception = select.select([self.server],[],[], .05)
-            else:
+            # block until there is something to read: the timeout is only
+            # there to notice that we have been stopped in the meantime
+            try:
+                readable, writable, exception = select.select([self.server], [], [self.server], 2)
+            except (select.error, socket.error), err:
+                if not self.isStopped():
+                    self.getLogger().error("socket error %s" % (err,))
+                    self.stop()
+                break
+
+            if exception:
                 self.stop()
+            elif readable:
+                try:
+                    while True:
+                        data = self.server.recv(8192)
+                        self.read_queue.put(data)
+                        # self.getLogger().debug("Read data: %s" % repr(data))
+                except socket.timeout:
+                    # We've read all the data that there is currently, so move on.
+                    pass
+                except socket.error, err:
+                    self.getLogger().error("socket error %s" % err)
+                    self.stop()
 
         self.getLogger().debug("ending polling thread")
 
@@ -214,16 +234,16 @@ class BattleyeServer(Thread):
             self.read_thread.setDaemon(True)
             self.read_thread.start()
 
-            self.write_thread = Thread(target=self.writing_thread, name="BE_write")
-            self.write_thread.setDaemon(True)
-            self.write_thread.start()
-
         while self._isconnected and not self.isStopped():
-            if self.crc_error_count > 10 or len(self.sent_data_seq) > 10:
-                self.getLogger().debug('CRC errors %s: commands not replied to %s' % (self.crc_error_count, self.sent_data_seq))
+            expired = time.time() - self.command_timeout
+            not_replied = [seq for seq, sent in self.sent_data_seq.items() if sent < expired]
+            if self.crc_error_count > 10 or len(not_replied) > 10:
+                self.getLogger().debug('CRC errors %s: commands not replied to %s' % (self.crc_error_count, not_replied))
                 # 10 + consecutive crc errors or 10 commands not replied to
                 self.stop()
-            time.sleep(10)
+            elif self.last_write_time + 30 < time.time():
+                self._command_no_wait(None) # keep connection alive
+            self._stopEvent.wait(10)
 
         self.getLogger().debug("ending server thread")
 
@@ -237,19 +257,16 @@ class BattleyeServer(Thread):
                     # Acknowledge server message receipt
                     packet = self.encode_packet(2, sequence, None)
                     self.getLogger().debug("server message sequence was %s" % sequence)
-                    self.write_queue.append(packet)
+                    self._send_packet(packet)
                     self._on_event(data.decode('UTF-8', 'replace'))
                 elif tp == 1:
                     #self.getLogger().debug('Command Response : %s' % repr(data))
-                    try:
-                        self.sent_data_seq.remove(sequence)
-                    except ValueError:
-                        pass
+                    self.sent_data_seq.pop(sequence, None)
                     self.crc_error_count = 0
                     if data[0:1] == chr(0):
-                        data = self._handle_multipacket_part(ord(data[1]), ord(data[2]), data[3:])
-                    if data:
-                        self._on_command_response(data.decode('UTF-8', 'replace'))
+                        data = self._handle_multipacket_part(sequence, ord(data[1]), ord(data[2]), data[3:])
+                    if data is not None:
+                        self._on_command_response(sequence, data.decode('UTF-8', 'replace'))
                 elif tp == 255:
                     #CRC Error
                     self.crc_error_count += 1
@@ -260,37 +277,13 @@ class BattleyeServer(Thread):
                 
         self.getLogger().info("ending reading thread")
 
-
-    def writing_thread(self):
-        self.getLogger().info("starting writing thread")
-        self.write_seq = 0
-        self.last_write_time = time.time()
-
-        def enqueue_packet(data):
-            self.write_queue.append(self.encode_packet(1, self.write_seq, data))
-            self.last_write_time = time.time()
-            self.write_seq += 1
-            if self.write_seq > 255:
-                self.write_seq -= 256
-
-        while self._isconnected and not self.isStopped():
-            try:
-                enqueue_packet(self.command_queue.get(timeout=2))
-            except Queue.Empty:
-                if self.last_write_time + 30 < time.time():
-                    enqueue_packet(None) # keep connection alive
-            except Exception, err:
-                self.getLogger().error("error in writing_thread", exc_info=err)
-
-        self.getLogger().info("ending writing thread")
-
     def login(self):
         """
         Authenticate on the Battleye server with given password.
         """
         self.getLogger().info("starting login")
         request =  self.encode_packet(0, None, self.password)
-        self.write_queue.append(request)
+        self._send_packet(request)
         login_response = False
         t = time.time()
         logged_in = None
@@ -324,6 +317,12 @@ class BattleyeServer(Thread):
             self._isconnected = False
 
     def command(self, cmd, timeout=None):
+        """
+        Send a command to the BattlEye server and return its response.
+        Many threads can send commands at once: each response is matched to its command by sequence number.
+        :param cmd: The command to send
+        :param timeout: How long to wait for the response (defaults to command_timeout)
+        """
         if not cmd:
             return
         if not self._isconnected:
@@ -331,8 +330,6 @@ class BattleyeServer(Thread):
         if self.isStopped():
             raise BattleyeError("BattlEye server stopped")
 
-        self._command_lock.acquire() # this will eventually wait for the lock to be released
-
         try:
             if timeout or not any(filter(lambda x: cmd.startswith(x + ' '), COMMANDS_WITH_NO_RESPONSE)):
                 return self._command_and_wait(cmd, timeout)
@@ -345,54 +342,160 @@ class BattleyeServer(Thread):
         except Exception, err:
             tp, value, traceback = sys.exc_info()
             raise CommandFailedError, ("command \"%s\" failed: %s" % (cmd, err), tp, value), traceback
-        finally:
-            self._command_lock.release() # release the lock so another command can be sent
+
+    def _next_sequence(self):
+        """
+        Return the next command sequence number, skipping the ones still waiting for a response.
+        Must be called with the _pending_lock held.
+        """
+        sequence = self.write_seq
+        while sequence in self.pending_commands:
+            sequence = (sequence + 1) % 256
+        self.write_seq = (sequence + 1) % 256
+        return sequence
+
+    def _send_packet(self, packet):
+        """
+        Send a packet to the BattlEye server.
+        """
+        self.getLogger().debug("data to send: %s" % repr(packet))
+        with self._send_lock:
+            for attempt in (1, 2):
+                try:
+                    self.server.send(packet)
+                except Exception, err:
+                    self.getLogger().error("data send error (attempt %s): %s" % (attempt, err), exc_info=err)
+                else:
+                    self.last_write_time = time.time()
+                    if packet[7:8] == chr(1):
+                        #store seq_no and send time
+                        seq = ord(packet[8:9])
+                        self.getLogger().debug("sent sequence was %s" % seq)
+                        self.sent_data_seq[seq] = self.last_write_time
+                    break
 
     def _command_no_wait(self, cmd):
         """
         Send a command and do not expect any response.
         """
-        self.command_queue.put(cmd)
+        with self._pending_lock:
+            sequence = self._next_sequence()
+        self._send_packet(self.encode_packet(1, sequence, cmd))
 
     def _command_and_wait(self, cmd, timeout=None):
         """
         Send command to the BattlEye server in a synchronous way.
         Calling this method will block until we receive the command response from the server or until we reach the timeout.
         """
-        self.pending_command = cmd
-        self.pending_command_response = None
-        self._command_no_wait(cmd)
-        response = self._wait_for_response(timeout)
+        if timeout is None:
+            timeout = self.command_timeout
+        self._pending_slots.acquire()
+        pending = self._send_pending_command(cmd)
+        return self._wait_for_response(pending, time.time() + timeout)
+
+    def _send_pending_command(self, cmd):
+        """
+        Register the command in the pending commands table, then send it.
+        The caller must have acquired a pending command slot.
+        """
+        pending = PendingCommand(cmd)
+        try:
+            with self._pending_lock:
+                pending.sequence = self._next_sequence()
+                self.pending_commands[pending.sequence] = pending
+                # forget the parts of a response to a previous command having the same sequence number
+                self._multi_packet_response.pop(pending.sequence, None)
+            self._send_packet(self.encode_packet(1, pending.sequence, cmd))
+        except:
+            self._release_pending_command(pending)
+            raise
+        return pending
+
+    def _release_pending_command(self, pending):
+        """
+        Remove the command from the pending commands table and free its slot.
+        """
+        with self._pending_lock:
+            if self.pending_commands.get(pending.sequence) is pending:
+                del self.pending_commands[pending.sequence]
+            self._multi_packet_response.pop(pending.sequence, None)
+        self._pending_slots.release()
+
+    def _wait_for_response(self, pending, expire_time):
+        """
+        Block until response for the given pending command has been received or until expire_time is reached.
+        """
+        self.getLogger().debug("waiting response for command #%s: %s " % (pending.sequence, pending.cmd))
+        try:
+            pending.wait(max(expire_time - time.time(), 0))
+        finally:
+            self._release_pending_command(pending)
+
+        response = pending.response
+        if response is None:
+            if self.isStopped():
+                raise BattleyeError("BattlEye server stopped")
+            # then we stopped waitting because the timeout is reached
+            raise CommandTimeoutError("no response for command : %s" % pending.cmd)
         if response == "Unknown command":
-            raise CommandFailedError("unknown command: %s" % cmd)
+            raise CommandFailedError("unknown command: %s" % pending.cmd)
+        # we have our response \o/
         return response
 
-    def _wait_for_response(self, timeout):
+    def commands(self, cmds, timeout=None, raise_errors=True):
         """
-        Block until response to for the current command has been received or until timeout is reached.
+        Send many commands to the BattlEye server and gather their responses.
+        Up to max_pending_commands commands are in flight at once instead of waiting for each
+        response before sending the next command.
+        :param cmds: The list of commands to send
+        :param timeout: How long to wait for the responses (defaults to command_timeout)
+        :param raise_errors: If False, the exception raised by a failed command is returned in place of its response
+        :return: The list of the responses, in the same order as the commands
         """
+        if not self._isconnected:
+            raise NetworkError("not connected to BattlEye server")
         if self.isStopped():
-            return
-
+            raise BattleyeError("BattlEye server stopped")
         if timeout is None:
             timeout = self.command_timeout
 
-        self.getLogger().debug("waiting response for command: %s " % self.pending_command)
-        self._command_reply_event.clear()
-        self._command_reply_event.wait(timeout)
-
-        cmd = self.pending_command
-        self.pending_command = None
-
-        response = self.pending_command_response
-        self.pending_command_response = None
+        cmds = list(cmds)
+        responses = [None] * len(cmds)
+        errors = []
+        pendings = []
+
+        def gather():
+            expire_time = time.time() + timeout
+            for index, pending in pendings:
+                try:
+                    responses[index] = self._wait_for_response(pending, expire_time)
+                except BattleyeError, err:
+                    # keep gathering the other responses so that no slot is left behind
+                    errors.append(err)
+                    responses[index] = err
+            del pendings[:]
+
+        for index, cmd in enumerate(cmds):
+            if not cmd:
+                continue
+            if any(filter(lambda x: cmd.startswith(x + ' '), COMMANDS_WITH_NO_RESPONSE)):
+                self._command_no_wait(cmd)
+                continue
+            if not self._pending_slots.acquire(False):
+                # all the slots are taken: collect our own responses before
+                # waiting for a free slot so that we never wait on ourselves
+                gather()
+                self._pending_slots.acquire()
+            try:
+                pendings.append((index, self._send_pending_command(cmd)))
+            except:
+                gather()
+                raise
+        gather()
 
-        if not response:
-            # then we stopped waitting because the timeout is reached
-            raise CommandTimeoutError("no response for command : %s" % cmd)
-        else:
-            # we have our response \o/
-            return response
+        if errors and raise_errors:
+            raise errors[0]
+        return responses
 
     def compute_crc(self, data):
         buf = buffer(data)
@@ -440,30 +543,25 @@ class BattleyeServer(Thread):
         #self.getLogger().debug("Request is type : %s" % type(request))
         return request
 
-    def _handle_multipacket_part(self, total_num_packets, current_packet_index, data):
+    def _handle_multipacket_part(self, sequence, total_num_packets, current_packet_index, data):
         """
-        Command responses can be received over multiple packest.
+        Command responses can be received over multiple packets: they are reassembled per sequence number.
+        Return the full response once all its parts are received, None otherwise.
+        Parts of a command no longer waiting for its response (i.e: timed out) are dropped: the sequence number
+        may be reused by another command.
         """
-        self._multi_packet_response[current_packet_index] = data
-        if current_packet_index == total_num_packets - 1:
-            # we got all the packets that make a full command response
-            data = ''
-            for p in range(0, total_num_packets):
-                if p in self._multi_packet_response:
-                    data = data + self._multi_packet_response[p]
-                else:
-                    self.getLogger().debug('part #%s of multi packet response is missing' % p)
-                    for pp in range(0, total_num_packets-1):
-                        self._multi_packet_response[pp] = ''
-                    return 'Error retrieving Bans list from server'
-
+        with self._pending_lock:
+            if sequence not in self.pending_commands:
+                self.getLogger().debug('dropping part #%s of response to command #%s: no command waiting for it'
+                                       % (current_packet_index, sequence))
+                return None
+            parts = self._multi_packet_response.setdefault(sequence, {})
+            parts[current_packet_index] = data
+            if len(parts) < total_num_packets:
+                return None
             # Packet reconstituted, so delete segments
-            for pp in range(0, total_num_packets-1):
-                del self._multi_packet_response[pp]
-
-            return data
-        else:
-            return
+            del self._multi_packet_response[sequence]
+        return ''.join(parts.get(p, '') for p in range(0, total_num_packets))
 
     def _on_event(self, message):
         """
@@ -473,13 +571,15 @@ class BattleyeServer(Thread):
         for func in self.observers:
             func(message)
 
-    def _on_command_response(self, message):
+    def _on_command_response(self, sequence, message):
         """
         We received a full Command response message (one or more type 1 BattlEye packets).
         """
-        self.getLogger().debug("received BattlEye command response : %s" % message)
-        self.pending_command_response = message
-        self._command_reply_event.set() # notify the waitting thread that a response is ready
+        self.getLogger().debug("received BattlEye command #%s response : %s" % (sequence, message))
+        with self._pending_lock:
+            pending = self.pending_commands.pop(sequence, None)
+        if pending:
+            pending.set_response(message) # notify the waitting thread that a response is ready
 
     def __getattr__(self, name):
         if name == 'connected':
@@ -508,6 +608,12 @@ class BattleyeServer(Thread):
         self.getLogger().debug("stopping threads...")
         self._stopEvent.set()
         self._disconnect()
+        # wake up the threads waiting for a command response
+        with self._pending_lock:
+            pendings = self.pending_commands.values()
+            self.pending_commands.clear()
+        for pending in pendings:
+            pending.cancel()
 
     def isStopped(self):
         return self._stopEvent.is_set()
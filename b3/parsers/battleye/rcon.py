@@ -35,7 +35,7 @@ from b3.parsers.battleye.protocol import CommandError
 from b3.parsers.battleye.protocol import CommandTimeoutError
 
 __author__ = 'Courgette'
-__version__ = '1.2'
+__version__ = '1.3'
 
 
 class Rcon(object):
@@ -48,8 +48,23 @@ class Rcon(object):
         self.battleye_server = battleye_server
     
     def writelines(self, lines):
-        for line in lines:
-            self.write(line)
+        """
+        Send many commands at once to the BattlEye server.
+        :param lines: The list of commands to send
+        :return: The list of the responses, in the same order as the commands
+        """
+        if not self.battleye_server or not self.battleye_server.connected:
+            return
+        lines = list(lines)
+        self.console.bot(u'RCON > %s' % repr(lines))
+        responses = self.battleye_server.commands(lines, raise_errors=False)
+        for response in responses:
+            if isinstance(response, CommandTimeoutError):
+                self.console.error("RCON # %s" % response)
+            elif isinstance(response, CommandError):
+                self.console.error("RCON ERROR : %s" % response)
+        self.console.bot(u'RCON < %s' % repr(responses))
+        return responses
 
     def write(self, cmd, *args, **kwargs):
         if not self.battleye_server or not self.battleye_server.connected:
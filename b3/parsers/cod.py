@@ -339,6 +339,9 @@ class CodParser(AbstractParser):
         elif attacker.team != b3.TEAM_UNKNOWN and attacker.team == victim.team:
             eventkey = 'EVT_CLIENT_DAMAGE_TEAM'
 
+        if not self.isEventSubscribed(eventkey):
+            return None
+
         data = (float(match.group('damage')), match.group('aweap'), match.group('dlocation'), match.group('dtype'))
         return self.getEvent(eventkey, data=data, client=attacker, target=victim)
 
@@ -276,12 +276,8 @@ class EtproParser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        m = None
-        line = re.sub(self._lineClear, '', line, 1)
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.matchLine(line)
         if m:
             client = None
             target = None
@@ -23,7 +23,7 @@
 # ################################################################### #
 
 __author__  = 'Courgette'
-__version__ = '2.1'
+__version__ = '2.2'
 
 debug = True
 
@@ -31,6 +31,8 @@ import socket
 import string
 import b3.parsers.frostbite.protocol as protocol
 
+from b3.parsers.frostbite.framing import PacketBuffer
+
 
 class FrostbiteException(Exception):
     pass
@@ -86,7 +88,7 @@ class FrostbiteConnection(object):
         """
         try:
             self.console.debug('opening FrostbiteConnection socket')
-            self._receiveBuffer = ''
+            self._receiveBuffer = PacketBuffer()
             self._serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self._serverSocket.connect((self._host, self._port))
         except Exception, err:
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+__version__ = '1.0'
+
+import struct
+
+# a Frostbite packet is made of a 12 bytes header (sequence/flags, packet size, number of words)
+# followed by the words, each one encoded as: size (int32), content, NUL
+_int32 = struct.Struct('<I')
+_header = struct.Struct('<III')
+
+
+def _packWords(words):
+    """
+    Encode a list of words.
+    :param words: The list of words
+    :return: A tuple (list of encoded parts, total size of the parts)
+    """
+    pack = _int32.pack
+    parts = []
+    size = 0
+    for word in words:
+        word = str(word)
+        parts.append(pack(len(word)) + word + '\x00')
+        size += len(word) + 5
+    return parts, size
+
+
+def encodeWords(words):
+    """
+    Encode a list of words.
+    :param words: The list of words
+    :return: A tuple (size of the encoded words, encoded words)
+    """
+    parts, size = _packWords(words)
+    return size, ''.join(parts)
+
+
+def encodePacket(isFromServer, isResponse, sequence, words):
+    """
+    Encode a packet: the words are joined once into the packet instead of growing a string word after word.
+    :param isFromServer: Whether the command in this command/response pair originated on the server
+    :param isResponse: Whether this packet is a response
+    :param sequence: The sequence number
+    :param words: The list of words
+    """
+    parts, size = _packWords(words)
+    header = sequence & 0x3fffffff
+    if isFromServer:
+        header += 0x80000000
+    if isResponse:
+        header += 0x40000000
+    return _header.pack(header, size + 12, len(parts)) + ''.join(parts)
+
+
+def decodeWords(data, offset, end):
+    """
+    Decode the words found between offset and end.
+    :param data: The packet data (str)
+    :param offset: Where the first word starts
+    :param end: Where the words end
+    """
+    # Struct.unpack() on a 4 bytes slice beats Struct.unpack_from() on CPython 2 (no keyword arguments parsing)
+    unpack = _int32.unpack
+    words = []
+    append = words.append
+    while offset < end:
+        start = offset + 4
+        offset = start + unpack(data[offset:start])[0] + 1
+        append(data[start:offset - 1])
+    return words
+
+
+def decodePacket(data, offset=0):
+    """
+    Decode a packet: the words are sliced out of the packet data one after the other.
+    Return format is: [is_from_server, is_response, sequence, words]
+    :param data: The packet data (str)
+    :param offset: Where the packet starts
+    """
+    header, size, _ = _header.unpack(data[offset:offset + 12])
+    words = decodeWords(data, offset + 12, offset + size)
+    return [header & 0x80000000, header & 0x40000000, header & 0x3fffffff, words]
+
+
+class PacketBuffer(object):
+    """
+    Cut a Frostbite TCP stream into packets.
+    Data are received straight into a preallocated bytearray and each packet is copied out of it only once, when
+    complete: consumed bytes are reclaimed by moving the incomplete tail (if any) back to the beginning of the buffer
+    when room is needed, instead of slicing the whole buffer after every packet.
+    """
+    def __init__(self, size=16384):
+        """
+        Object constructor.
+        :param size: The initial size of the buffer (it grows when a packet does not fit)
+        """
+        self._data = bytearray(size)
+        self._view = memoryview(self._data)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def reserve(self, size):
+        """
+        Return a writable memoryview of at least size bytes following the buffered data.
+        :param size: The number of bytes needed
+        """
+        if len(self._data) - self._end < size:
+            pending = self._end - self._start
+            if len(self._data) - pending < size:
+                data = bytearray(max(2 * len(self._data), pending + size))
+                data[:pending] = self._view[self._start:self._end]
+                self._data = data
+                self._view = memoryview(data)
+            elif pending:
+                self._data[:pending] = self._view[self._start:self._end].tobytes()
+            self._start = 0
+            self._end = pending
+        return self._view[self._end:]
+
+    def commit(self, size):
+        """
+        Account for size bytes written in the memoryview returned by reserve().
+        :param size: The number of bytes written
+        """
+        self._end += size
+
+    def feed(self, data):
+        """
+        Append data to the buffer.
+        :param data: The data received
+        """
+        size = len(data)
+        self.reserve(size)[:size] = data
+        self.commit(size)
+
+    def recvFrom(self, sock, size=8192):
+        """
+        Receive data from a socket straight into the buffer.
+        Return the number of bytes received (0 means that the remote end closed the connection).
+        :param sock: The socket to read from
+        :param size: The maximum number of bytes to read
+        """
+        received = sock.recv_into(self.reserve(size), size)
+        self.commit(received)
+        return received
+
+    def _packetSize(self):
+        """
+        Return the size of the first packet if it is complete, None otherwise.
+        """
+        if self._end - self._start < 8:
+            return None
+        size = _int32.unpack_from(self._data, self._start + 4)[0]
+        if size < 12:
+            raise ValueError('invalid Frostbite packet size: %s' % size)
+        if self._end - self._start < size:
+            return None
+        return size
+
+    def hasPacket(self):
+        """
+        Tell whether the buffer holds a complete packet.
+        """
+        return self._packetSize() is not None
+
+    def popPacket(self):
+        """
+        Remove the first complete packet from the buffer and return it undecoded (None if there is none).
+        """
+        size = self._packetSize()
+        if size is None:
+            return None
+        packet = self._view[self._start:self._start + size].tobytes()
+        self._start += size
+        return packet
+
+    def decodePacket(self):
+        """
+        Remove the first complete packet from the buffer and return it decoded (None if there is none).
+        Return format is the one of decodePacket().
+        """
+        packet = self.popPacket()
+        if packet is None:
+            return None
+        return decodePacket(packet)
@@ -22,11 +22,15 @@
 #                                                                     #
 # ################################################################### #
 
-__version__ = '1.1'
+__version__ = '1.2'
 
 import socket
 
 from struct import *
+from b3.parsers.frostbite.framing import decodePacket
+from b3.parsers.frostbite.framing import decodeWords
+from b3.parsers.frostbite.framing import encodePacket
+from b3.parsers.frostbite.framing import encodeWords
 
 try:
     from hashlib import md5 as newmd5
@@ -58,37 +62,15 @@ def DecodeInt32(data):
     
     
 def EncodeWords(words):
-    size = 0
-    encodedWords = ''
-    for word in words:
-        strWord = str(word)
-        encodedWords += EncodeInt32(len(strWord))
-        encodedWords += strWord
-        encodedWords += '\x00'
-        size += len(strWord) + 5
-    
-    return size, encodedWords
+    return encodeWords(words)
 
 
 def DecodeWords(size, data):
-    numWords = DecodeInt32(data[0:])
-    words = []
-    offset = 0
-    while offset < size:
-        wordLen = DecodeInt32(data[offset : offset + 4])        
-        word = data[offset + 4 : offset + 4 + wordLen]
-        words.append(word)
-        offset += wordLen + 5
-
-    return words
+    return decodeWords(data, 0, size)
 
 
 def EncodePacket(isFromServer, isResponse, sequence, words):
-    encodedHeader = EncodeHeader(isFromServer, isResponse, sequence)
-    encodedNumWords = EncodeInt32(len(words))
-    [wordsSize, encodedWords] = EncodeWords(words)
-    encodedSize = EncodeInt32(wordsSize + 12)
-    return encodedHeader + encodedSize + encodedNumWords + encodedWords
+    return encodePacket(isFromServer, isResponse, sequence, words)
 
 
 def DecodePacket(data):
@@ -102,10 +84,7 @@ def DecodePacket(data):
         sequence = sequence number
         words = list of words
     """
-    [isFromServer, isResponse, sequence] = DecodeHeader(data)
-    wordsSize = DecodeInt32(data[4:8]) - 12
-    words = DecodeWords(wordsSize, data[12:])
-    return [isFromServer, isResponse, sequence, words]
+    return decodePacket(data)
 
 clientSequenceNr = 0
 
@@ -167,22 +146,16 @@ def containsCompletePacket(data):
 
 def receivePacket(_socket, receiveBuffer):
     """
-    Wait until the local receive buffer contains a full packet (appending data from the network socket),
-    then split receive buffer into first packet and remaining buffer data
+    Wait until the receive buffer (a PacketBuffer) contains a full packet (receiving data from the network socket),
+    then remove the first packet from the buffer and return it along with the buffer
     """
-    while not containsCompletePacket(receiveBuffer):
-        data = _socket.recv(4096)  # was 16384
+    while not receiveBuffer.hasPacket():
         # make sure we raise a socket error when the socket is hanging
         # on a loose end (receiving no data after server restart)
-        if not data:
+        if not receiveBuffer.recvFrom(_socket, 4096):
             raise socket.error('no data received: remote end unexpectedly closed socket')
-        receiveBuffer += data
-
-    packetSize = DecodeInt32(receiveBuffer[4:8])
-    packet = receiveBuffer[0:packetSize]
-    receiveBuffer = receiveBuffer[packetSize:len(receiveBuffer)]
 
-    return [packet, receiveBuffer]
+    return [receiveBuffer.popPacket(), receiveBuffer]
 
 ########################################################################################################################
 # EXAMPLE PROGRAM
@@ -827,12 +827,13 @@ class AbstractParser(b3.parser.Parser):
     def authorizeClients(self):
         """
         For all connected players, fill the client object with properties allowing to find
-        the user in the database (usualy guid, or punkbuster id, ip) and call the
-        Client.auth() method.
+        the user in the database (usualy guid, or punkbuster id, ip) and authorize them
+        all at once with the Clients.authorize() method.
         """
         players = self.getPlayerList()
         self.verbose('authorizeClients() = %s' % players)
 
+        clients = []
         for cid, p in players.iteritems():
             sp = self.clients.getByCID(cid)
             if sp:
@@ -845,7 +846,9 @@ class AbstractParser(b3.parser.Parser):
                 if newTeam is not None:
                     sp.team = self.getTeam(newTeam)
                 sp.teamId = int(newTeam)
-                sp.auth()
+                clients.append(sp)
+
+        self.clients.authorize(clients)
 
     def sync(self):
         """
@@ -22,7 +22,7 @@
 #                                                                     #
 # ################################################################### #
 
-__version__ = '1.2'
+__version__ = '1.4'
 
 import logging
 import time
@@ -33,6 +33,11 @@ import hashlib
 
 from struct import pack
 from struct import unpack
+from b3.parsers.frostbite.framing import PacketBuffer
+from b3.parsers.frostbite.framing import decodePacket
+from b3.parsers.frostbite.framing import decodeWords
+from b3.parsers.frostbite.framing import encodePacket
+from b3.parsers.frostbite.framing import encodeWords
 
 
 def EncodeHeader(isFromServer, isResponse, sequence):
@@ -58,37 +63,15 @@ def DecodeInt32(data):
     
     
 def EncodeWords(words):
-    size = 0
-    encodedWords = ''
-    for word in words:
-        strWord = str(word)
-        encodedWords += EncodeInt32(len(strWord))
-        encodedWords += strWord
-        encodedWords += '\x00'
-        size += len(strWord) + 5
-    
-    return size, encodedWords
+    return encodeWords(words)
 
 
 def DecodeWords(size, data):
-    numWords = DecodeInt32(data[0:])
-    words = []
-    offset = 0
-    while offset < size:
-        wordLen = DecodeInt32(data[offset : offset + 4])        
-        word = data[offset + 4 : offset + 4 + wordLen]
-        words.append(word)
-        offset += wordLen + 5
-
-    return words
+    return decodeWords(data, 0, size)
 
 
 def EncodePacket(isFromServer, isResponse, sequence, words):
-    encodedHeader = EncodeHeader(isFromServer, isResponse, sequence)
-    encodedNumWords = EncodeInt32(len(words))
-    [wordsSize, encodedWords] = EncodeWords(words)
-    encodedSize = EncodeInt32(wordsSize + 12)
-    return encodedHeader + encodedSize + encodedNumWords + encodedWords
+    return encodePacket(isFromServer, isResponse, sequence, words)
 
 
 def DecodePacket(data):
@@ -102,10 +85,7 @@ def DecodePacket(data):
         sequence = sequence number
         words = list of words
     """
-    [isFromServer, isResponse, sequence] = DecodeHeader(data)
-    wordsSize = DecodeInt32(data[4:8]) - 12
-    words = DecodeWords(wordsSize, data[12:])
-    return [isFromServer, isResponse, sequence, words]
+    return decodePacket(data)
 
 
 clientSequenceNr = 0
@@ -168,23 +148,16 @@ def containsCompletePacket(data):
 
 def receivePacket(_socket, receiveBuffer):
     """
-    Wait until the local receive buffer contains a full packet (appending data from the network socket),
-    then split receive buffer into first packet and remaining buffer data
+    Wait until the receive buffer (a PacketBuffer) contains a full packet (receiving data from the network socket),
+    then remove the first packet from the buffer and return it along with the buffer
     """
-    while not containsCompletePacket(receiveBuffer):
-        data = _socket.recv(4096) #was 16384
+    while not receiveBuffer.hasPacket():
         # make sure we raise a socket error when the socket is hanging
         # on a loose end (receiving no data after server restart)
-        if not data:
+        if not receiveBuffer.recvFrom(_socket, 4096):
             raise socket.error('no data received - Remote end unexpectedly closed socket')
-        receiveBuffer += data
-
-    packetSize = DecodeInt32(receiveBuffer[4:8])
 
-    packet = receiveBuffer[0:packetSize]
-    receiveBuffer = receiveBuffer[packetSize:len(receiveBuffer)]
-
-    return [packet, receiveBuffer]
+    return [receiveBuffer.popPacket(), receiveBuffer]
 
 
 class FrostbiteError(Exception):
@@ -224,7 +197,9 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         :param port: The Frostbite2 server port
         """
         asyncore.dispatcher_with_send.__init__(self)
-        self._buffer_in = ''
+        self._buffer_in = PacketBuffer()
+        # commands are sent from many threads while the asyncore loop flushes the output buffer
+        self._send_lock = threading.RLock()
         self.getLogger().info("connecting")
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         asyncore.dispatcher_with_send.connect(self, (host, port))
@@ -260,11 +235,11 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         else:
             words = command
 
-        request = EncodeClientRequest(words)
-        [sequence, words] = DecodePacket(request)[2:]
-
-        self.getLogger().debug("sending command request #%i: %s " % (sequence, words))
-        asyncore.dispatcher_with_send.send(self, request)
+        with self._send_lock:
+            request = EncodeClientRequest(words)
+            [sequence, words] = DecodePacket(request)[2:]
+            self.getLogger().debug("sending command request #%i: %s " % (sequence, words))
+            self.send(request)
 
         return sequence
 
@@ -276,6 +251,14 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
 
     def getLogger(self):
         return logging.getLogger("FrostbiteDispatcher")
+
+    def send(self, data):
+        with self._send_lock:
+            asyncore.dispatcher_with_send.send(self, data)
+
+    def handle_write(self):
+        with self._send_lock:
+            asyncore.dispatcher_with_send.handle_write(self)
     
     def handle_connect(self):
         self.getLogger().debug("handle_connect")
@@ -291,23 +274,33 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         """
         Called when the asynchronous loop detects that a read() call on the channel's socket will succeed.
         """
-        # received raw data
-        data = self.recv(8192)
-        self._buffer_in += data
-        self.getLogger().debug('read %s char from Frostbite2 gameserver' % len(data))
+        # received raw data: straight into the receive buffer (see asyncore.dispatcher.recv)
+        try:
+            size = self._buffer_in.recvFrom(self.socket, 8192)
+        except socket.error, why:
+            if why.args[0] in asyncore._DISCONNECTED:
+                self.handle_close()
+                return
+            raise
+
+        if not size:
+            self.handle_close()
+            return
+
+        self.getLogger().debug('read %s char from Frostbite2 gameserver' % size)
 
         # cook it into Frosbite packets
-        while containsCompletePacket(self._buffer_in):
-            packetSize = DecodeInt32(self._buffer_in[4:8])
-            packet = self._buffer_in[0:packetSize]
-            self._buffer_in = self._buffer_in[packetSize:len(self._buffer_in)]
+        packet = self._buffer_in.decodePacket()
+        while packet:
             self.handle_packet(packet)
-            
+            packet = self._buffer_in.decodePacket()
+
     def handle_packet(self, packet):
         """
         Called when a full Frosbite packet has been received.
+        :param packet: The decoded packet: [is_from_server, is_response, sequence, words]
         """
-        [originServer, isResponse, sequence, words] = DecodePacket(packet)
+        [originServer, isResponse, sequence, words] = packet
         self.getLogger().info("handle_packet(%s)" % repr([originServer, isResponse, sequence, words]))
         if not isResponse:
             # acknowledge the server
@@ -323,7 +316,7 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
                 self.handle_frostbite_command_response(sequence, words)
             else:
                 self.getLogger().warn("received a bad packet from frosbite server pretending "
-                                      "being a request from us: %s" % repr(DecodePacket(packet)))
+                                      "being a request from us: %s" % repr(packet))
 
     def handle_frostbite_event(self, words):
         self.getLogger().debug("received a game event from frosbite server: %s" % repr(words))
@@ -336,6 +329,42 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
             self._frostbite_command_response_handler(command_id, words)
     
 
+class PendingCommand(object):
+    """
+    A command sent to the Frostbite server and waiting for its reply.
+    """
+    def __init__(self, command_id, command):
+        """
+        Object constructor.
+        :param command_id: The command sequence number
+        :param command: The command words
+        """
+        self.command_id = command_id
+        self.command = command
+        self.response = None
+        self._event = threading.Event()
+
+    def set_response(self, words):
+        """
+        Store the command reply and wake up the thread waiting for it.
+        """
+        self.response = words
+        self._event.set()
+
+    def cancel(self):
+        """
+        Wake up the thread waiting for the reply without any reply.
+        """
+        self._event.set()
+
+    def wait(self, timeout):
+        """
+        Block until the reply is received, the command is cancelled or the timeout is reached.
+        Return False if the timeout was reached.
+        """
+        return self._event.wait(timeout)
+
+
 class FrostbiteServer(threading.Thread):
     """
     Thread opening a connection to a Frostbite game server and providing
@@ -351,8 +380,10 @@ class FrostbiteServer(threading.Thread):
         self.command_timeout = command_timeout
         self.frostbite_dispatcher.set_frostbite_event_hander(self._on_event)
         self.frostbite_dispatcher.set_frostbite_command_response_handler(self._on_command_response)
+        # replies are matched to the commands in flight by sequence number: every
+        # caller waits on its own PendingCommand and is woken up by its own reply only
         self.pending_commands = {}
-        self.__command_reply_event = threading.Event()
+        self._pending_lock = threading.Lock()
         self.observers = set()
         # ok start working
         self.start()
@@ -389,19 +420,45 @@ class FrostbiteServer(threading.Thread):
         if command is None:
             return None
 
-        command_id = self.frostbite_dispatcher.send_command(*command)
-        self.pending_commands[command_id] = None
-        self.getLogger().debug("command #%i sent. %s " % (command_id, repr(command)))
-        
-        response = self._wait_for_response(command_id)
-        if response[0] in ('CommandDisallowedOnRanked', 'CommandDisallowedOnOfficial'):
-            raise CommandDisallowedError(response)
-        elif response[0] == 'UnknownCommand':
-            raise CommandUnknownCommandError(response)
-        elif response[0] != "OK":
-            raise CommandFailedError(response)
-        else:
-            return response[1:]
+        pending = self._send_command(command)
+        response = self._wait_for_response(pending, time.time() + self.command_timeout)
+        return self._check_response(response)
+
+    def commands(self, commands, raise_errors=True):
+        """
+        Send many commands to the Frostbite server at once and gather their replies.
+        All the commands are in flight at the same time over the connection instead of waiting
+        for each reply before sending the next command.
+        :param commands: A list of commands: each one is either a single word or a tuple of words
+        :param raise_errors: If False, the exception raised by a failed command is returned in place of its reply
+        :return: The list of the replies, in the same order as the commands
+        """
+        if not self.connected:
+            raise NetworkError("not connected")
+
+        self.getLogger().info("commands : %s " % repr(commands))
+        pendings = []
+        for command in commands:
+            if type(command) in (tuple, list):
+                command = (tuple(command),)
+            else:
+                command = (command,)
+            pendings.append(self._send_command(command))
+
+        expire_time = time.time() + self.command_timeout
+        responses = []
+        error = None
+        for pending in pendings:
+            try:
+                responses.append(self._check_response(self._wait_for_response(pending, expire_time)))
+            except FrostbiteError, err:
+                # keep gathering the other replies so that none of them is left behind
+                error = error or err
+                responses.append(err)
+
+        if error and raise_errors:
+            raise error
+        return responses
 
     def auth(self):
         """
@@ -423,6 +480,7 @@ class FrostbiteServer(threading.Thread):
     def stop(self):
         self._stopEvent.set()
         self.close()
+        self._cancel_pending_commands()
     
     ####################################################################################################################
     #                                                                                                                  #
@@ -455,10 +513,14 @@ class FrostbiteServer(threading.Thread):
         try:
             while not self.isStopped():
                 asyncore.loop(count=1, timeout=1)
+                if not self.connected:
+                    # nobody is going to reply
+                    self._cancel_pending_commands()
         except KeyboardInterrupt:
             pass
         finally:
             self.frostbite_dispatcher.close()
+            self._cancel_pending_commands()
         self.getLogger().info('end loop')
 
     def _on_event(self, words):
@@ -468,32 +530,66 @@ class FrostbiteServer(threading.Thread):
 
     def _on_command_response(self, command_id, words):
         self.getLogger().debug("received Frostbite command #%i response: %s" % (command_id, repr(words)))
-        if command_id not in self.pending_commands:
+        with self._pending_lock:
+            pending = self.pending_commands.pop(command_id, None)
+        if pending is None:
             self.getLogger().warn("dropping Frostbite command #%i response as we are not waiting for it anymore" % command_id)
         else:
-            self.pending_commands[command_id] = words
-            self.__command_reply_event.set()
+            pending.set_response(words)
 
-    def _wait_for_response(self, command_id):
+    def _send_command(self, command):
         """
-        Block until response to for given command_id has been received or until timeout is reached.
+        Send a command and register it as waiting for its reply.
+        The command is registered before the asyncore loop can handle its reply.
+        :param command: The command words, as given to FrostbiteDispatcher.send_command()
         """
-        expire_time = time.time() + self.command_timeout
-        while not self.isStopped() and command_id in self.pending_commands and self.pending_commands[command_id] is None:
-            if not self.connected:
-                raise NetworkError("Lost connection to Frostbite2 server")
-            if time.time() >= expire_time:
-                del self.pending_commands[command_id]
-                raise CommandTimeoutError("did not receive any response for sequence #%i" % command_id)
-            self.getLogger().debug("waiting for some command reply #%i: %r " % (command_id, self.pending_commands))
-            self.__command_reply_event.clear()
-            self.__command_reply_event.wait(self.command_timeout)
-        try:
-            response = self.pending_commands[command_id]
-            del self.pending_commands[command_id]
-            return response
-        except KeyError:
-            raise CommandTimeoutError("did not receive any response for sequence #%i" % command_id)
+        with self._pending_lock:
+            command_id = self.frostbite_dispatcher.send_command(*command)
+            pending = self.pending_commands[command_id] = PendingCommand(command_id, command)
+        self.getLogger().debug("command #%i sent. %s " % (command_id, repr(command)))
+        return pending
+
+    def _cancel_pending_commands(self):
+        """
+        Wake up all the threads waiting for a command reply.
+        """
+        with self._pending_lock:
+            pendings = self.pending_commands.values()
+            self.pending_commands.clear()
+        for pending in pendings:
+            pending.cancel()
+
+    def _wait_for_response(self, pending, expire_time):
+        """
+        Block until response to the given command has been received or until timeout is reached.
+        :param pending: The PendingCommand object returned by _send_command()
+        :param expire_time: When to give up waiting
+        """
+        self.getLogger().debug("waiting for command reply #%i" % pending.command_id)
+        if not pending.wait(max(expire_time - time.time(), 0)):
+            with self._pending_lock:
+                self.pending_commands.pop(pending.command_id, None)
+            # the reply may have come in the meantime
+            if pending.response is None:
+                raise CommandTimeoutError("did not receive any response for sequence #%i" % pending.command_id)
+        if pending.response is None:
+            raise NetworkError("Lost connection to Frostbite2 server")
+        return pending.response
+
+    @staticmethod
+    def _check_response(response):
+        """
+        Raise the exception matching a failed command reply, return the reply words otherwise.
+        :param response: The command reply words
+        """
+        if response[0] in ('CommandDisallowedOnRanked', 'CommandDisallowedOnOfficial'):
+            raise CommandDisallowedError(response)
+        elif response[0] == 'UnknownCommand':
+            raise CommandUnknownCommandError(response)
+        elif response[0] != "OK":
+            raise CommandFailedError(response)
+        else:
+            return response[1:]
 
 ########################################################################################################################
 # EXAMPLE PROGRAM                                                                                                      #
@@ -34,7 +34,7 @@ Then you can expect this class to work like the other Rcon classes
 """
 
 __author__ = 'Courgette'
-__version__ = '1.1'
+__version__ = '1.2'
 
 
 class Rcon(object):
@@ -53,10 +53,16 @@ class Rcon(object):
     def writelines(self, lines):
         """
         Write multiple RCON commands to the Frostbite2 server.
+        The commands are all sent at once and then the replies are gathered.
         :param lines: A list of commands to send
+        :return: The list of the replies, in the same order as the commands
         """
-        for line in lines:
-            self.write(line)
+        if not self.frostbite_server:
+            return
+        self.console.verbose(u'RCON :\t %s' % repr(lines))
+        responses = self.frostbite_server.commands(lines)
+        self.console.verbose(u'RCON responses:\t %s' % repr(responses))
+        return responses
 
     def write(self, cmd, *args, **kwargs):
         """
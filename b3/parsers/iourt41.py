@@ -23,7 +23,7 @@
 # ################################################################### #
 
 __author__ = 'xlr8or, Courgette, Fenix'
-__version__ = '1.28'
+__version__ = '1.29'
 
 import b3
 import b3.events
@@ -404,12 +404,8 @@ class Iourt41Parser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.matchLine(line)
 
         if m is not None:
             client = None
@@ -598,6 +594,11 @@ class Iourt41Parser(AbstractParser):
     def OnHit(self, action, data, match=None):
         # Hit: 13 10 0 8: Grover hit jacobdk92 in the Head
         # Hit: cid acid hitloc aweap: text
+        if not self.isEventSubscribed('EVT_CLIENT_DAMAGE', 'EVT_CLIENT_DAMAGE_SELF', 'EVT_CLIENT_DAMAGE_TEAM',
+                                      'EVT_CLIENT_KILL', 'EVT_CLIENT_KILL_TEAM', 'EVT_CLIENT_SUICIDE'):
+            # damage data is only needed to build damage and kill events
+            return None
+
         victim = self.clients.getByCID(match.group('cid'))
         if not victim:
             self.debug('No victim')
@@ -778,6 +779,8 @@ class Iourt41Parser(AbstractParser):
         return self.OnAction(cid, actiontype, data)
 
     def OnAction(self, cid, actiontype, data, match=None):
+        if not self.isEventSubscribed('EVT_CLIENT_ACTION'):
+            return None
         client = self.clients.getByCID(cid)
         if not client:
             self.debug('No client found')
@@ -1065,22 +1068,20 @@ class Iourt41Parser(AbstractParser):
         Returns a dict having players' id for keys and players' ping for values.
         :param filter_client_ids: If filter_client_id is an iterable, only return values for the given client ids.
         """
-        data = self.write('status')
-        if not data:
+        status = self.getStatus()
+        if not status:
             return dict()
 
         players = dict()
-        for line in data.split('\n'):
-            m = re.match(self._regPlayer, line.strip())
-            if m:
-                if m.group('ping') == 'ZMBI':
-                    # ignore them, let them not bother us with errors
-                    pass
-                else:
-                    try:
-                        players[str(m.group('slot'))] = int(m.group('ping'))
-                    except ValueError:
-                        players[str(m.group('slot'))] = 999
+        for d in status.getPlayers(first=0):
+            if d['ping'] == 'ZMBI':
+                # ignore them, let them not bother us with errors
+                pass
+            else:
+                try:
+                    players[str(d['slot'])] = int(d['ping'])
+                except ValueError:
+                    players[str(d['slot'])] = 999
 
         return players
 
@@ -1338,7 +1338,6 @@ class Iourt42Parser(Iourt41Parser):
             """
             client = Iourt42Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
             self[client.cid] = client
-            self.resetIndex()
 
             self.console.debug('Urt42 Client Connected: [%s] %s - %s (%s)',  self[client.cid].cid, self[client.cid].name,
                                                                              self[client.cid].guid, self[client.cid].data)
@@ -1401,7 +1401,6 @@ class Iourt43Parser(Iourt41Parser):
             """
             client = Iourt43Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
             self[client.cid] = client
-            self.resetIndex()
 
             self.console.debug('Urt43 Client Connected: [%s] %s - %s (%s)',  self[client.cid].cid, self[client.cid].name,
                                                                              self[client.cid].guid, self[client.cid].data)
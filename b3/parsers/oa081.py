@@ -23,7 +23,7 @@
 # ################################################################### #
 
 __author__ = 'Courgette, GrosBedo, Fenix'
-__version__ = '0.15'
+__version__ = '0.16'
 
 import b3
 import b3.clients
@@ -290,14 +290,10 @@ class Oa081Parser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                self.debug('XLR--------> line matched %s' % f.pattern)
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.matchLine(line)
         if m:
+            self.debug('XLR--------> line matched %s' % m.re.pattern)
             client = None
             target = None
             try:
@@ -855,19 +851,17 @@ class Oa081Parser(AbstractParser):
         Returns a dict having players' id for keys and players' ping for values.
         :param filter_client_ids: If filter_client_id is an iterable, only return values for the given client ids.
         """
-        data = self.write('status')
-        if not data:
+        status = self.getStatus()
+        if not status:
             return {}
 
         players = {}
-        for line in data.split('\n'):
-            m = re.match(self._regPlayer, line.strip())
-            if m:
-                if m.group('ping') == 'ZMBI':
-                    # ignore them, let them not bother us with errors
-                    pass
-                else:
-                    players[str(m.group('slot'))] = int(m.group('ping'))
+        for d in status.getPlayers(first=0):
+            if d['ping'] == 'ZMBI':
+                # ignore them, let them not bother us with errors
+                pass
+            else:
+                players[str(d['slot'])] = int(d['ping'])
 
         return players
 
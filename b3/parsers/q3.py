@@ -73,7 +73,7 @@
 # 02/06/2017 - 0.17   - GrosBedo     - fix /tell message command (works only on ioq3 or e+ mod, but anyway most servers are running these)
 
 __author__ = 'Courgette, GrosBedo, Fenix'
-__version__ = '0.17'
+__version__ = '0.18'
 
 import b3
 import b3.clients
@@ -340,14 +340,10 @@ class Q3Parser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                self.debug('XLR--------> line matched %s' % f.pattern)
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.matchLine(line)
         if m:
+            self.debug('XLR--------> line matched %s' % m.re.pattern)
             client = None
             target = None
             try:
@@ -909,19 +905,17 @@ class Q3Parser(AbstractParser):
         Returns a dict having players' id for keys and players' ping for values.
         :param filter_client_ids: If filter_client_id is an iterable, only return values for the given client ids.
         """
-        data = self.write('status')
-        if not data:
+        status = self.getStatus()
+        if not status:
             return {}
 
         players = {}
-        for line in data.split('\n'):
-            m = re.match(self._regPlayer, line.strip())
-            if m:
-                if m.group('ping') == 'ZMBI':
-                    # ignore them, let them not bother us with errors
-                    pass
-                else:
-                    players[str(m.group('slot'))] = int(m.group('ping'))
+        for d in status.getPlayers(first=0):
+            if d['ping'] == 'ZMBI':
+                # ignore them, let them not bother us with errors
+                pass
+            else:
+                players[str(d['slot'])] = int(d['ping'])
 
         return players
 
@@ -23,7 +23,7 @@
 # ################################################################### #
 
 __author__ = 'ThorN, xlr8or'
-__version__ = '1.8.1'
+__version__ = '1.8.2'
 
 
 import re
@@ -38,6 +38,7 @@ import b3.parser
 import b3.cvar
 
 from b3.parsers.q3a import rcon
+from b3.parsers.q3a.status import StatusService
 from b3.parsers.punkbuster import PunkBuster
 from b3.functions import prefixText
 
@@ -54,6 +55,8 @@ class AbstractParser(b3.parser.Parser):
 
     _clientConnectID = None
     _logSync = 2
+    _status = None
+    _statusInterval = 1.0
 
     _commands = {
         'ban': 'banid %(cid)s %(reason)s',
@@ -145,6 +148,16 @@ class AbstractParser(b3.parser.Parser):
 
     _reMapNameFromStatus = re.compile(r'^map:\s+(?P<map>.+)$', re.IGNORECASE)
 
+    # leading keyword of a log line (once the time has been removed): used to select the line formats to try
+    _lineAction = re.compile(r'[a-z]*', re.IGNORECASE)
+    # line format patterns starting with a literal action, i.e: ^(?P<action>Flag Return)
+    _reLiteralAction = re.compile(r'^\^\(\?P<action>(?P<literal>[a-z][a-z ]*)\)', re.IGNORECASE)
+
+    # max number of entries in the line dispatch tables (see matchLine and parseLine)
+    _lineDispatchSize = 512
+    _lineFormatsByAction = None
+    _lineHandlers = None
+
     ####################################################################################################################
     #                                                                                                                  #
     #   PARSER INITIALIZATION                                                                                          #
@@ -164,6 +177,13 @@ class AbstractParser(b3.parser.Parser):
         if self.config.has_option('server', 'punkbuster') and self.config.getboolean('server', 'punkbuster'):
             self.PunkBuster = PunkBuster(self)
 
+        if self.config.has_option('server', 'status_interval'):
+            try:
+                self._statusInterval = abs(self.config.getfloat('server', 'status_interval'))
+            except ValueError, err:
+                self.warning(err)
+        self.debug('Status snapshots are reused for %s seconds' % self._statusInterval)
+
         self._eventMap['warmup'] = self.getEventID('EVT_GAME_WARMUP')
         self._eventMap['shutdowngame'] = self.getEventID('EVT_GAME_ROUND_END')
 
@@ -177,18 +197,74 @@ class AbstractParser(b3.parser.Parser):
     #                                                                                                                  #
     ####################################################################################################################
 
+    def getLineFormats(self, keyword):
+        """
+        Return the line formats which may match a log line starting with the given keyword.
+        Line formats are returned in the same order they are declared in self._lineFormats: formats
+        starting with a literal action which cannot match the given keyword are left out.
+        :param keyword: The lowercase leading keyword of the log line
+        """
+        formats = []
+        for f in self._lineFormats:
+            m = self._reLiteralAction.match(f.pattern)
+            if m:
+                literal = m.group('literal').lower()
+                word = self._lineAction.match(literal).group()
+                if word == literal:
+                    # the line keyword must start with the literal action: i.e 'Bomb' -> 'Bombholder'
+                    if not keyword.startswith(word):
+                        continue
+                elif keyword != word:
+                    # the literal action is made of multiple words: i.e 'Flag Return' -> 'flag'
+                    continue
+            formats.append(f)
+        return tuple(formats)
+
+    def matchLine(self, line):
+        """
+        Match a log line against the line formats, returning the first match found (or None).
+        :param line: The log line to be matched (the time must have already been removed)
+        """
+        if self._lineFormatsByAction is None:
+            self._lineFormatsByAction = {}
+
+        keyword = self._lineAction.match(line).group().lower()
+        try:
+            formats = self._lineFormatsByAction[keyword]
+        except KeyError:
+            formats = self.getLineFormats(keyword)
+            if len(self._lineFormatsByAction) < self._lineDispatchSize:
+                self._lineFormatsByAction[keyword] = formats
+
+        for f in formats:
+            m = f.match(line)
+            if m:
+                return m
+        return None
+
+    def getLineHandler(self, action):
+        """
+        Return the bound event handler for the given action (or None if the parser does not handle it).
+        :param action: The lowercase action extracted from the log line
+        """
+        if self._lineHandlers is None:
+            self._lineHandlers = {}
+
+        try:
+            return self._lineHandlers[action]
+        except KeyError:
+            func = getattr(self, 'On%s' % string.capwords(action).replace(' ', ''), None)
+            if len(self._lineHandlers) < self._lineDispatchSize:
+                self._lineHandlers[action] = func
+            return func
+
     def getLineParts(self, line):
         """
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                #self.debug('line matched %s' % f.pattern)
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.matchLine(line)
         if m:
             client = None
             target = None
@@ -206,10 +282,9 @@ class AbstractParser(b3.parser.Parser):
             return False
 
         match, action, data, client, target = m
-        func = 'On%s' % string.capwords(action).replace(' ', '')
-        
-        if hasattr(self, func):
-            func = getattr(self, func)
+        func = self.getLineHandler(action)
+
+        if func:
             event = func(action, data, match)
             if event:
                 self.queueEvent(event)
@@ -292,6 +367,8 @@ class AbstractParser(b3.parser.Parser):
         return self.getEvent('EVT_GAME_EXIT', None)
 
     def OnItem(self, action, data, match=None):
+        if not self.isEventSubscribed('EVT_CLIENT_ITEM_PICKUP'):
+            return None
         client = self.getClient(match)
         if client:
             return self.getEvent('EVT_CLIENT_ITEM_PICKUP', match.group('text'), client)
@@ -665,47 +742,34 @@ class AbstractParser(b3.parser.Parser):
         time.sleep(1)
         self.write('map %s' % mapname)
 
+    def getStatus(self, maxRetries=None):
+        """
+        Return a snapshot of the 'status' RCON command reply (None if the server did not reply).
+        The snapshot is shared among all the callers and refreshed at most once every _statusInterval seconds.
+        :param maxRetries: How many times we have to retry the RCON command upon failure
+        """
+        if self._status is None:
+            self._status = StatusService(self, interval=self._statusInterval)
+        return self._status.get(maxRetries=maxRetries)
+
     def getPlayerPings(self, filter_client_ids=None):
         """
         Returns a dict having players' id for keys and players' ping for values.
         :param filter_client_ids: If filter_client_id is an iterable, only return values for the given client ids.
         """
-        data = self.write('status')
-        if not data:
+        status = self.getStatus()
+        if not status:
             return {}
-
-        players = {}
-        for line in data.split('\n'):
-            m = re.match(self._regPlayerShort, line)
-            if not m:
-                m = re.match(self._regPlayer, line.strip())
-            
-            if m:
-                players[str(m.group('slot'))] = int(m.group('ping'))
-        
-        return players
+        return dict((slot, int(ping)) for slot, ping in status.getColumn('ping'))
         
     def getPlayerScores(self):
         """
         Returns a dict having players' id for keys and players' scores for values.
         """
-        data = self.write('status')
-        if not data:
+        status = self.getStatus()
+        if not status:
             return {}
-
-        players = {}
-        for line in data.split('\n'):
-            #self.debug('Line: ' + line + "-")
-            m = re.match(self._regPlayerShort, line)
-            if not m:
-                m = re.match(self._regPlayer, line.strip())
-            
-            if m:  
-                players[str(m.group('slot'))] = int(m.group('score'))
-            #elif '------' not in line and 'map: ' not in line and 'num score ping' not in line:
-                #self.verbose('getPlayerScores() = Line did not match format: %s' % line)
-        
-        return players
+        return dict((slot, int(score)) for slot, score in status.getColumn('score'))
 
     def getPlayerList(self, maxRetries=None):
         """
@@ -715,24 +779,20 @@ class AbstractParser(b3.parser.Parser):
         if self.PunkBuster:
             return self.PunkBuster.getPlayerList()
         else:
-            data = self.write('status', maxRetries=maxRetries)
-            if not data:
+            status = self.getStatus(maxRetries=maxRetries)
+            if not status:
                 return {}
 
             players = {}
             lastslot = -1
-            for line in data.split('\n')[3:]:
-                m = re.match(self._regPlayer, line.strip())
-                if m:
-                    d = m.groupdict()
-                    if int(m.group('slot')) > lastslot:
-                        lastslot = int(m.group('slot'))
-                        d['pbid'] = None
-                        players[str(m.group('slot'))] = d
-                        
-                    else:
-                        self.debug('Duplicate or incorrect slot number - '
-                                   'client ignored %s last slot %s' % (m.group('slot'), lastslot))
+            for d in status.getPlayers():
+                if int(d['slot']) > lastslot:
+                    lastslot = int(d['slot'])
+                    d['pbid'] = None
+                    players[str(d['slot'])] = d
+                else:
+                    self.debug('Duplicate or incorrect slot number - '
+                               'client ignored %s last slot %s' % (d['slot'], lastslot))
 
         return players
 
@@ -786,16 +846,10 @@ class AbstractParser(b3.parser.Parser):
         """
         Return the current map/level name.
         """
-        data = self.write('status')
-        if not data:
+        status = self.getStatus()
+        if not status:
             return None
-
-        line = data.split('\n')[0]
-        m = re.match(self._reMapNameFromStatus, line.strip())
-        if m:
-            return str(m.group('map'))
-
-        return None
+        return status.map
 
     def getMaps(self):
         pass
@@ -843,12 +897,13 @@ class AbstractParser(b3.parser.Parser):
     def authorizeClients(self):
         """
         For all connected players, fill the client object with properties allowing to find
-        the user in the database (usualy guid, or punkbuster id, ip) and call the
-        Client.auth() method.
+        the user in the database (usualy guid, or punkbuster id, ip) and authorize them
+        all at once with the Clients.authorize() method.
         """
         players = self.getPlayerList(maxRetries=4)
         self.verbose('authorizeClients() = %s' % players)
 
+        clients = []
         for cid, p in players.iteritems():
             sp = self.clients.getByCID(cid)
             if sp:
@@ -857,7 +912,9 @@ class AbstractParser(b3.parser.Parser):
                 sp.pbid = p.get('pbid', sp.pbid)
                 sp.guid = p.get('guid', sp.guid)
                 sp.data = p
-                sp.auth()
+                clients.append(sp)
+
+        self.clients.authorize(clients)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -23,7 +23,7 @@
 # ################################################################### #
 #
 __author__ = 'ThorN'
-__version__ = '1.11'
+__version__ = '1.13'
 
 import re
 import socket
@@ -37,21 +37,18 @@ class Rcon(object):
 
     host = ()
     password = None
-    lock = thread.allocate_lock()
+    lock = None
     socket = None
     queue = None
     console = None
     socket_timeout = 0.80
+    reply_gap = 0.05            # a reply is complete once no more packets came for that long (None: socket_timeout)
+    rate_burst = 8              # commands sent back to back before being throttled (ioquake3 drops more than 10/sec)
+    rate_interval = 0.1         # then send one command every rate_interval seconds (None: do not throttle)
     rconsendstring = '\377\377\377\377rcon "%s" %s\n'
     rconreplystring = '\377\377\377\377print\n'
     qserversendstring = '\377\377\377\377%s\n'
 
-    # default expiretime for the status cache in seconds and cache type
-    status_cache_expire_time = 2
-    status_cache = False
-    status_cache_expired = None
-    status_cache_data = ''
-
     def __init__(self, console, host, password):
         """
         Object contructor.
@@ -61,21 +58,17 @@ class Rcon(object):
         """
         self.console = console
         self.queue = Queue.Queue()
+        # one lock per game server: commands sent to different servers do not wait for each other
+        self.lock = thread.allocate_lock()
+        self._allowance = self.rate_burst
+        self._lastSend = 0
+        self._lastNoReply = 0
 
         if self.console.config.has_option('caching', 'status_cache_type'):
-            status_cache_type = self.console.config.get('caching', 'status_cache_type').lower()
-            if status_cache_type == 'memory':
-                self.status_cache = True
-
-        if self.console.config.has_option('caching', 'status_cache_expire'):
-            self.status_cache_expire_time = abs(self.console.config.getint('caching', 'status_cache_expire'))
-            if self.status_cache_expire_time > 5:
-                self.status_cache_expire_time = 5
-        # set the cacche expire time to now, so the first status request will retrieve a status from the server
-        status_cache_expired = time.time()
-
-        self.console.bot('Rcon status cache expire time: [%s sec] Type: [%s]' % (self.status_cache_expire_time,
-                                                                                 self.status_cache))
+            # status replies are now shared by the parser itself (see AbstractParser.getStatus)
+            self.console.warning("Setting 'status_cache_type' in section 'caching' is deprecated: "
+                                 "please use 'status_interval' in section 'server' instead")
+
         self.console.bot('Game name is: %s' % self.console.gameName)
         self.socket = socket.socket(type=socket.SOCK_DGRAM)
         self.host = host
@@ -129,6 +122,7 @@ class Rcon(object):
                 self.console.warning('QSERVER: %r', errors)
             elif len(writeables) > 0:
                 try:
+                    self._prepareSend(writeables[0])
                     writeables[0].send(self.qserversendstring % data)
                 except Exception, msg:
                     self.console.warning('QSERVER: error sending: %r', msg)
@@ -182,6 +176,7 @@ class Rcon(object):
                 self.console.warning('RCON: %s', str(errors))
             elif len(writeables) > 0:
                 try:
+                    self._prepareSend(writeables[0])
                     writeables[0].send(self.rconsendstring % (self.password, data))
                 except Exception, msg:
                     self.console.warning('RCON: error sending: %r', msg)
@@ -214,6 +209,57 @@ class Rcon(object):
         self.console.debug('RCON: did not send any data')
         return ''
 
+    def sendRconNoReply(self, data):
+        """
+        Send an RCON command without waiting for the server reply (which is discarded before sending the next
+        command waiting for a reply).
+        :param data: The string to be sent
+        """
+        data = data.strip()
+        # encode the data
+        if self.console.encoding:
+            data = self.encode_data(data, 'RCON')
+
+        self.console.verbose('RCON sending (%s:%s) %r', self.host[0], self.host[1], data)
+        try:
+            self._throttle()
+            self.socket.send(self.rconsendstring % (self.password, data))
+        except Exception, msg:
+            self.console.warning('RCON: error sending: %r', msg)
+        else:
+            self._lastNoReply = time.time()
+
+    def _prepareSend(self, sock):
+        """
+        Discard the replies of the commands which were not waited for and wait for the rate limit (internal method).
+        :param sock: The socket which is about to be written
+        """
+        # a reply may still be on its way if the last command sent without waiting is recent
+        timeout = 0
+        if self.reply_gap and time.time() - self._lastNoReply < self.socket_timeout:
+            timeout = self.reply_gap
+        readables, writeables, errors = select.select([sock], [], [], timeout)
+        while len(readables):
+            self.console.verbose2('RCON: discarding %r', sock.recv(4096))
+            readables, writeables, errors = select.select([sock], [], [], timeout)
+        self._lastNoReply = 0
+        self._throttle()
+
+    def _throttle(self):
+        """
+        Wait until the next command can be sent without exceeding the server rate limit (internal method).
+        """
+        if not self.rate_interval:
+            return
+        now = time.time()
+        allowance = min(self.rate_burst, self._allowance + (now - self._lastSend) / self.rate_interval)
+        if allowance < 1:
+            time.sleep((1 - allowance) * self.rate_interval)
+            allowance = 1
+            now = time.time()
+        self._allowance = allowance - 1
+        self._lastSend = now
+
     def stop(self):
         """
         Stop the rcon writelines queue.
@@ -230,11 +276,11 @@ class Rcon(object):
                 if not cmd:
                     continue
                 with self.lock:
-                    self.sendRcon(cmd, maxRetries=1)
+                    self.sendRconNoReply(cmd)
 
     def writelines(self, lines):
         """
-        Enqueue multiple RCON commands for later processing.
+        Enqueue multiple RCON commands for later processing: they are sent without waiting for the server replies.
         :param lines: A list of RCON commands.
         """
         self.queue.put(lines)
@@ -246,24 +292,6 @@ class Rcon(object):
         :param maxRetries: How many times we have to retry the sending upon failure
         :param socketTimeout: The socket timeout value
         """
-        # intercept status request for caching construct
-        if (cmd == 'status' or cmd == 'PB_SV_PList') and self.status_cache:
-            if time.time() < self.status_cache_expired:
-                self.console.verbose2('Using Status: Cached %s' % cmd)
-                return self.status_cache_data
-            else:
-                with self.lock:
-                    data = self.sendRcon(cmd, maxRetries=maxRetries, socketTimeout=socketTimeout)
-                    if data:
-                        self.status_cache_data = data
-                        self.status_cache_expired = time.time() + self.status_cache_expire_time
-                        self.console.verbose2('Using Status: Fresh %s' % cmd)
-                    else:
-                        # if no data returned set the cached status to empty, but don't update the expired timer so next attempt will try 
-                        # to read a new value
-                        self.status_cache_data = ''
-                return self.status_cache_data
-        
         with self.lock:
             data = self.sendRcon(cmd, maxRetries=maxRetries, socketTimeout=socketTimeout)
         return data if data else ''
@@ -311,6 +339,8 @@ class Rcon(object):
             self.console.verbose('No readable socket')
             return ''
 
+        # the server sends the packets of a reply back to back: no need to wait a full timeout for more of them
+        gap = socketTimeout if self.reply_gap is None else min(self.reply_gap, socketTimeout)
         while len(readables):
             d = str(sock.recv(size))
 
@@ -318,7 +348,7 @@ class Rcon(object):
                 # remove rcon header
                 data += d.replace(self.rconreplystring, '')
 
-            readables, writeables, errors = select.select([sock], [], [sock], socketTimeout)
+            readables, writeables, errors = select.select([sock], [], [sock], gap)
             if len(readables):
                 self.console.verbose('RCON: more data to read in socket')
 
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+__version__ = '1.0'
+
+import threading
+import time
+
+
+class StatusSnapshot(object):
+    """
+    The reply of a single 'status' RCON command, parsed once.
+    """
+    def __init__(self, data, regPlayer, regPlayerShort=None, regMap=None, timestamp=None):
+        """
+        Object constructor.
+        :param data: The raw 'status' reply
+        :param regPlayer: The regular expression matching a full player line
+        :param regPlayerShort: The regular expression matching a short player line (slot, score, ping and name)
+        :param regMap: The regular expression matching the map name on the first line
+        :param timestamp: When the reply was received (defaults to now)
+        """
+        self.data = data
+        self.patterns = (regPlayer, regPlayerShort, regMap)
+        self.time = time.time() if timestamp is None else timestamp
+        self.map = None
+        self._players = []  # (line number, groupdict) for every line matching the full player pattern
+        self._rows = []     # (line number, groupdict) for every player line, short pattern first
+
+        lines = data.split('\n')
+        if regMap and lines:
+            m = regMap.match(lines[0].strip())
+            if m:
+                self.map = str(m.group('map'))
+
+        for i, line in enumerate(lines):
+            full = regPlayer.match(line.strip())
+            if full:
+                self._players.append((i, full.groupdict()))
+            short = regPlayerShort.match(line) if regPlayerShort else None
+            if short or full:
+                self._rows.append((i, (short or full).groupdict()))
+
+    def getPlayers(self, first=3):
+        """
+        Return the full player lines as a list of dicts (copies, in slot order as sent by the server).
+        :param first: The first line to look at (the map name and the table header come before the players)
+        """
+        return [dict(d) for i, d in self._players if i >= first]
+
+    def getColumn(self, name):
+        """
+        Return a list of (slot, value) tuples for the given column of the player table.
+        Lines matching the short pattern are used as such, other ones are read with the full pattern.
+        :param name: The column name (slot, score, ping...)
+        """
+        return [(str(d['slot']), d[name]) for i, d in self._rows]
+
+
+class StatusService(object):
+    """
+    Share 'status' RCON replies among all the parser methods needing them: the server is queried at
+    most once per interval and concurrent callers wait for the refresh already in flight.
+    """
+    def __init__(self, console, interval=1.0):
+        """
+        Object constructor.
+        :param console: The console implementation
+        :param interval: How long (in seconds) a snapshot can be reused
+        """
+        self.console = console
+        self.interval = interval
+        self._snapshot = None
+        self._refreshing = False
+        self._cond = threading.Condition(threading.Lock())
+
+    def _patterns(self):
+        """
+        Return the regular expressions the console currently uses to parse the 'status' reply.
+        """
+        return self.console._regPlayer, self.console._regPlayerShort, self.console._reMapNameFromStatus
+
+    def _isFresh(self):
+        """
+        Tell whether the last snapshot can still be used: it must be recent and parsed with the current
+        regular expressions (some parsers swap them for a while, i.e: cod7 to count democlients).
+        """
+        return self._snapshot is not None and time.time() - self._snapshot.time < self.interval \
+            and self._snapshot.patterns == self._patterns()
+
+    def get(self, maxRetries=None):
+        """
+        Return the current status snapshot, querying the server if the last one is too old.
+        Return None if the server did not reply.
+        :param maxRetries: How many times we have to retry the RCON command upon failure
+        """
+        with self._cond:
+            if self._isFresh():
+                return self._snapshot
+            if self._refreshing:
+                # somebody else is already asking the server: share its outcome
+                while self._refreshing:
+                    self._cond.wait()
+                return self._snapshot if self._isFresh() else None
+            self._refreshing = True
+
+        snapshot = None
+        try:
+            data = self.console.write('status', maxRetries=maxRetries)
+            if data:
+                regPlayer, regPlayerShort, regMap = self._patterns()
+                snapshot = StatusSnapshot(data, regPlayer, regPlayerShort=regPlayerShort, regMap=regMap)
+        finally:
+            with self._cond:
+                if snapshot:
+                    self._snapshot = snapshot
+                self._refreshing = False
+                self._cond.notifyAll()
+
+        return snapshot
+
+    def invalidate(self):
+        """
+        Forget the last snapshot: the next call to get() will query the server.
+        """
+        with self._cond:
+            self._snapshot = None
@@ -219,12 +219,8 @@ class SmgParser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.matchLine(line)
         if m:
             client = None
             target = None
@@ -232,12 +232,8 @@ class Sof2Parser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.matchLine(line)
         if m:
             client = None
             target = None
@@ -488,6 +484,11 @@ class Sof2Parser(AbstractParser):
     def OnHit(self, action, data, match=None):
         # Hit: 0 0 520 368 0: xlr8or hit xlr8or at location 520 for 368
         # Hit: cid acid hitloc damage aweap: text
+        if not self.isEventSubscribed('EVT_CLIENT_DAMAGE', 'EVT_CLIENT_DAMAGE_SELF', 'EVT_CLIENT_DAMAGE_TEAM',
+                                      'EVT_CLIENT_KILL', 'EVT_CLIENT_KILL_TEAM', 'EVT_CLIENT_SUICIDE'):
+            # hit location is only needed to build damage and kill events
+            return None
+
         victim = self.clients.getByCID(match.group('cid'))
         if not victim:
             self.debug('No victim')
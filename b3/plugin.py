@@ -151,6 +151,7 @@ class Plugin(object):
         Enable the plugin.
         """
         self._enabled = True
+        self.console.updateEventsSubscriptions()
         name = b3.functions.right_cut(self.__class__.__name__, 'Plugin').lower()
         self.console.queueEvent(self.console.getEvent('EVT_PLUGIN_ENABLED', data=name))
         self.onEnable()
@@ -160,6 +161,7 @@ class Plugin(object):
         Disable the plugin.
         """
         self._enabled = False
+        self.console.updateEventsSubscriptions()
         name = b3.functions.right_cut(self.__class__.__name__, 'Plugin').lower()
         self.console.queueEvent(self.console.getEvent('EVT_PLUGIN_DISABLED', data=name))
         self.onDisable()
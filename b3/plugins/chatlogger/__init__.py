@@ -351,17 +351,30 @@ class AbstractData(object):
     def _save2db(self, data):
         q = self._insertquery()
         try:
-            cursor = self.plugin.console.storage.query(q, data)
-            if cursor.rowcount > 0:
-                self.plugin.debug("rowcount: %s, id:%s" % (cursor.rowcount, cursor.lastrowid))
-            else:
-                self.plugin.warning("inserting into %s failed" % self._table)
+            # fire and forget: the insert is written by the storage writer thread when the write queue is enabled
+            future = self.plugin.console.storage.queryAsync(q, data)
         except Exception, e:
-            if e[0] == 1146:
-                self.plugin.error("could not save to database : %s" % e[1])
-                self.plugin.info("refer to this plugin readme file for instruction on how to create the required tables")
-            else:
-                raise e
+            self._onSaveError(e)
+        else:
+            future.addCallback(self._onSaved)
+
+    def _onSaved(self, future):
+        e = future.exception()
+        if e is not None:
+            self._onSaveError(e)
+            return
+        cursor = future.result()
+        if cursor.rowcount > 0:
+            self.plugin.debug("rowcount: %s, id:%s" % (cursor.rowcount, cursor.lastrowid))
+        else:
+            self.plugin.warning("inserting into %s failed" % self._table)
+
+    def _onSaveError(self, e):
+        if e[0] == 1146:
+            self.plugin.error("could not save to database : %s" % e[1])
+            self.plugin.info("refer to this plugin readme file for instruction on how to create the required tables")
+        else:
+            raise e
 
 
 class CmdData(AbstractData):
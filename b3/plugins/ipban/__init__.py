@@ -114,10 +114,7 @@ class IpbanPlugin(b3.plugin.Plugin):
                                             "penalties.client_id = clients.id WHERE penalties.type = 'Ban' AND "
                                             "penalties.inactive = 0 AND penalties.time_expire = -1 GROUP BY clients.ip")
         if cursor:
-            while not cursor.EOF:
-                banned.append(cursor.getValue('target_ip'))
-                cursor.moveNext()
-        cursor.close()
+            banned = [row['target_ip'] for row in cursor]
         return banned
 
     def getTempBanIps(self):
@@ -130,8 +127,5 @@ class IpbanPlugin(b3.plugin.Plugin):
                                             "penalties.inactive = 0 AND penalties.time_expire > %s "
                                             "GROUP BY clients.ip" % int(time()))
         if cursor:
-            while not cursor.EOF:
-                banned.append(cursor.getValue('target_ip'))
-                cursor.moveNext()
-        cursor.close()
+            banned = [row['target_ip'] for row in cursor]
         return banned
\ No newline at end of file
@@ -22,7 +22,7 @@
 #                                                                     #
 # ################################################################### #
 
-__version__ = '1.8'
+__version__ = '1.8.1'
 __author__  = 'Courgette, 82ndab-Bravo17, ozon, Mario'
 
 import re
@@ -80,9 +80,11 @@ class Scrambler:
 
     def _scrambleTeams(self, listOfPlayers):
         team = 0
+        moves = []
         while len(listOfPlayers)>0:
-            self._plugin._movePlayer(listOfPlayers.pop(), team + 1)
+            moves.append((listOfPlayers.pop(), team + 1))
             team = (team + 1)%2
+        self._plugin._movePlayers(moves)
 
     def _getClients_randomly(self):
         clients = self._plugin.console.clients.getList()
@@ -1303,6 +1305,15 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         self.console.write(('admin.movePlayer', client.cid, teamId, squadId, 'true'))
         client.setvar(self, 'movedByBot', True)
 
+    def _movePlayers(self, moves):
+        """
+        Move many players at once: all the commands are sent before waiting for the server replies.
+        :param moves: A list of (client, teamId) tuples
+        """
+        self.console.writelines([('admin.movePlayer', client.cid, teamId, 0, 'true') for client, teamId in moves])
+        for client, teamId in moves:
+            client.setvar(self, 'movedByBot', True)
+
     @staticmethod
     def _get_server_config_directory(dir_name=''):
         return b3.getAbsolutePath('@b3/plugins/poweradminbf3/%s' % dir_name)
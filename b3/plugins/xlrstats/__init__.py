@@ -30,6 +30,7 @@ import b3.events
 import b3.plugin
 import b3.cron
 import b3.timezones
+import copy
 import datetime
 import time
 import os
@@ -100,6 +101,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
     announce = False                    # announces points gained/lost to players after confrontations
     keep_history = True
     keep_time = True
+    flush_interval = 30                 # seconds between two writes of the changed stats (0 = write immediately)
     min_players = 3                     # minimum number of players to collect stats
     _xlrstats_active = False            # parsing events based on min_players?
     _current_nr_players = 0             # current number of players present
@@ -159,6 +161,9 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self._ctimePlugin = None
         self._xlrstatstables = []           # will contain a list of the xlrstats database tables
         self._cronTabCorrectStats = None
+        self._cronTabFlushStats = None
+        self._statsCache = StatsCache()     # stats rows of the connected players and the current map
+        self._flushLock = threading.Lock()
         self.query = None                   # shortcut to the storage.query function
         b3.plugin.Plugin.__init__(self, console, config)
 
@@ -208,6 +213,8 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self.registerEvent('EVT_GAME_ROUND_START', self.onRoundStart)
         self.registerEvent('EVT_CLIENT_ACTION', self.onAction)       # for game-events/actions
         self.registerEvent('EVT_CLIENT_DAMAGE', self.onDamage)       # for assist recognition
+        self.registerEvent('EVT_CLIENT_DISCONNECT', self.onDisconnect)
+        self.registerEvent('EVT_GAME_ROUND_END', self.onRoundEnd)
 
         # get the Client.id for the bot itself (guid: WORLD or Server(bfbc2/moh/hf))
         sclient = self.console.clients.getByGUID("WORLD")
@@ -265,6 +272,11 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self._cronTabKillBonus = b3.cron.PluginCronTab(self, self.calculateKillBonus, 0, '*/10')
         self.console.cron + self._cronTabKillBonus
 
+        # write the changed stats to the database periodically
+        if self.flush_interval:
+            self._cronTabFlushStats = b3.cron.PluginCronTab(self, self.flushStats, '*/%s' % self.flush_interval)
+            self.console.cron + self._cronTabFlushStats
+
         # start the ctime subplugin
         if self.keep_time:
             self._ctimePlugin = CtimePlugin(self.console, self.ctime_table)
@@ -320,6 +332,10 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self.prematch_maxtime = self.getSetting('settings', 'prematch_maxtime', b3.INT, self.prematch_maxtime)
         self.announce = self.getSetting('settings', 'announce', b3.BOOL, self.announce)
         self.keep_time = self.getSetting('settings', 'keep_time', b3.BOOL, self.keep_time)
+        # flushStats() runs on the seconds of the minute which are multiple of flush_interval: round it down to a
+        # divisor of 60 or the interval between two flushes would be irregular (i.e: 45 would flush at :00 and :45)
+        self.flush_interval = self.getSetting('settings', 'flush_interval', b3.INT, self.flush_interval,
+                                              lambda x: max(d for d in (0, 1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30) if d <= x))
 
         # load custom table names
         self.load_config_tables()
@@ -468,6 +484,31 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         if self._xlrstats_active:
             self.action(event.client, event.data)
 
+    def onDisconnect(self, event):
+        """
+        Handle EVT_CLIENT_DISCONNECT
+        """
+        if event.client:
+            self.flushStats(self.evictPlayerStats(event.client))
+
+    def onRoundEnd(self, _):
+        """
+        Handle EVT_GAME_ROUND_END
+        """
+        self.flushStats()
+
+    def onStop(self, _):
+        """
+        Handle EVT_STOP
+        """
+        self.flushStats()
+
+    def onDisable(self):
+        """
+        Write the changed stats to the database when the plugin is disabled.
+        """
+        self.flushStats()
+
     ####################################################################################################################
     #                                                                                                                  #
     #    OTHER METHODS                                                                                                 #
@@ -534,6 +575,19 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         else:
             client_id = client.id
 
+        key = (PlayerStats, (client_id,))
+        s = self._statsCache.get(key)
+        if s is None:
+            s = self._cacheStat(key, self._load_PlayerStats(client_id))
+
+        if hasattr(s, '_new') and client is not None and client.maxLevel < self.minlevel:
+            return None
+        return s
+
+    def _load_PlayerStats(self, client_id):
+        """
+        Load the stats record of the given client from the database (make a new one if there is none).
+        """
         q = """SELECT * from %s WHERE client_id = %s LIMIT 1""" % (self.playerstats_table, client_id)
         cursor = self.query(q)
         if cursor and not cursor.EOF:
@@ -562,20 +616,22 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.fixed_name = r['fixed_name']
             s.id_token = r['id_token']
             return s
-        elif (client is None) or (client.maxLevel >= self.minlevel):
+        else:
             s = PlayerStats()
             s._new = True
             s.skill = self.defaultskill
             s.Kfactor = self.Kfactor_high
             s.client_id = client_id
             return s
-        else:
-            return None
 
     def get_PlayerAnon(self):
         return self.get_PlayerStats(None)
 
     def get_WeaponStats(self, name):
+        key = (WeaponStats, (name,))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = WeaponStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.weaponstats_table, name)
         cursor = self.query(q)
@@ -586,13 +642,17 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.kills = r['kills']
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.name = name
-            return s
+            return self._cacheStat(key, s)
 
     def get_Bodypart(self, name):
+        key = (Bodyparts, (name,))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = Bodyparts()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.bodyparts_table, name)
         cursor = self.query(q)
@@ -603,14 +663,18 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.kills = r['kills']
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.name = name
-            return s
+            return self._cacheStat(key, s)
 
     def get_MapStats(self, name):
         assert name is not None
+        key = (MapStats, (name,))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = MapStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.mapstats_table, name)
         cursor = self.query(q)
@@ -622,13 +686,17 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.rounds = r['rounds']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.name = name
-            return s
+            return self._cacheStat(key, s)
 
     def get_WeaponUsage(self, weaponid, playerid):
+        key = (WeaponUsage, (playerid, weaponid))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = WeaponUsage()
         q = """SELECT * from %s WHERE weapon_id = %s AND player_id = %s LIMIT 1""" % (self.weaponusage_table, weaponid, playerid)
         cursor = self.query(q)
@@ -642,14 +710,18 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.player_id = playerid
             s.weapon_id = weaponid
-            return s
+            return self._cacheStat(key, s)
 
     def get_Opponent(self, killerid, targetid):
+        key = (Opponents, (killerid, targetid))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = Opponents()
         q = """SELECT * from %s WHERE killer_id = %s AND target_id = %s LIMIT 1""" % (self.opponents_table, killerid, targetid)
         cursor = self.query(q)
@@ -660,14 +732,18 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.target_id = r['target_id']
             s.kills = r['kills']
             s.retals = r['retals']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.killer_id = killerid
             s.target_id = targetid
-            return s
+            return self._cacheStat(key, s)
 
     def get_PlayerBody(self, playerid, bodypartid):
+        key = (PlayerBody, (playerid, bodypartid))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = PlayerBody()
         q = """SELECT * from %s WHERE bodypart_id = %s AND player_id = %s LIMIT 1""" % (self.playerbody_table, bodypartid, playerid)
         cursor = self.query(q)
@@ -681,12 +757,12 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.player_id = playerid
             s.bodypart_id = bodypartid
-            return s
+            return self._cacheStat(key, s)
 
     def get_PlayerMaps(self, playerid, mapid):
         if not mapid:
@@ -701,6 +777,11 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             else:
                 return None
 
+        key = (PlayerMaps, (playerid, mapid))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
+
         s = PlayerMaps()
         q = """SELECT * from %s WHERE map_id = %s AND player_id = %s LIMIT 1""" % (self.playermaps_table, mapid, playerid)
         cursor = self.query(q)
@@ -715,14 +796,18 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
             s.rounds = r['rounds']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.player_id = playerid
             s.map_id = mapid
-            return s
+            return self._cacheStat(key, s)
 
     def get_ActionStats(self, name):
+        key = (ActionStats, (name,))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = ActionStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.actionstats_table, name)
         cursor = self.query(q)
@@ -731,13 +816,17 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.id = r['id']
             s.name = r['name']
             s.count = r['count']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.name = name
-            return s
+            return self._cacheStat(key, s)
 
     def get_PlayerActions(self, playerid, actionid):
+        key = (PlayerActions, (playerid, actionid))
+        cached = self._statsCache.get(key)
+        if cached is not None:
+            return cached
         s = PlayerActions()
         q = """SELECT * from %s WHERE action_id = %s AND player_id = %s LIMIT 1""" % (self.playeractions_table, actionid, playerid)
         cursor = self.query(q)
@@ -747,16 +836,40 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.player_id = r['player_id']
             s.action_id = r['action_id']
             s.count = r['count']
-            return s
+            return self._cacheStat(key, s)
         else:
             s._new = True
             s.player_id = playerid
             s.action_id = actionid
-            return s
+            return self._cacheStat(key, s)
+
+    def _cacheStat(self, key, stat):
+        """
+        Store a stats row just loaded from the database (or just created) in the stats cache.
+        :param key: The key the row has been looked up with
+        :param stat: The StatObject instance
+        :return: The given StatObject instance
+        """
+        if None not in key[1]:
+            stat._cachekey = key
+            self._statsCache.put(key, stat)
+        return stat
 
     def save_Stat(self, stat):
-        #self.verbose('*----> XLRstats: saving statistics for %s' % type(stat))
-        #self.verbose('*----> Contents: %s' %stat)
+        """
+        Save a stats row.
+        New rows are inserted right away (their id is needed to link the other stats rows to them) while changes
+        to existing rows are written to the database by flushStats(), unless flush_interval is 0.
+        :param stat: The StatObject instance to save
+        """
+        key = getattr(stat, '_cachekey', None)
+        if hasattr(stat, '_new') and key:
+            cached = self._statsCache.get(key)
+            if cached is not None and not hasattr(cached, '_new'):
+                # the row has been inserted since this copy was handed out
+                stat.id = cached.id
+                delattr(stat, '_new')
+
         if hasattr(stat, '_new'):
             q = stat._insertquery()
             #self.debug('Inserting using: %r', q)
@@ -764,17 +877,76 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             if cursor.rowcount > 0:
                 stat.id = cursor.lastrowid
                 delattr(stat, '_new')
+                if key:
+                    self._statsCache.put(key, stat)
+        elif key and self.flush_interval:
+            self._statsCache.put(key, stat, dirty=True)
         else:
             q = stat._updatequery()
             #self.debug('Updating using: %r', q)
             self.query(q)
+            if key:
+                self._statsCache.put(key, stat)
 
-        #print 'save_Stat: q= ', q
-        #self.query(q)
         # we could not really do anything with error checking on saving.
         # If it fails, that's just bad luck.
         return
 
+    def flushStats(self, stats=None):
+        """
+        Write the stats rows changed since the last flush to the database.
+        :param stats: Additional changed stats rows to write (rows evicted from the stats cache)
+        """
+        with self._flushLock:
+            stats = (stats or []) + self._statsCache.popDirty()
+            if not stats:
+                return
+            self.verbose('writing %s changed stats rows to the database', len(stats))
+
+            # a single multi-row upsert per table, all of them in a single transaction
+            tables = {}
+            for stat in stats:
+                tables.setdefault(stat.__class__, {})[stat.id] = stat
+            try:
+                queries = []
+                for rows in tables.itervalues():
+                    stat = rows.values()[0]
+                    queries.extend(self.console.storage.upsertQueries(stat._table, ('id',) + stat._fields,
+                                                                      [r._values() for r in rows.itervalues()]))
+                self.console.storage.queryBatch(queries)
+            except Exception, msg:
+                self.warning('could not write the stats in a single transaction (%s): writing them one by one', msg)
+                for stat in stats:
+                    try:
+                        self.query(stat._updatequery())
+                    except Exception, msg:
+                        self.error('could not save %s stats row %s: %s', stat._table, stat.id, msg)
+
+    def evictPlayerStats(self, client):
+        """
+        Remove the stats rows of a player from the stats cache.
+        :param client: The client whose stats rows are to be removed
+        :return: The changed stats rows which have not been written to the database yet
+        """
+        if client.id is None or client.id == self._world_clientid:
+            return []
+        playerstats = self._statsCache.get((PlayerStats, (client.id,)))
+        player_id = playerstats.id if playerstats is not None else None
+
+        def belongs(key):
+            cls, values = key
+            if cls is PlayerStats:
+                return values == (client.id,)
+            elif player_id is None:
+                return False
+            elif cls is Opponents:
+                return player_id in values
+            elif cls in (WeaponUsage, PlayerBody, PlayerMaps, PlayerActions):
+                return values[0] == player_id
+            return False
+
+        return self._statsCache.evict(belongs)
+
     def check_Assists(self, client, target, data, etype=None):
         # determine eventual assists // an assist only counts if damage was done within # secs. before death
         # it will also punish teammates that have a 'negative' assist!
@@ -1539,6 +1711,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
 
     def correctStats(self):
         self.debug('gathering XLRstats statistics')
+        self.flushStats()
         _seconds = self._auto_correct_ignore_days * 86400
         q = """SELECT MAX(%s.skill) AS max_skill, MIN(%s.skill) AS min_skill, SUM(%s.skill) AS sum_skill,
                AVG(%s.skill) AS avg_skill , COUNT(%s.id) AS cnt
@@ -1597,8 +1770,11 @@ class XlrstatsPlugin(b3.plugin.Plugin):
 
         if self.auto_correct and round(_correction_factor, _factor_decimals) < 1:
             self.debug('correcting overall skill with factor %s...' % round(_correction_factor, _factor_decimals))
+            # make sure the skill of the connected players is corrected and then reloaded
+            self.flushStats()
             self.query("""UPDATE %s SET skill=(SELECT skill * %s ) WHERE %s.client_id <> %s""" % (
                        self.playerstats_table, _correction_factor, self.playerstats_table, self._world_clientid))
+            self._statsCache.clear()
 
     def purgePlayers(self):
         if not self.auto_purge:
@@ -1615,6 +1791,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
                self.clients_table, self.playerstats_table, self.clients_table, self.playerstats_table,
                int(time.time()), self.clients_table, _seconds)
 
+        self.flushStats()
         cursor = self.query(q)
         if cursor and not cursor.EOF:
             while not cursor.EOF:
@@ -1626,6 +1803,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
                 self.purgeAssociated(self.playermaps_table, r['player_id'])
                 self.purgeAssociated(self.weaponusage_table, r['player_id'])
                 cursor.moveNext()
+            self._statsCache.clear()
 
     def purgePlayerStats(self, _id):
         self.query("""DELETE FROM %s WHERE id = %s""" % (self.playerstats_table, _id))
@@ -1828,6 +2006,9 @@ class XlrstatsPlugin(b3.plugin.Plugin):
                 
         current_tables = self.console.storage.getTables()
 
+        # forget the cached stats: they are about to be deleted
+        self._statsCache.clear()
+
         # truncate database tables
         for table in xlr_tables:
             if table in current_tables:
@@ -2284,9 +2465,77 @@ class BattlestatsPlugin(b3.plugin.Plugin):
 ########################################################################################################################
 
 
+class StatsCache(object):
+    """
+    In-memory cache of the stats rows, keyed by the values the rows are looked up with.
+    The cache holds the last saved state of every row and hands out copies, so that changes
+    which are not saved (see provisional ranking) are discarded just like when reading the
+    rows from the database. Saved rows can be marked as dirty so they are written later.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, key):
+        """
+        Return a copy of a cached stats row or None if the row is not cached.
+        """
+        with self._lock:
+            stat = self._rows.get(key)
+        return copy.copy(stat) if stat is not None else None
+
+    def put(self, key, stat, dirty=False):
+        """
+        Store a copy of a stats row.
+        :param dirty: Whether the row still needs to be written to the database
+        """
+        stat = copy.copy(stat)
+        with self._lock:
+            self._rows[key] = stat
+            if dirty:
+                self._dirty.add(key)
+
+    def popDirty(self):
+        """
+        Return the rows which need to be written to the database and mark them as clean.
+        """
+        with self._lock:
+            stats = [self._rows[key] for key in self._dirty]
+            self._dirty = set()
+        return stats
+
+    def evict(self, predicate):
+        """
+        Remove the rows whose key matches the given predicate.
+        :return: The removed rows which still needed to be written to the database
+        """
+        stats = []
+        with self._lock:
+            for key in [k for k in self._rows if predicate(k)]:
+                stat = self._rows.pop(key)
+                if key in self._dirty:
+                    self._dirty.remove(key)
+                    stats.append(stat)
+        return stats
+
+    def clear(self):
+        """
+        Remove all the rows (changes which have not been written are lost).
+        """
+        with self._lock:
+            self._rows = {}
+            self._dirty = set()
+
+
 class StatObject(object):
 
     _table = None
+    _fields = ()    # the table columns (but id) written by XlrstatsPlugin.flushStats()
 
     def _insertquery(self):
         return None
@@ -2294,11 +2543,19 @@ class StatObject(object):
     def _updatequery(self):
         return None
 
+    def _values(self):
+        """
+        Return the id and the values of the table columns, in the same order as _fields.
+        """
+        return (self.id,) + tuple(getattr(self, f) for f in self._fields)
+
 
 class PlayerStats(StatObject):
 
     # default name of the table for this data object
     _table = 'playerstats'
+    _fields = ('client_id', 'kills', 'deaths', 'teamkills', 'teamdeaths', 'suicides', 'ratio', 'skill', 'assists',
+               'assistskill', 'curstreak', 'winstreak', 'losestreak', 'rounds', 'hide', 'fixed_name', 'id_token')
 
     # fields of the table
     id = None
@@ -2349,6 +2606,7 @@ class WeaponStats(StatObject):
 
     # default name of the table for this data object
     _table = 'weaponstats'
+    _fields = ('name', 'kills', 'suicides', 'teamkills')
 
     # fields of the table
     id = None
@@ -2372,6 +2630,7 @@ class WeaponUsage(StatObject):
 
     # default name of the table for this data object
     _table = 'weaponusage'
+    _fields = ('player_id', 'weapon_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths')
 
     # fields of the table
     id = None
@@ -2400,6 +2659,7 @@ class Bodyparts(StatObject):
 
     # default name of the table for this data object
     _table = 'bodyparts'
+    _fields = ('name', 'kills', 'suicides', 'teamkills')
 
     # fields of the table
     id = None
@@ -2423,6 +2683,7 @@ class MapStats(StatObject):
 
     # default name of the table for this data object
     _table = 'mapstats'
+    _fields = ('name', 'kills', 'suicides', 'teamkills', 'rounds')
 
     # fields of the table
     id = None
@@ -2447,6 +2708,7 @@ class PlayerBody(StatObject):
 
     # default name of the table for this data object
     _table = 'playerbody'
+    _fields = ('player_id', 'bodypart_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths')
 
     # fields of the table
     id = None
@@ -2475,6 +2737,7 @@ class PlayerMaps(StatObject):
 
     # default name of the table for this data object
     _table = 'playermaps'
+    _fields = ('player_id', 'map_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths', 'rounds')
 
     # fields of the table
     id = 0
@@ -2504,6 +2767,7 @@ class Opponents(StatObject):
 
     # default name of the table for this data object
     _table = 'opponents'
+    _fields = ('killer_id', 'target_id', 'kills', 'retals')
 
     # fields of the table
     id = None
@@ -2527,6 +2791,7 @@ class ActionStats(StatObject):
 
     # default name of the table for this data object
     _table = 'actionstats'
+    _fields = ('name', 'count')
 
     # fields of the table
     id = None
@@ -2546,6 +2811,7 @@ class PlayerActions(StatObject):
 
     # default name of the table for this data object
     _table = 'playeractions'
+    _fields = ('player_id', 'action_id', 'count')
 
     # fields of the table
     id = None
@@ -27,12 +27,16 @@ __version__ = '1.3.0'
 
 class QueryBuilder(object):
 
-    def __init__(self, db=None):
+    def __init__(self, db=None, placeholder=None):
         """
         Object constructor.
         :param db: The current database connection.
+        :param placeholder: The bind parameter marker of the database driver: when given values are not escaped into
+                            the query but replaced by placeholders, and collected in the params attribute.
         """
         self.db = db
+        self.placeholder = placeholder
+        self.params = []
 
     def escape(self, word):
         """
@@ -46,6 +50,36 @@ class QueryBuilder(object):
         else:
             return '"%s"' % word.replace('"', '\\"')
 
+    def value(self, word):
+        """
+        Return the SQL representation of a value: a placeholder when using bind parameters, the escaped value otherwise.
+        :param word: The value to represent
+        """
+        if self.placeholder is None:
+            return self.escape(word)
+        # None is stored as the 'None' string, as done by escape()
+        self.params.append('None' if word is None else word)
+        return self.placeholder
+
+    def likeValue(self, word, prefix='', suffix=''):
+        """
+        Return the SQL representation of a LIKE pattern.
+        :param word: The value to match
+        :param prefix: The pattern prefix (i.e: '%')
+        :param suffix: The pattern suffix (i.e: '%')
+        """
+        if self.placeholder is None:
+            return "'" + prefix + self.escape(word)[1:-1] + suffix + "'"
+        return self.value('%s%s%s' % (prefix, word, suffix))
+
+    def bindata(self):
+        """
+        Return the bind parameters collected so far (None if the query doesn't use any).
+        """
+        if not self.params:
+            return None
+        return tuple(self.params)
+
     def quoteArgs(self, args):
         """
         Return a list of quoted arguments.
@@ -84,36 +118,34 @@ class QueryBuilder(object):
         if type(value) == list or type(value) == tuple:
             values = []
             for v in value:
-                values.append(self.escape(v))
+                values.append(self.value(v))
             return "`" + field + "` IN(" + ",".join(values) + ")"
         elif value is None:
-            value = self.escape('')
-        else:
-            value = self.escape(value)
+            value = ''
 
         if len(field) >= 2:
             if field[-2] == ">=":
-                return "`" + field[:-2].strip() + "` >= " + value
+                return "`" + field[:-2].strip() + "` >= " + self.value(value)
             elif field[-2] == "<=":
-                return "`" + field[:-2].strip() + "` <= " + value
+                return "`" + field[:-2].strip() + "` <= " + self.value(value)
             elif field[-1] == "<":
-                return "`" + field[:-1].strip() + "` < " + value
+                return "`" + field[:-1].strip() + "` < " + self.value(value)
             elif field[-1] == ">":
-                return "`" + field[:-1].strip() + "` > " + value
+                return "`" + field[:-1].strip() + "` > " + self.value(value)
             elif field[-1] == "=":
-                return "`" + field[:-1].strip() + "` = " + value
+                return "`" + field[:-1].strip() + "` = " + self.value(value)
             elif field[-1] == "%" and field[0] == "%":
-                return "`" + field[1:-1].strip() + "` LIKE '%" + value[1:-1] + "%'"
+                return "`" + field[1:-1].strip() + "` LIKE " + self.likeValue(value, '%', '%')
             elif field[-1] == "%":
-                return "`" + field[:-1].strip() + "` LIKE '" + value[1:-1] + "%'"
+                return "`" + field[:-1].strip() + "` LIKE " + self.likeValue(value, suffix='%')
             elif field[0] == '%':
-                return "`" + field[1:].strip() + "` LIKE '%" + value[1:-1] + "'"
+                return "`" + field[1:].strip() + "` LIKE " + self.likeValue(value, prefix='%')
             elif field[0] == '&':
-                return "`" + field[1:].strip() + "` & " + value
+                return "`" + field[1:].strip() + "` & " + self.value(value)
             elif field[0] == '|':
-                return "`" + field[1:].strip() + "` | " + value
+                return "`" + field[1:].strip() + "` | " + self.value(value)
 
-        return "`" + field + "` = " + value
+        return "`" + field + "` = " + self.value(value)
 
     def WhereClause(self, fields=None, values=None, concat=' and '):
         """
@@ -250,7 +282,7 @@ class QueryBuilder(object):
         values = []
         for k, v in data.iteritems():
             keys.append(k)
-            values.append(self.escape(v))
+            values.append(self.value(v))
 
         sql += "(" + self.fieldStr(keys) + ") VALUES (" + ", ".join(values) + ")"
 
@@ -274,7 +306,7 @@ class QueryBuilder(object):
         values = []
         for k, v in data.iteritems():
             keys.append(k)
-            values.append(self.escape(v))
+            values.append(self.value(v))
 
         sql += "(" + self.fieldStr(keys) + ") VALUES (" + ", ".join(values) + ")"
 
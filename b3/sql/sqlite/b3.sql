@@ -8,6 +8,8 @@ CREATE TABLE IF NOT EXISTS `aliases` (
   CONSTRAINT `alias` UNIQUE (`alias`,`client_id`)
 );
 
+CREATE INDEX IF NOT EXISTS `aliases_client_id` ON `aliases` (`client_id`);
+
 CREATE TABLE IF NOT EXISTS `ipaliases` (
   `id` INTEGER PRIMARY KEY AUTOINCREMENT,
   `num_used` INTEGER(10) NOT NULL DEFAULT '0',
@@ -18,6 +20,8 @@ CREATE TABLE IF NOT EXISTS `ipaliases` (
   CONSTRAINT `ipalias` UNIQUE (`ip`,`client_id`)
 );
 
+CREATE INDEX IF NOT EXISTS `ipaliases_client_id` ON `ipaliases` (`client_id`);
+
 CREATE TABLE IF NOT EXISTS `clients` (
   `id` INTEGER PRIMARY KEY AUTOINCREMENT,
   `ip` VARCHAR(16) NOT NULL DEFAULT '',
@@ -70,6 +74,8 @@ CREATE TABLE IF NOT EXISTS `penalties` (
   `time_expire` INTEGER(11) NOT NULL DEFAULT '0'
 );
 
+CREATE INDEX IF NOT EXISTS `penalties_client_id` ON `penalties` (`client_id`);
+
 CREATE TABLE IF NOT EXISTS `data` (
   `data_key` VARCHAR(255) NOT NULL PRIMARY KEY,
   `data_value` VARCHAR(255) NOT NULL
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+__version__ = '1.0'
+
+import BaseHTTPServer
+import SocketServer
+import json
+import threading
+
+
+class StatsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serve the statistics as JSON (/stats, /cron, ...): only GET requests are supported.
+    """
+    server_version = 'B3Stats/%s' % __version__
+
+    def do_GET(self):
+        name = self.path.split('?', 1)[0].strip('/') or 'stats'
+        provider = self.server.providers.get(name)
+        if provider is None:
+            self.send_error(404)
+            return
+
+        try:
+            body = json.dumps(provider(), sort_keys=True)
+        except Exception, e:
+            self.server.console.error('Could not collect %s statistics: %s', name, e)
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, msg, *args):
+        self.server.console.verbose2('Stats server: %s - %s', self.client_address[0], msg % args)
+
+
+class StatsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Read-only HTTP server exposing statistics: event handlers latency, queue wait time and depth, expired and vetoed
+    events (/stats) and crontabs run times (/cron). It is meant to be bound to a local address only.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, console, providers, host='127.0.0.1', port=0):
+        """
+        Object constructor.
+        :param console: The console class instance
+        :param providers: A dict mapping URL paths (without slashes) to functions returning the statistics to serve
+        :param host: The address to bind to
+        :param port: The port to listen on (0 to pick a free port)
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), StatsRequestHandler)
+        self.console = console
+        self.providers = providers
+        self._thread = None
+
+    def start(self):
+        """
+        Start serving requests in a daemon thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='b3-stats-server')
+        self._thread.setDaemon(True)
+        self._thread.start()
+        self.console.bot('Event statistics available at http://%s:%s/stats', *self.server_address[:2])
+
+    def stop(self):
+        """
+        Stop serving requests and release the socket.
+        """
+        if self._thread:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
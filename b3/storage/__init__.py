@@ -41,11 +41,17 @@ class Storage(object):
     def getClient(self, client):
         raise NotImplementedError
     
+    def getClientsByGuid(self, clients):
+        raise NotImplementedError
+
     def getClientsMatching(self, match):
         raise NotImplementedError
     
     def setClient(self, client):
         raise NotImplementedError
+
+    def setClients(self, clients):
+        raise NotImplementedError
     
     def setClientAlias(self, alias):
         raise NotImplementedError
@@ -88,6 +94,15 @@ class Storage(object):
     
     def numPenalties(self, client, type='Ban'):
         raise NotImplementedError
+
+    def loadPenaltySummary(self, client):
+        raise NotImplementedError
+
+    def loadPenaltySummaries(self, clients):
+        raise NotImplementedError
+
+    def dropPenaltySummary(self, client):
+        raise NotImplementedError
     
     def getGroups(self):
         raise NotImplementedError
@@ -95,6 +110,12 @@ class Storage(object):
     def getGroup(self, group):
         raise NotImplementedError
 
+    def getMaxGroup(self, bits):
+        raise NotImplementedError
+
+    def setGroup(self, group):
+        raise NotImplementedError
+
     def getTables(self):
         raise NotImplementedError
 
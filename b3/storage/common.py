@@ -23,6 +23,7 @@
 # ################################################################### #
 
 import b3
+import copy
 import os
 import re
 import sys
@@ -38,12 +39,114 @@ from b3.clients import Penalty
 from b3.querybuilder import QueryBuilder
 from b3.storage import Storage
 from b3.storage.cursor import Cursor as DBCursor
+from b3.storage.pool import ConnectionPool
+from b3.storage.writer import WriteFuture
+from b3.storage.writer import WriteQueue
 from contextlib import contextmanager
 from time import time
 
+class PenaltySummary(object):
+    """
+    Keep in memory the active penalties of a client, so penalty lookups don't need to hit the database.
+    """
+    types = ('Ban', 'TempBan', 'Warning')
+
+    def __init__(self, penalties):
+        """
+        Object constructor.
+        :param penalties: The active penalties of the client.
+        """
+        self._penalties = {}
+        self._lock = thread.allocate_lock()
+        for penalty in penalties:
+            self.update(penalty)
+
+    @staticmethod
+    def _types(type):
+        """
+        Return the given penalty type(s) as a tuple.
+        """
+        if isinstance(type, basestring):
+            return type,
+        return tuple(type)
+
+    def covers(self, type):
+        """
+        Tell whether the summary can answer lookups for the given penalty type(s).
+        :param type: The penalty type or a collection of penalty types.
+        """
+        return all(t in self.types for t in self._types(type))
+
+    def update(self, penalty):
+        """
+        Reflect a penalty which has just been written in the storage.
+        :param penalty: The saved penalty.
+        """
+        with self._lock:
+            self._penalties.pop(penalty.id, None)
+            if not int(penalty.inactive) and penalty.type in self.types:
+                self._penalties[penalty.id] = copy.copy(penalty)
+
+    def disable(self, type):
+        """
+        Forget all the penalties of the given type(s).
+        :param type: The penalty type or a collection of penalty types.
+        """
+        types = self._types(type)
+        with self._lock:
+            for penalty_id, penalty in self._penalties.items():
+                if penalty.type in types:
+                    del self._penalties[penalty_id]
+
+    def select(self, type, now):
+        """
+        Return copies of the penalties of the given type(s) which are not expired yet, most recent first.
+        :param type: The penalty type or a collection of penalty types.
+        :param now: The current timestamp.
+        """
+        types = self._types(type)
+        with self._lock:
+            penalties = [copy.copy(p) for p in self._penalties.itervalues()
+                         if p.type in types and (p.timeExpire == -1 or p.timeExpire > now)]
+        penalties.sort(key=lambda p: (p.timeAdd, p.id), reverse=True)
+        return penalties
+
+
+class GroupRegistry(object):
+    """
+    Index the groups table by keyword, level and bit, so group lookups don't need to hit the database.
+    """
+    def __init__(self, groups):
+        """
+        Object constructor.
+        :param groups: The groups available in the storage.
+        """
+        self.groups = sorted(groups, key=lambda g: g.level)
+        self.byKeyword = dict((g.keyword, g) for g in self.groups)
+        self.byLevel = dict((g.level, g) for g in reversed(self.groups))
+        self.byId = dict((g.id, g) for g in self.groups)
+        self._byBits = {}
+
+    def maxGroup(self, bits):
+        """
+        Return the highest level group among the ones set in the given group bits, falling back on the guest group.
+        Results are computed once per distinct bits value.
+        :param bits: The group bits of a client.
+        """
+        try:
+            return self._byBits[bits]
+        except KeyError:
+            matching = [g for g in self.groups if g.id & bits]
+            found = max(matching, key=lambda g: g.level) if matching else self.byId.get(0)
+            self._byBits[bits] = found
+            return found
+
+
 class DatabaseStorage(Storage):
 
     _lock = None
+    _pool = None
+    _writer = None
     _lastConnectAttempt = 0
     _consoleNotice = True
     _reName = re.compile(r'([A-Z])')
@@ -53,6 +156,13 @@ class DatabaseStorage(Storage):
     dsn = None
     dsnDict = None
 
+    clientFields = ('ip', 'greeting', 'connections', 'time_edit',
+                    'guid', 'pbid', 'name', 'time_add', 'auto_login',
+                    'mask_level', 'group_bits', 'login', 'password')
+
+    placeholder = '%s'              # bind parameter marker of the database driver
+    maxBindParams = 999             # bind parameters allowed in a single statement (SQLite default limit)
+
     def __init__(self, dsn, dsnDict, console):
         """
         Object constructor.
@@ -65,6 +175,7 @@ class DatabaseStorage(Storage):
         self.console = console
         self.db = None
         self._lock = thread.allocate_lock()
+        self._penaltySummaries = {}
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -98,6 +209,55 @@ class DatabaseStorage(Storage):
         """
         self.shutdown()
 
+    def startPool(self, maxsize):
+        """
+        Run the queries on a pool of connections so that a slow query doesn't block the other threads.
+        The main connection (see getConnection) is still used to write batches of queries in a single transaction.
+        :param maxsize: Max number of pooled connections.
+        """
+        if maxsize > 1 and self._pool is None:
+            self._pool = ConnectionPool(self, maxsize)
+
+    def stopPool(self):
+        """
+        Close the pooled connections: queries are then run again on the main connection.
+        """
+        pool, self._pool = self._pool, None
+        if pool:
+            pool.close()
+
+    def _newConnection(self):
+        """
+        Open a new connection with the storage layer to be used by the connection pool.
+        :raise Exception: If the connection cannot be established.
+        """
+        raise NotImplementedError
+
+    def _closeConnection(self, db):
+        """
+        Close a pooled connection.
+        """
+        try:
+            db.close()
+        except Exception:
+            pass
+
+    def _ping(self, db):
+        """
+        Check whether a pooled connection is still usable.
+        :return True if the connection is usable, False otherwise.
+        """
+        try:
+            cursor = db.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
     ####################################################################################################################
     #                                                                                                                  #
     #   STORAGE INTERFACE                                                                                              #
@@ -114,12 +274,9 @@ class DatabaseStorage(Storage):
             counts['clients'] = int(cursor.getValue('total'))
 
         cursor = self.query("""SELECT COUNT(id) total, type FROM penalties GROUP BY type""")
-        while not cursor.EOF:
-            r = cursor.getRow()
+        for r in cursor:
             counts[r['type'] + 's'] = int(r['total'])
-            cursor.moveNext()
 
-        cursor.close()
         return counts
 
     def getClient(self, client):
@@ -132,7 +289,8 @@ class DatabaseStorage(Storage):
 
         try:
 
-            cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'clients', where, None, 1))
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.query(qb.SelectQuery('*', 'clients', where, None, 1), qb.bindata())
             if not cursor.rowcount:
                 raise KeyError('no client matching guid %s' % client.guid)
 
@@ -163,24 +321,44 @@ class DatabaseStorage(Storage):
             else:
                 raise KeyError('no client matching guid %s in admins_cache' % client.guid)
 
+    def getClientsByGuid(self, clients):
+        """
+        Fill the given client objects with the data fetched from the storage, matching them by guid.
+        All the clients are looked up with a single query (split only when exceeding the bind parameters limit).
+        :param clients: The client objects to fill with fetch data.
+        :return: The list of clients found in the storage.
+        """
+        byGuid = dict((c.guid.upper(), c) for c in clients)
+        guids = [c.guid for c in clients]
+        found = []
+        for i in xrange(0, len(guids), self.maxBindParams):
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.query(qb.SelectQuery('*', 'clients', {'guid': guids[i:i + self.maxBindParams]}), qb.bindata())
+            for row in cursor:
+                client = byGuid.pop(row['guid'].upper(), None)
+                if client is None:
+                    continue
+                for k, v in row.iteritems():
+                    setattr(client, self.getVar(k), v)
+                found.append(client)
+        return found
+
     def getClientsMatching(self, match):
         """
         Return a list of clients matching the given data:
         :param match: The data to match clients against.
         """
         self.console.debug('Storage: getClientsMatching %s' % match)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'clients', match, 'time_edit DESC', 5))
+        qb = QueryBuilder(self.db, self.placeholder)
+        cursor = self.query(qb.SelectQuery('*', 'clients', match, 'time_edit DESC', 5), qb.bindata())
 
         clients = []
-        while not cursor.EOF:
-            g = cursor.getRow()
+        for g in cursor:
             client = Client()
             for k, v in g.iteritems():
                 setattr(client, self.getVar(k), v)
             clients.append(client)
-            cursor.moveNext()
 
-        cursor.close()
         return clients
 
     def setClient(self, client):
@@ -190,26 +368,46 @@ class DatabaseStorage(Storage):
         :return: The ID of the client stored into the database.
         """
         self.console.debug('Storage: setClient %s' % client)
-        fields = ('ip', 'greeting', 'connections', 'time_edit',
-                  'guid', 'pbid', 'name', 'time_add', 'auto_login',
-                  'mask_level', 'group_bits', 'login', 'password')
-
         data = {'id': client.id} if client.id > 0 else {}
 
-        for f in fields:
+        for f in self.clientFields:
             if hasattr(client, self.getVar(f)):
                 data[f] = getattr(client, self.getVar(f))
 
         self.console.debug('Storage: setClient data %s' % data)
         if client.id > 0:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'clients', {'id': client.id}))
+            qb = QueryBuilder(self.db, self.placeholder)
+            self.queryAsync(qb.UpdateQuery(data, 'clients', {'id': client.id}), qb.bindata())
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'clients'))
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.queryAsync(qb.InsertQuery(data, 'clients'), qb.bindata()).result()
             client.id = cursor.lastrowid
-            cursor.close()
 
         return client.id
 
+    def setClients(self, clients):
+        """
+        Insert/update several clients in the storage.
+        Clients already in the storage are updated with a single statement: new ones are inserted one by one.
+        :param clients: The clients to be saved.
+        """
+        rows = []
+        for client in clients:
+            if client.id > 0:
+                rows.append((client.id,) + tuple(getattr(client, self.getVar(f)) for f in self.clientFields))
+            else:
+                self.setClient(client)
+
+        if rows:
+            try:
+                self.queryBatch(self.upsertQueries('clients', ('id',) + self.clientFields, rows))
+            except Exception, e:
+                # i.e: SQLite < 3.24 or PostgreSQL < 9.5 have no upsert syntax
+                self.console.warning('Could not save clients at once (%s): saving them one by one', e)
+                for client in clients:
+                    if client.id > 0:
+                        self.setClient(client)
+
     def setClientAlias(self, alias):
         """
         Insert/update an alias in the storage.
@@ -226,11 +424,12 @@ class DatabaseStorage(Storage):
 
         self.console.debug('Storage: setClientAlias data %s' % data)
         if alias.id:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'aliases', {'id':alias.id}))
+            qb = QueryBuilder(self.db, self.placeholder)
+            self.queryAsync(qb.UpdateQuery(data, 'aliases', {'id':alias.id}), qb.bindata())
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'aliases'))
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.queryAsync(qb.InsertQuery(data, 'aliases'), qb.bindata()).result()
             alias.id = cursor.lastrowid
-            cursor.close()
 
         return alias.id
 
@@ -241,15 +440,15 @@ class DatabaseStorage(Storage):
         :return: The alias object given in input with all the fields set.
         """
         self.console.debug('Storage: getClientAlias %s' % alias)
+        qb = QueryBuilder(self.db, self.placeholder)
         if hasattr(alias, 'id') and alias.id > 0:
-            query = QueryBuilder(self.db).SelectQuery('*', 'aliases', {'id': alias.id}, None, 1)
+            query = qb.SelectQuery('*', 'aliases', {'id': alias.id}, None, 1)
         elif hasattr(alias, 'alias') and hasattr(alias, 'clientId'):
-            query = QueryBuilder(self.db).SelectQuery('*', 'aliases', {'alias': alias.alias,
-                                                                       'client_id': alias.clientId}, None, 1)
+            query = qb.SelectQuery('*', 'aliases', {'alias': alias.alias, 'client_id': alias.clientId}, None, 1)
         else:
             raise KeyError('no alias found matching %s' % alias)
 
-        cursor = self.query(query)
+        cursor = self.query(query, qb.bindata())
         if cursor.EOF:
             cursor.close()
             raise KeyError('no alias found matching %s' % alias)
@@ -271,11 +470,11 @@ class DatabaseStorage(Storage):
         :return: List of b3.clients.Alias instances.
         """
         self.console.debug('Storage: getClientAliases %s' % client)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'aliases', {'client_id': client.id}, 'id'))
+        qb = QueryBuilder(self.db, self.placeholder)
+        cursor = self.query(qb.SelectQuery('*', 'aliases', {'client_id': client.id}, 'id'), qb.bindata())
 
         aliases = []
-        while not cursor.EOF:
-            g = cursor.getRow()
+        for g in cursor:
             alias = b3.clients.Alias()
             alias.id = int(g['id'])
             alias.alias = g['alias']
@@ -284,9 +483,7 @@ class DatabaseStorage(Storage):
             alias.clientId = int(g['client_id'])
             alias.numUsed = int(g['num_used'])
             aliases.append(alias)
-            cursor.moveNext()
 
-        cursor.close()
         return aliases
 
     def setClientIpAddress(self, ipalias):
@@ -304,11 +501,12 @@ class DatabaseStorage(Storage):
 
         self.console.debug('Storage: setClientIpAddress data %s' % data)
         if ipalias.id:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'ipaliases', {'id': ipalias.id}))
+            qb = QueryBuilder(self.db, self.placeholder)
+            self.queryAsync(qb.UpdateQuery(data, 'ipaliases', {'id': ipalias.id}), qb.bindata())
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'ipaliases'))
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.queryAsync(qb.InsertQuery(data, 'ipaliases'), qb.bindata()).result()
             ipalias.id = cursor.lastrowid
-            cursor.close()
 
         return ipalias.id
 
@@ -319,15 +517,15 @@ class DatabaseStorage(Storage):
         :return: The ip alias object given in input with all the fields set.
         """
         self.console.debug('Storage: getClientIpAddress %s' % ipalias)
+        qb = QueryBuilder(self.db, self.placeholder)
         if hasattr(ipalias, 'id') and ipalias.id > 0:
-            query = QueryBuilder(self.db).SelectQuery('*', 'ipaliases', {'id': ipalias.id}, None, 1)
+            query = qb.SelectQuery('*', 'ipaliases', {'id': ipalias.id}, None, 1)
         elif hasattr(ipalias, 'ip') and hasattr(ipalias, 'clientId'):
-            query = QueryBuilder(self.db).SelectQuery('*', 'ipaliases', {'ip': ipalias.ip,
-                                                                         'client_id': ipalias.clientId}, None, 1)
+            query = qb.SelectQuery('*', 'ipaliases', {'ip': ipalias.ip, 'client_id': ipalias.clientId}, None, 1)
         else:
             raise KeyError('no ip found matching %s' % ipalias)
 
-        cursor = self.query(query)
+        cursor = self.query(query, qb.bindata())
         if cursor.EOF:
             cursor.close()
             raise KeyError('no ip found matching %s' % ipalias)
@@ -349,11 +547,11 @@ class DatabaseStorage(Storage):
         :return: List of b3.clients.IpAlias instances
         """
         self.console.debug('Storage: getClientIpAddresses %s' % client)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'ipaliases', {'client_id': client.id}, 'id'))
+        qb = QueryBuilder(self.db, self.placeholder)
+        cursor = self.query(qb.SelectQuery('*', 'ipaliases', {'client_id': client.id}, 'id'), qb.bindata())
 
         aliases = []
-        while not cursor.EOF:
-            row = cursor.getRow()
+        for row in cursor:
             ip = b3.clients.IpAlias()
             ip.id = int(row['id'])
             ip.ip = row['ip']
@@ -362,9 +560,7 @@ class DatabaseStorage(Storage):
             ip.clientId = int(row['client_id'])
             ip.numUsed = int(row['num_used'])
             aliases.append(ip)
-            cursor.moveNext()
 
-        cursor.close()
         return aliases
 
     def getLastPenalties(self, types='Ban', num=5):
@@ -374,13 +570,15 @@ class DatabaseStorage(Storage):
         :param num: The amount of penalties to retrieve.
         """
         penalties = []
-        where = QueryBuilder(self.db).WhereClause({'type': types, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery(fields='*', table='penalties', where=where,
-                                                              orderby='time_add DESC, id DESC', limit=num))
-        while not cursor.EOF and len(penalties) < num:
-            penalties.append(self._createPenaltyFromRow(cursor.getRow()))
-            cursor.moveNext()
+        qb = QueryBuilder(self.db, self.placeholder)
+        where = qb.WhereClause({'type': types, 'inactive': 0})
+        where += ' AND (time_expire = -1 OR time_expire > %s)' % qb.value(int(time()))
+        cursor = self.query(qb.SelectQuery(fields='*', table='penalties', where=where,
+                                           orderby='time_add DESC, id DESC', limit=num), qb.bindata())
+        for row in cursor:
+            penalties.append(self._createPenaltyFromRow(row))
+            if len(penalties) >= num:
+                break
 
         cursor.close()
         return penalties
@@ -417,12 +615,20 @@ class DatabaseStorage(Storage):
 
         self.console.debug('Storage: setClientPenalty data %s' % data)
 
+        # penalties are read back right away (ban checks, warnings count): wait for them to be written
         if penalty.id:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'penalties', {'id': penalty.id}))
+            qb = QueryBuilder(self.db, self.placeholder)
+            self.queryAsync(qb.UpdateQuery(data, 'penalties', {'id': penalty.id}), qb.bindata()).result()
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'penalties'))
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.queryAsync(qb.InsertQuery(data, 'penalties'), qb.bindata()).result()
             penalty.id = cursor.lastrowid
-            cursor.close()
+
+        if penalty.clientId:
+            summary = self._penaltySummaries.get(int(penalty.clientId))
+            if summary is not None:
+                # read it back so the summary holds the very same values a lookup query would return
+                summary.update(self.getClientPenalty(Penalty(id=penalty.id)))
 
         return penalty.id
 
@@ -433,7 +639,8 @@ class DatabaseStorage(Storage):
         :return: The penalty given as input with all the fields set.
         """
         self.console.debug('Storage: getClientPenalty %s' % penalty)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', {'id': penalty.id}, None, 1))
+        qb = QueryBuilder(self.db, self.placeholder)
+        cursor = self.query(qb.SelectQuery('*', 'penalties', {'id': penalty.id}, None, 1), qb.bindata())
         if cursor.EOF:
             cursor.close()
             raise KeyError('no penalty matching id %s' % penalty.id)
@@ -448,17 +655,16 @@ class DatabaseStorage(Storage):
         :return: List of penalties
         """
         self.console.debug('Storage: getClientPenalties %s' % client)
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where, 'time_add DESC'))
+        summary = self._getPenaltySummary(client, type)
+        if summary is not None:
+            return summary.select(type, int(time()))
 
-        penalties = []
-        while not cursor.EOF:
-            penalties.append(self._createPenaltyFromRow(cursor.getRow()))
-            cursor.moveNext()
+        qb = QueryBuilder(self.db, self.placeholder)
+        where = qb.WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
+        where += ' AND (time_expire = -1 OR time_expire > %s)' % qb.value(int(time()))
+        cursor = self.query(qb.SelectQuery('*', 'penalties', where, 'time_add DESC'), qb.bindata())
 
-        cursor.close()
-        return penalties
+        return [self._createPenaltyFromRow(row) for row in cursor]
 
     def getClientLastPenalty(self, client, type='Ban'):
         """
@@ -467,9 +673,15 @@ class DatabaseStorage(Storage):
         :param type: The type of the penalty we want to retrieve.
         :return: The last penalty added for the given client
         """
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where, 'time_add DESC', 1))
+        summary = self._getPenaltySummary(client, type)
+        if summary is not None:
+            penalties = summary.select(type, int(time()))
+            return penalties[0] if penalties else None
+
+        qb = QueryBuilder(self.db, self.placeholder)
+        where = qb.WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
+        where += ' AND (time_expire = -1 OR time_expire > %s)' % qb.value(int(time()))
+        cursor = self.query(qb.SelectQuery('*', 'penalties', where, 'time_add DESC', 1), qb.bindata())
 
         row = cursor.getOneRow()
         if not row:
@@ -484,10 +696,16 @@ class DatabaseStorage(Storage):
         :param type: The type of the penalty we want to retrieve.
         :return: The first penalty added for the given client.
         """
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where,
-                                                              'time_expire DESC, time_add ASC', 1))
+        summary = self._getPenaltySummary(client, type)
+        if summary is not None:
+            penalties = sorted(summary.select(type, int(time())), key=lambda p: (-p.timeExpire, p.timeAdd))
+            return penalties[0] if penalties else None
+
+        qb = QueryBuilder(self.db, self.placeholder)
+        where = qb.WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
+        where += ' AND (time_expire = -1 OR time_expire > %s)' % qb.value(int(time()))
+        cursor = self.query(qb.SelectQuery('*', 'penalties', where, 'time_expire DESC, time_add ASC', 1),
+                            qb.bindata())
         row = cursor.getOneRow()
         if not row:
             return None
@@ -500,8 +718,12 @@ class DatabaseStorage(Storage):
         :param client: The client whose penalties we want to disable.
         :param type: The type of the penalties we want to disable.
         """
-        self.query(QueryBuilder(self.db).UpdateQuery({'inactive': 1}, 'penalties',
-                                                     {'type': type, 'client_id': client.id, 'inactive': 0}))
+        qb = QueryBuilder(self.db, self.placeholder)
+        self.query(qb.UpdateQuery({'inactive': 1}, 'penalties', {'type': type, 'client_id': client.id, 'inactive': 0}),
+                   qb.bindata())
+        summary = self._penaltySummaries.get(client.id)
+        if summary is not None:
+            summary.disable(type)
 
     def numPenalties(self, client, type='Ban'):
         """
@@ -510,36 +732,85 @@ class DatabaseStorage(Storage):
         :param type: The penalties type.
         :return The number of penalties.
         """
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query("""SELECT COUNT(id) total FROM penalties WHERE %s""" % where)
+        summary = self._getPenaltySummary(client, type)
+        if summary is not None:
+            return len(summary.select(type, int(time())))
+
+        qb = QueryBuilder(self.db, self.placeholder)
+        where = qb.WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
+        where += ' AND (time_expire = -1 OR time_expire > %s)' % qb.value(int(time()))
+        cursor = self.query("""SELECT COUNT(id) total FROM penalties WHERE %s""" % where, qb.bindata())
         value = int(cursor.getValue('total', 0))
         cursor.close()
         return value
 
-    _groups = None
+    def loadPenaltySummary(self, client):
+        """
+        Load with a single query the active bans and warnings of the given client and keep them in memory
+        (until dropPenaltySummary is called), so that the penalty lookups of the client don't hit the database.
+        :param client: The client whose penalties we want to load.
+        :return: The penalty summary of the client.
+        """
+        return self.loadPenaltySummaries([client])[client.id]
 
-    def getGroups(self):
+    def loadPenaltySummaries(self, clients):
         """
-        Return a list of available client groups.
+        Load the penalty summaries of several clients with a single query (see loadPenaltySummary).
+        :param clients: The clients whose penalties we want to load.
+        :return: A dict mapping client ids to penalty summaries.
+        """
+        penalties = dict((c.id, []) for c in clients if c.id)
+        ids = penalties.keys()
+        # leave room for the penalty types, the inactive flag and the expiration time
+        chunksize = self.maxBindParams - len(PenaltySummary.types) - 2
+        for i in xrange(0, len(ids), chunksize):
+            qb = QueryBuilder(self.db, self.placeholder)
+            where = qb.WhereClause({'type': PenaltySummary.types, 'client_id': ids[i:i + chunksize], 'inactive': 0})
+            where += ' AND (time_expire = -1 OR time_expire > %s)' % qb.value(int(time()))
+            cursor = self.query(qb.SelectQuery('*', 'penalties', where), qb.bindata())
+            for row in cursor:
+                penalty = self._createPenaltyFromRow(row)
+                penalties[penalty.clientId].append(penalty)
+
+        summaries = dict((cid, PenaltySummary(p)) for cid, p in penalties.iteritems())
+        self._penaltySummaries.update(summaries)
+        return summaries
+
+    def dropPenaltySummary(self, client):
+        """
+        Discard the in-memory penalty summary of the given client.
+        :param client: The client whose penalty summary we want to discard.
+        """
+        self._penaltySummaries.pop(client.id, None)
+
+    def _getPenaltySummary(self, client, type):
+        """
+        Return the penalty summary of the given client if it can answer lookups for the given penalty type(s),
+        None otherwise (internal method).
+        """
+        summary = self._penaltySummaries.get(client.id)
+        if summary is not None and summary.covers(type):
+            return summary
+        return None
+
+    _groupRegistry = None
+
+    def getGroupRegistry(self):
         """
-        if not self._groups:
+        Return the in-memory index of the groups table, loading it if needed.
+        The registry is discarded only when a group is saved through setGroup.
+        """
+        registry = self._groupRegistry
+        if registry is None:
             cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'groups', None, 'level'))
-            self._groups = []
-            while not cursor.EOF:
-                row = cursor.getRow()
-                group = b3.clients.Group()
-                group.id = int(row['id'])
-                group.name = row['name']
-                group.keyword = row['keyword']
-                group.level = int(row['level'])
-                group.timeAdd = int(row['time_add'])
-                group.timeEdit = int(row['time_edit'])
-                self._groups.append(group)
-                cursor.moveNext()
-            cursor.close()
+            registry = self._groupRegistry = GroupRegistry([self._createGroupFromRow(row) for row in cursor])
+        return registry
 
-        return self._groups
+    def getGroups(self):
+        """
+        Return a list of available client groups.
+        """
+        return self.getGroupRegistry().groups
 
     def getGroup(self, group):
         """
@@ -547,33 +818,62 @@ class DatabaseStorage(Storage):
         :param group: A group object with level or keyword filled.
         :return: The group instance given in input with all the fields set.
         """
+        registry = self.getGroupRegistry()
         if hasattr(group, 'keyword') and group.keyword:
-            query = QueryBuilder(self.db).SelectQuery('*', 'groups', dict(keyword=group.keyword), None, 1)
-            self.console.verbose2(query)
-            cursor = self.query(query)
-            row = cursor.getOneRow()
-            if not row:
+            found = registry.byKeyword.get(group.keyword)
+            if found is None:
                 raise KeyError('no group matching keyword: %s' % group.keyword)
 
         elif hasattr(group, 'level') and group.level >= 0:
-            query = QueryBuilder(self.db).SelectQuery('*', 'groups', dict(level=group.level), None, 1)
-            self.console.verbose2(query)
-            cursor = self.query(query)
-            row = cursor.getOneRow()
-            if not row:
+            found = registry.byLevel.get(int(group.level))
+            if found is None:
                 raise KeyError('no group matching level: %s' % group.level)
         else:
             raise KeyError("cannot find Group as no keyword/level provided")
 
-        group.id = int(row['id'])
-        group.name = row['name']
-        group.keyword = row['keyword']
-        group.level = int(row['level'])
-        group.timeAdd = int(row['time_add'])
-        group.timeEdit = int(row['time_edit'])
+        group.id = found.id
+        group.name = found.name
+        group.keyword = found.keyword
+        group.level = found.level
+        group.timeAdd = found.timeAdd
+        group.timeEdit = found.timeEdit
 
         return group
 
+    def getMaxGroup(self, bits):
+        """
+        Return the highest level group among the ones set in the given group bits.
+        :param bits: The group bits of a client.
+        :return: The matching group, the guest group if none matches or None if there is no guest group.
+        """
+        return self.getGroupRegistry().maxGroup(bits)
+
+    def setGroup(self, group):
+        """
+        Insert/update a group in the storage.
+        :param group: The group to be saved.
+        :return: The ID of the group saved in the storage.
+        """
+        data = {'name': group.name, 'keyword': group.keyword, 'level': group.level,
+                'time_add': group.timeAdd, 'time_edit': group.timeEdit}
+
+        self.console.debug('Storage: setGroup data %s' % data)
+        cursor = None
+        if group.id:
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.query(qb.UpdateQuery(data, 'groups', {'id': group.id}), qb.bindata())
+
+        if cursor is None or cursor.rowcount <= 0:
+            if group.id:
+                data['id'] = group.id
+            qb = QueryBuilder(self.db, self.placeholder)
+            cursor = self.query(qb.InsertQuery(data, 'groups'), qb.bindata())
+            if not group.id:
+                group.id = cursor.lastrowid
+
+        self._groupRegistry = None
+        return group.id
+
     def truncateTable(self, table):
         """
         Empty a database table (or a collection of tables)
@@ -602,18 +902,66 @@ class DatabaseStorage(Storage):
         :param bindata: Data to bind to the given query.
         :raise Exception: If the query cannot be evaluated.
         """
+        if self._pool is not None and self._pooled(query):
+            with self._pool.connection() as db:
+                return self._execute(query, bindata, db)
+
         self._lock.acquire()
         try:
-            cursor = self.db.cursor()
-            if bindata is None:
-                cursor.execute(query)
-            else:
-                cursor.execute(query, bindata)
-            dbcursor = DBCursor(cursor, self.db)
+            dbcursor = self._execute(query, bindata)
         finally:
             self._lock.release()
         return dbcursor
 
+    def _pooled(self, query):
+        """
+        Tell whether the given query can run on a pooled connection (internal method).
+        """
+        return True
+
+    def _bindata(self, bindata):
+        """
+        Return the given bind parameters with the byte strings decoded (internal method).
+        Strings coming from the game log (i.e: player names) are bytes encoded with the game server encoding: sqlite3
+        rejects them as soon as they are not ASCII, and the other drivers would store them as is.
+        :param bindata: Data to bind to a query.
+        """
+        if bindata is None:
+            return None
+        return tuple(self._decode(x) if isinstance(x, str) else x for x in bindata)
+
+    def _decode(self, value):
+        """
+        Decode a byte string (internal method).
+        UTF-8 is tried first since some values are encoded on purpose (i.e: penalty reasons) and a latin-1 string is
+        hardly ever valid UTF-8; then the game server encoding, and latin-1 as a last resort (it never fails).
+        """
+        encoding = getattr(self.console, 'encoding', None)
+        for codec in ('utf-8', encoding) if isinstance(encoding, basestring) else ('utf-8',):
+            try:
+                return value.decode(codec)
+            except (UnicodeDecodeError, LookupError):
+                pass
+        return value.decode('latin-1')
+
+    def _execute(self, query, bindata=None, db=None):
+        """
+        Execute a query on the storage layer (internal method).
+        Unless a pooled connection is given, the caller must hold the storage lock.
+        :param query: The query to execute.
+        :param bindata: Data to bind to the given query.
+        :param db: The connection to use (defaults to the main connection).
+        :raise Exception: If the query cannot be evaluated.
+        """
+        if db is None:
+            db = self.db
+        cursor = db.cursor()
+        if bindata is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, self._bindata(bindata))
+        return DBCursor(cursor, db)
+
     def query(self, query, bindata=None):
         """
         Execute a query on the storage layer.
@@ -634,6 +982,18 @@ class DatabaseStorage(Storage):
             self.console.error('Query failed [%s] %r: %s', query, bindata, e)
             raise e
 
+    @contextmanager
+    def session(self):
+        """
+        Run all the queries issued by the calling thread within the 'with' statement block on the same connection,
+        for queries relying on the connection state (i.e: session variables).
+        """
+        if self._pool is None:
+            yield
+        else:
+            with self._pool.connection():
+                yield
+
     @contextmanager
     def query2(self, query, bindata=None):
         """
@@ -658,6 +1018,102 @@ class DatabaseStorage(Storage):
             if cursor:
                 cursor.close()
 
+    def queryBatch(self, queries):
+        """
+        Execute several queries in a single transaction: either all of them are applied or none is.
+        :param queries: A list of (query, bindata) tuples.
+        :raise Exception: If one of the queries cannot be evaluated (the transaction is rolled back).
+        """
+        connection = self.getConnection()
+        if not connection:
+            raise Exception('lost connection with the storage layer during query')
+
+        query, bindata = None, None
+        self._lock.acquire()
+        try:
+            cursor = self.db.cursor()
+            try:
+                cursor.execute('BEGIN')
+                for query, bindata in queries:
+                    cursor.execute(query, self._bindata(bindata))
+                cursor.execute('COMMIT')
+            except Exception, e:
+                self.console.error('Query failed [%s] %r: %s', query, bindata, e)
+                try:
+                    cursor.execute('ROLLBACK')
+                except Exception:
+                    pass
+                raise e
+            finally:
+                cursor.close()
+        finally:
+            self._lock.release()
+
+    def startWriter(self, maxsize=1000):
+        """
+        Start the write-behind queue: queries given to queryAsync() are then executed by a dedicated thread,
+        coalescing the ones waiting in the queue into a single transaction.
+        :param maxsize: Max number of queries waiting to be written: producers block once the queue is full.
+        """
+        if self._writer and self._writer.isAlive():
+            return
+        self._writer = WriteQueue(self, maxsize)
+        self._writer.start()
+
+    def stopWriter(self, timeout=None):
+        """
+        Stop the write-behind queue once all the queries it holds have been written.
+        :param timeout: The maximum amount of seconds to wait for the queue to be drained, None to wait forever.
+        """
+        writer, self._writer = self._writer, None
+        if writer and writer.isAlive():
+            self.console.bot('Draining storage write queue (%s queries)...' % writer.qsize())
+            if not writer.stop(timeout):
+                self.console.warning('Storage write queue not drained within %s seconds' % timeout)
+
+    def queryAsync(self, query, bindata=None):
+        """
+        Queue a write query to be executed by the storage writer thread.
+        When the write queue is not running the query is executed right away (and exceptions are raised).
+        :param query: The query to execute.
+        :param bindata: Data to bind to the given query.
+        :return: A WriteFuture resolved with the query cursor (closed: only lastrowid and rowcount are meaningful).
+        """
+        writer = self._writer
+        if writer is not None:
+            return writer.put(query, bindata)
+        cursor = self.query(query, bindata)
+        cursor.close()
+        future = WriteFuture()
+        future.setResult(cursor)
+        return future
+
+    def upsertQueries(self, table, fields, rows, key='id'):
+        """
+        Build the queries inserting the given rows in a table or updating them if they already exist.
+        Rows are inserted with multi-row statements, as many rows per statement as the bind parameters limit allows.
+        :param table: The table name.
+        :param fields: The column names (the key column included).
+        :param rows: A list of tuples holding the column values in the same order as fields.
+        :param key: The unique column identifying already existing rows.
+        :return: A list of (query, bindata) tuples to be executed with queryBatch().
+        """
+        queries = []
+        rowmarker = '(%s)' % ', '.join([self.placeholder] * len(fields))
+        chunksize = max(1, self.maxBindParams // len(fields))
+        for i in xrange(0, len(rows), chunksize):
+            chunk = rows[i:i + chunksize]
+            query = 'INSERT INTO %s (%s) VALUES %s %s' % (table, ', '.join(fields), ', '.join([rowmarker] * len(chunk)),
+                                                          self._upsertClause(fields, key))
+            queries.append((query, tuple(v for row in chunk for v in row)))
+        return queries
+
+    def _upsertClause(self, fields, key):
+        """
+        Return the clause turning an INSERT statement into an upsert (SQLite 3.24+ and PostgreSQL 9.5+ syntax).
+        """
+        return 'ON CONFLICT (%s) DO UPDATE SET %s' % (key, ', '.join('%s = excluded.%s' % (f, f) for f in fields if f != key))
+
     def queryFromFile(self, fp, silent=False):
         """
         This method executes an external sql file on the current database.
@@ -729,6 +1185,21 @@ class DatabaseStorage(Storage):
         lines = [x.strip() for x in sqlfile if x and not x.startswith('#') and not x.startswith('--')]
         return [x.strip() for x in ' '.join(lines).split(';') if x]
 
+    @staticmethod
+    def _createGroupFromRow(row):
+        """
+        Create a Group object given a result set row.
+        :param row: The result set row
+        """
+        group = b3.clients.Group()
+        group.id = int(row['id'])
+        group.name = row['name']
+        group.keyword = row['keyword']
+        group.level = int(row['level'])
+        group.timeAdd = int(row['time_add'])
+        group.timeEdit = int(row['time_edit'])
+        return group
+
     @staticmethod
     def _createPenaltyFromRow(row):
         """
@@ -22,21 +22,91 @@
 #                                                                     #
 # ################################################################### #
 
+class Row(object):
+    """
+    A result set row: values are kept in the tuple returned by the driver and looked up by column name through
+    the index shared by all the rows of the same result set.
+    """
+    __slots__ = ('_values', '_index')
+
+    def __init__(self, values, index):
+        """
+        Object constructor.
+        :param values: The tuple of values returned by the database driver.
+        :param index: A dict mapping column names to their position in the values tuple.
+        """
+        self._values = values
+        self._index = index
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, long)):
+            return self._values[key]
+        return self._values[self._index[key]]
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        return self.asDict() == (other.asDict() if isinstance(other, Row) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Row(%r)' % self.asDict()
+
+    def get(self, key, default=None):
+        """
+        Return the value of the given column, or default if the column is not in the result set.
+        """
+        try:
+            return self._values[self._index[key]]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return [self._values[i] for i in self._index.itervalues()]
+
+    def items(self):
+        return [(k, self._values[i]) for k, i in self._index.iteritems()]
+
+    def iteritems(self):
+        for k, i in self._index.iteritems():
+            yield k, self._values[i]
+
+    def asDict(self):
+        """
+        Return the row as a dict.
+        """
+        return dict(self.iteritems())
+
 
 class Cursor(object):
 
     _cursor = None
     _conn = None
+    _fields = None
+    _columns = None
+    _index = None
+    _primed = False
+    _eof = False
 
-    fields = None
     lastrowid = 0
     rowcount = 0
 
-    EOF = False
-
     def __init__(self, cursor, conn):
         """
         Object constructor.
+        The first row of the result set is fetched only when needed.
         :param cursor: The opened result cursor.
         :param conn: The database connection instance.
         """
@@ -45,23 +115,58 @@ class Cursor(object):
         self.rowcount = self._cursor.rowcount
         self.lastrowid = self._cursor.lastrowid
 
+    def _prime(self):
+        """
+        Fetch the first row of the result set (internal method).
+        """
+        self._primed = True
         try:
-            self.EOF = self.moveNext()
+            self.moveNext()
         except Exception:
             # not a select statement
-            self.EOF = not self.fields or self.rowcount <= 0 or not self._cursor
+            self._eof = not self._fields or self.rowcount <= 0 or not self._cursor
+
+    def _getEOF(self):
+        if not self._primed:
+            self._prime()
+        return self._eof
+
+    def _setEOF(self, value):
+        self._primed = True
+        self._eof = value
+
+    def _getFields(self):
+        if not self._primed:
+            self._prime()
+        return self._fields
+
+    def _setFields(self, value):
+        self._fields = value
+
+    EOF = property(_getEOF, _setEOF)
+    fields = property(_getFields, _setFields)
+
+    def _getIndex(self):
+        """
+        Return the column name -> position mapping of the result set (internal method).
+        """
+        if self._index is None:
+            self._columns = [d[0] for d in self._cursor.description]
+            self._index = dict((name, i) for i, name in enumerate(self._columns))
+        return self._index
 
     def moveNext(self):
         """
         Move the cursor to the next available record.
         :return True if there is one more record, False otherwise.
         """
-        if not self.EOF:
-            self.fields = self._cursor.fetchone()
-            self.EOF = not self.fields or not self._cursor
-            if self.EOF:
+        self._primed = True
+        if not self._eof:
+            self._fields = self._cursor.fetchone()
+            self._eof = not self._fields or not self._cursor
+            if self._eof:
                 self.close()
-        return self.EOF
+        return self._eof
 
     def getOneRow(self, default=None):
         """
@@ -81,21 +186,46 @@ class Cursor(object):
         """
         if self.EOF:
             return dict()
-        d = dict()
-        desc = self._cursor.description
-        for i in xrange(0, len(self.fields)):
-            d[desc[i][0]] = self.fields[i]
-        return d
+        self._getIndex()
+        return dict(zip(self._columns, self._fields))
 
     def getValue(self, key, default=None):
         """
         Return a value from the current result set row.
         :return The value extracted from the result set or default if the the given key doesn't match any field.
         """
-        row = self.getRow()
-        if key in row:
-           return row[key]
-        return default
+        if self.EOF:
+            return default
+        try:
+            return self._fields[self._getIndex()[key]]
+        except KeyError:
+            return default
+
+    def rows(self, size=100):
+        """
+        Iterate over the remaining rows of the result set (the current one included), fetching them in batches.
+        The result set is closed once all the rows have been read.
+        Example:
+
+        >> for row in self.console.storage.query(query):
+        >>     print row['id']
+
+        :param size: The number of rows to fetch at once.
+        :return A generator of Row objects.
+        """
+        if self.EOF:
+            return
+        index = self._getIndex()
+        yield Row(self._fields, index)
+        while self._cursor:
+            batch = self._cursor.fetchmany(size)
+            if not batch:
+                break
+            for values in batch:
+                yield Row(values, index)
+        self.close()
+
+    __iter__ = rows
 
     def close(self):
         """
@@ -104,4 +234,4 @@ class Cursor(object):
         if self._cursor:
             self._cursor.close()
         self._cursor = None
-        self.EOF = True
\ No newline at end of file
+        self.EOF = True
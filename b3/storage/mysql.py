@@ -278,13 +278,7 @@ class MysqlStorage(DatabaseStorage):
             self.console.bot('Connecting to MySQL database: %(protocol)s://%(user)s:******@%(host)s:%(port)s%(path)s...', self.dsnDict)
 
             try:
-                # create the connection instance using the specified connector
-                self.db = self.__driver.connect(host=self.dsnDict['host'],
-                                                port=self.dsnDict['port'],
-                                                user=self.dsnDict['user'],
-                                                passwd=self.dsnDict['password'],
-                                                db=self.dsnDict['path'][1:],
-                                                charset="utf8")
+                self.db = self._newConnection()
 
                 self.console.bot('Successfully established a connection with MySQL database')
                 self._lastConnectAttempt = 0
@@ -317,6 +311,31 @@ class MysqlStorage(DatabaseStorage):
 
         return self.db
 
+    def _newConnection(self):
+        """
+        Open a new connection with the storage layer.
+        :raise Exception: If the connection cannot be established.
+        """
+        kwargs = {}
+        if isinstance(self, MysqlConnectorStorage):
+            # fetch result sets at once so a pooled connection can be reused while a cursor is still being read
+            kwargs['buffered'] = True
+
+        # create the connection instance using the specified connector
+        db = self.__driver.connect(host=self.dsnDict['host'],
+                                   port=self.dsnDict['port'],
+                                   user=self.dsnDict['user'],
+                                   passwd=self.dsnDict['password'],
+                                   db=self.dsnDict['path'][1:],
+                                   charset="utf8", **kwargs)
+
+        # make changes visible to the other connections right away (transactional tables only)
+        if callable(getattr(db, 'autocommit', None)):
+            db.autocommit(True)
+        else:
+            db.autocommit = True
+        return db
+
     ####################################################################################################################
     #                                                                                                                  #
     #   STORAGE INTERFACE                                                                                              #
@@ -344,17 +363,31 @@ class MysqlStorage(DatabaseStorage):
         :param table: The database table or a collection of tables
         :raise KeyError: If the table is not present in the database
         """
-        try:
-            self.query("""SET FOREIGN_KEY_CHECKS=0;""")
-            current_tables = self.getTables()
-            if isinstance(table, tuple) or isinstance(table, list):
-                for v in table:
-                    if not v in current_tables:
-                        raise KeyError("could not find table '%s' in the database" % v)
-                    self.query("TRUNCATE TABLE %s;" % v)
-            else:
-                if not table in current_tables:
-                     raise KeyError("could not find table '%s' in the database" % table)
-                self.query("TRUNCATE TABLE %s;" % table)
-        finally:
-            self.query("""SET FOREIGN_KEY_CHECKS=1;""")
\ No newline at end of file
+        # FOREIGN_KEY_CHECKS is a session variable: run everything on the same connection
+        with self.session():
+            try:
+                self.query("""SET FOREIGN_KEY_CHECKS=0;""")
+                current_tables = self.getTables()
+                if isinstance(table, tuple) or isinstance(table, list):
+                    for v in table:
+                        if not v in current_tables:
+                            raise KeyError("could not find table '%s' in the database" % v)
+                        self.query("TRUNCATE TABLE %s;" % v)
+                else:
+                    if not table in current_tables:
+                         raise KeyError("could not find table '%s' in the database" % table)
+                    self.query("TRUNCATE TABLE %s;" % table)
+            finally:
+                self.query("""SET FOREIGN_KEY_CHECKS=1;""")
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   QUERY PROCESSING                                                                                               #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def _upsertClause(self, fields, key):
+        """
+        Return the clause turning an INSERT statement into an upsert.
+        """
+        return 'ON DUPLICATE KEY UPDATE %s' % ', '.join('%s = VALUES(%s)' % (f, f) for f in fields if f != key)
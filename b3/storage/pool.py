@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import threading
+
+from contextlib import contextmanager
+from time import time
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of database connections.
+    A thread checks out a connection for the duration of a query and gives it back once done: nested checkouts made
+    by the same thread share the same connection.
+    """
+    healthCheckInterval = 30    # seconds a connection can sit idle before being checked again on checkout
+    checkoutTimeout = 10        # seconds to wait for a connection when all of them are in use
+    minBackoff = 1              # seconds to wait before a new attempt after a failed connection attempt
+    maxBackoff = 60             # max seconds to wait between connection attempts
+
+    def __init__(self, storage, maxsize):
+        """
+        Object constructor.
+        :param storage: The DatabaseStorage instance opening, checking and closing the connections.
+        :param maxsize: Max number of connections opened at the same time.
+        """
+        self.storage = storage
+        self.console = storage.console
+        self.maxsize = maxsize
+        self._idle = []             # (connection, last use time) stack: the most recently used connection last
+        self._size = 0              # number of opened connections (idle and checked out)
+        self._failures = 0          # number of consecutive failed connection attempts
+        self._retryTime = 0         # time before which no connection attempt is made
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the calling thread.
+        Example:
+
+        >> with pool.connection() as db:
+        >>     cursor = db.cursor()
+        >>     ...
+
+        :raise Exception: If no connection could be checked out.
+        """
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            try:
+                yield local.db
+            finally:
+                local.depth -= 1
+            return
+
+        db = self._checkout()
+        local.db, local.depth = db, 1
+        healthy = True
+        try:
+            yield db
+        except Exception:
+            healthy = self.storage._ping(db)
+            raise
+        finally:
+            local.db, local.depth = None, 0
+            self._checkin(db, healthy)
+
+    def close(self):
+        """
+        Close the idle connections: the ones checked out are closed when given back.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notifyAll()
+        for db, lastuse in idle:
+            self.storage._closeConnection(db)
+
+    def size(self):
+        """
+        Return the number of opened connections.
+        """
+        return self._size
+
+    def _checkout(self):
+        """
+        Take an idle connection, or open a new one if the pool is not full (else wait for one to be given back).
+        """
+        db = lastuse = None
+        deadline = time() + self.checkoutTimeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise Exception('database connection pool closed')
+                if self._idle:
+                    db, lastuse = self._idle.pop()
+                    break
+                if self._size < self.maxsize:
+                    self._size += 1
+                    break
+                remaining = deadline - time()
+                if remaining <= 0:
+                    raise Exception('no database connection available within %s seconds' % self.checkoutTimeout)
+                self._cond.wait(remaining)
+
+        if db is None:
+            return self._open()
+
+        if time() - lastuse > self.healthCheckInterval and not self.storage._ping(db):
+            self.console.warning('Discarding broken database connection')
+            self.storage._closeConnection(db)
+            return self._open()
+
+        return db
+
+    def _checkin(self, db, healthy):
+        """
+        Give back a checked out connection: broken connections are closed.
+        """
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append((db, time()))
+                self._cond.notify()
+                return
+            self._size -= 1
+            self._cond.notify()
+        self.storage._closeConnection(db)
+
+    def _open(self):
+        """
+        Open a new connection in a slot already reserved by the caller.
+        Connection attempts following a failed one are delayed with an exponential backoff.
+        """
+        try:
+            if time() < self._retryTime:
+                raise Exception('last database connection attempt failed less than %s seconds ago' %
+                                min(self.maxBackoff, self.minBackoff * 2 ** (self._failures - 1)))
+            try:
+                db = self.storage._newConnection()
+            except Exception, e:
+                with self._cond:
+                    self._failures += 1
+                    delay = min(self.maxBackoff, self.minBackoff * 2 ** (self._failures - 1))
+                    self._retryTime = time() + delay
+                self.console.error('Could not open a new database connection (next attempt in %s seconds): %s', delay, e)
+                raise
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._failures = 0
+            self._retryTime = 0
+        return db
@@ -97,15 +97,7 @@ class PostgresqlStorage(DatabaseStorage):
 
             try:
 
-                import psycopg2
-                self.db = psycopg2.connect(host=self.dsnDict['host'],
-                                           port=self.dsnDict['port'],
-                                           user=self.dsnDict['user'],
-                                           password=self.dsnDict['password'],
-                                           database=self.dsnDict['path'][1:])
-
-                self.db.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-                self.db.set_client_encoding("UTF8")
+                self.db = self._newConnection()
 
                 self.console.bot('Successfully established a connection with PostgreSQL database')
                 self._lastConnectAttempt = 0
@@ -139,6 +131,22 @@ class PostgresqlStorage(DatabaseStorage):
 
         return self.db
 
+    def _newConnection(self):
+        """
+        Open a new connection with the storage layer.
+        :raise Exception: If the connection cannot be established.
+        """
+        import psycopg2
+        db = psycopg2.connect(host=self.dsnDict['host'],
+                              port=self.dsnDict['port'],
+                              user=self.dsnDict['user'],
+                              password=self.dsnDict['password'],
+                              database=self.dsnDict['path'][1:])
+
+        db.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        db.set_client_encoding("UTF8")
+        return db
+
     def getConnection(self):
         """
         Return the database connection. If the connection has not been established yet, will establish a new one.
@@ -201,46 +209,44 @@ class PostgresqlStorage(DatabaseStorage):
     #                                                                                                                  #
     ####################################################################################################################
 
-    def _query(self, query, bindata=None):
+    def _execute(self, query, bindata=None, db=None):
         """
         Execute a query on the storage layer (internal method).
+        Unless a pooled connection is given, the caller must hold the storage lock.
         :param query: The query to execute.
         :param bindata: Data to bind to the given query.
+        :param db: The connection to use (defaults to the main connection).
         :raise Exception: If the query cannot be evaluated.
         """
-        self._lock.acquire()
+        # postgresql doesn't support backticks: the query will be logged with backticks since
+        # logging is handled in 'query()' but we will strip them out before executing the query.
+        newquery = query.replace('`','').strip()
+
+        if db is None:
+            db = self.db
+        cursor = db.cursor()
+        if bindata is None:
+            cursor.execute(newquery)
+        else:
+            cursor.execute(newquery, self._bindata(bindata))
 
-        try:
-            # postgresql doesn't support backticks: the query will be logged with backticks since
-            # logging is handled in 'query()' but we will strip them out before executing the query.
-            newquery = query.replace('`','').strip()
-
-            cursor = self.db.cursor()
-            if bindata is None:
-                cursor.execute(newquery)
-            else:
-                cursor.execute(newquery, bindata)
-
-            # create our cursor instance
-            dbcursor = DBCursor(cursor, self.db)
-
-            if self._reInsert.match(newquery):
-                # if this is an insert query try to get the last insert id:
-                # this needs a separate query in postgresql: it can be done in a single query
-                # adding 'RETURNING id' to the INSERT statement but then we would have added
-                # a constraint on the name of the PRIMARY KEY for each table
-                try:
-                    cursor = self.db.cursor()
-                    cursor.execute("SELECT LASTVAL();")
-                    dbcursor.lastrowid = cursor.fetchone()[0]
-                    dbcursor._cursor.lastrowid = dbcursor.lastrowid
-                    cursor.close()
-                except Exception, e:
-                    # can't recover in any case
-                    pass
-
-        finally:
-            self._lock.release()
+        # create our cursor instance
+        dbcursor = DBCursor(cursor, db)
+
+        if self._reInsert.match(newquery):
+            # if this is an insert query try to get the last insert id:
+            # this needs a separate query in postgresql: it can be done in a single query
+            # adding 'RETURNING id' to the INSERT statement but then we would have added
+            # a constraint on the name of the PRIMARY KEY for each table
+            try:
+                cursor = db.cursor()
+                cursor.execute("SELECT LASTVAL();")
+                dbcursor.lastrowid = cursor.fetchone()[0]
+                dbcursor._cursor.lastrowid = dbcursor.lastrowid
+                cursor.close()
+            except Exception, e:
+                # can't recover in any case
+                pass
 
         return dbcursor
 
@@ -23,14 +23,34 @@
 # ################################################################### #
 
 import b3
+import b3.cron
 import os
+import re
 
 from b3.storage.common import DatabaseStorage
 
 
 class SqliteStorage(DatabaseStorage):
 
+    _reRead = re.compile(r'''^\s*SELECT''', re.IGNORECASE)
+
     protocol = 'sqlite'
+    placeholder = '?'
+    statementCacheSize = 200        # prepared statements kept by each connection (LRU keyed by query text)
+
+    tuned = False                   # tune the database for a single box deployment (see tuningPragmas)
+    tuningPragmas = (
+        ('synchronous', 'NORMAL'),  # in WAL mode commits don't wait for the disk: checkpoints do
+        ('mmap_size', 268435456),   # read the database file through 256MB of memory-mapped I/O
+        ('cache_size', -65536),     # keep up to 64MB of database pages in memory (negative values are KiB)
+        ('temp_store', 'MEMORY'),   # build temporary indexes and tables in memory
+    )
+    vacuumPages = 1000              # free pages given back to the filesystem by each maintenance run
+    tuningIndexes = (               # client_id indexes of b3.sql: created on older databases when tuned
+        "CREATE INDEX IF NOT EXISTS `aliases_client_id` ON `aliases` (`client_id`)",
+        "CREATE INDEX IF NOT EXISTS `ipaliases_client_id` ON `ipaliases` (`client_id`)",
+        "CREATE INDEX IF NOT EXISTS `penalties_client_id` ON `penalties` (`client_id`)",
+    )
 
     def __init__(self, dsn, dsnDict, console):
         """
@@ -54,12 +74,10 @@ class SqliteStorage(DatabaseStorage):
         :return The connection instance if established successfully, otherwise None.
         """
         try:
-            import sqlite3
             path = b3.getWritableFilePath(self.dsn[9:])
             self.console.bot("Using database file: %s" % path)
             is_new_database = not os.path.isfile(path)
-            self.db = sqlite3.connect(path, check_same_thread=False)
-            self.db.isolation_level = None  # set autocommit mode
+            self.db = self._newConnection()
         except Exception, e:
             self.db = None
             self.console.error('Database connection failed: %s', e)
@@ -67,10 +85,22 @@ class SqliteStorage(DatabaseStorage):
                 self.console.screen.write('Connecting to DB : FAILED\n')
                 self._consoleNotice = False
         else:
+            if self.tuned and path != ':memory:':
+                if is_new_database:
+                    # must be set before creating the tables: allows the maintenance to shrink the database file
+                    self.query("PRAGMA auto_vacuum=INCREMENTAL")
+                cursor = self.query("PRAGMA journal_mode=WAL")
+                if cursor.getValue('journal_mode') != 'wal':
+                    self.console.warning('Could not enable the SQLite WAL journal mode')
+                cursor.close()
+
             # import SQL script if necessary
             if path == ':memory:' or is_new_database:
                 self.console.info("Importing SQL file: %s..." % b3.getAbsolutePath("@b3/sql/sqlite/b3.sql"))
                 self.queryFromFile("@b3/sql/sqlite/b3.sql")
+            elif self.tuned:
+                for query in self.tuningIndexes:
+                    self.query(query)
 
             if self._consoleNotice:
                 self.console.screen.write('Connecting to DB : OK\n')
@@ -78,6 +108,82 @@ class SqliteStorage(DatabaseStorage):
         finally:
             return self.db
 
+    def _newConnection(self):
+        """
+        Open a new connection with the storage layer.
+        :raise Exception: If the connection cannot be established.
+        """
+        import sqlite3
+        db = sqlite3.connect(b3.getWritableFilePath(self.dsn[9:]), check_same_thread=False,
+                             cached_statements=self.statementCacheSize)
+        db.isolation_level = None  # set autocommit mode
+        if self.tuned:
+            for name, value in self.tuningPragmas:
+                db.execute("PRAGMA %s=%s" % (name, value))
+        return db
+
+    def startPool(self, maxsize):
+        """
+        Run the SELECT queries on a pool of connections: SQLite allows a single writer, but in WAL journal mode
+        readers don't block the writer and are not blocked by it. The journal mode is stored in the database file, so
+        it's not switched here: the pool is used only if the database is already in WAL mode (see 'tuned').
+        :param maxsize: Max number of pooled connections.
+        """
+        if maxsize <= 1 or self._pool is not None:
+            return
+        if self.dsn[9:] == ':memory:':
+            self.console.debug('Not using a connection pool with an in-memory SQLite database')
+            return
+        cursor = self.query("PRAGMA journal_mode")
+        journal_mode = cursor.getValue('journal_mode')
+        cursor.close()
+        if journal_mode != 'wal':
+            self.console.warning('SQLite database not in WAL journal mode (see storage_sqlite_tuning): '
+                                 'not using a connection pool')
+            return
+        super(SqliteStorage, self).startPool(maxsize)
+
+    def _pooled(self, query):
+        """
+        Tell whether the given query can run on a pooled connection (internal method).
+        Only read queries are pooled: writes go through the main connection, one at a time.
+        """
+        return self._reRead.match(query) is not None
+
+    def startMaintenance(self, minute=30, hour=4):
+        """
+        Schedule the daily database maintenance (see maintenance()).
+        :param minute: The minute of the maintenance run.
+        :param hour: The hour of the maintenance run.
+        :return: The id of the maintenance crontab.
+        """
+        return self.console.cron.add(b3.cron.CronTab(self.maintenance, 0, minute, hour))
+
+    def maintenance(self):
+        """
+        Refresh the statistics used by the query planner and give the free pages back to the filesystem
+        (this requires the database to have been created in tuned mode, with incremental auto vacuum).
+        """
+        self.console.debug('Running SQLite database maintenance')
+        self.query("ANALYZE")
+        cursor = self.query("PRAGMA auto_vacuum")
+        auto_vacuum = int(cursor.getValue('auto_vacuum', 0))
+        cursor.close()
+        if auto_vacuum != 2:
+            return
+
+        self._lock.acquire()
+        try:
+            cursor = self.db.cursor()
+            try:
+                # the pragma frees one page per step: fetch all of them
+                cursor.execute("PRAGMA incremental_vacuum(%d)" % self.vacuumPages)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            self._lock.release()
+
     def getConnection(self):
         """
         Return the database connection. If the connection has not been established yet, will establish a new one.
@@ -125,17 +231,18 @@ class SqliteStorage(DatabaseStorage):
         :raise KeyError: If the table is not present in the database
         """
         current_tables = self.getTables()
-        if isinstance(table, tuple) or isinstance(table, list):
-            for v in table:
-                if not v in current_tables:
-                    raise KeyError("could not find table '%s' in the database" % v)
-                self.query("DELETE FROM %s;" % v)
-                self.query("DELETE FROM sqlite_sequence WHERE name='%s';" % v)
-        else:
-            if not table in current_tables:
-                 raise KeyError("could not find table '%s' in the database" % table)
-            self.query("DELETE FROM %s;" % table)
-            self.query("DELETE FROM sqlite_sequence WHERE name='%s';" % table)
+        if not isinstance(table, tuple) and not isinstance(table, list):
+            table = [table]
+
+        queries = []
+        for v in table:
+            if not v in current_tables:
+                raise KeyError("could not find table '%s' in the database" % v)
+            queries.append(("DELETE FROM %s;" % v, ()))
+            queries.append(("DELETE FROM sqlite_sequence WHERE name=?;", (v,)))
+
+        # a single transaction: the database file is synced once
+        self.queryBatch(queries)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import Queue
+import threading
+
+
+class WriteFuture(object):
+    """
+    Result of a write query handed to the storage write queue.
+    """
+    def __init__(self):
+        """
+        Object constructor.
+        """
+        self._event = threading.Event()
+        self._cursor = None
+        self._exception = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        """
+        Return True if the query has been executed (successfully or not).
+        """
+        return self._event.isSet()
+
+    def result(self, timeout=None):
+        """
+        Wait for the query to be executed and return its cursor (already closed: only lastrowid and rowcount are
+        meaningful).
+        :param timeout: The maximum amount of seconds to wait, None to wait forever.
+        :raise RuntimeError: If the query has not been executed within the given timeout.
+        :raise Exception: The exception raised by the query execution.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError('write query not executed within %s seconds' % timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._cursor
+
+    def exception(self, timeout=None):
+        """
+        Wait for the query to be executed and return the exception it raised (None if it succeeded).
+        :param timeout: The maximum amount of seconds to wait, None to wait forever.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError('write query not executed within %s seconds' % timeout)
+        return self._exception
+
+    def addCallback(self, callback):
+        """
+        Register a function to be called with this future once the query has been executed.
+        Callbacks run in the storage writer thread (or right away if the query has already been executed).
+        """
+        with self._lock:
+            if not self._event.isSet():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def setResult(self, cursor):
+        """
+        Mark the query as executed successfully.
+        """
+        self._cursor = cursor
+        self._finish()
+
+    def setException(self, exception):
+        """
+        Mark the query as failed.
+        """
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class WriteQueue(object):
+    """
+    Write-behind queue executing the storage write queries in a dedicated thread.
+    Queries waiting in the queue when the writer wakes up are applied in a single transaction.
+    """
+    maxBatch = 100  # max number of queries applied in a single transaction
+
+    def __init__(self, storage, maxsize=1000):
+        """
+        Object constructor.
+        :param storage: The DatabaseStorage instance executing the queries.
+        :param maxsize: Max number of queries waiting in the queue: producers block once it's full.
+        """
+        self.storage = storage
+        self.console = storage.console
+        self._queue = Queue.Queue(maxsize)
+        self._thread = None
+
+    def start(self):
+        """
+        Start the writer thread.
+        """
+        self._thread = threading.Thread(target=self._run, name='b3-storage-writer')
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the writer thread once all the queries already in the queue have been executed.
+        :param timeout: The maximum amount of seconds to wait for the queue to be drained, None to wait forever.
+        :return: True if the queue has been drained, False otherwise.
+        """
+        if not self.isAlive():
+            return True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.isAlive():
+            return False
+        # write whatever got queued while the writer thread was stopping
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Queue.Empty:
+                return True
+            if item is not None:
+                self._write([item])
+
+    def isAlive(self):
+        """
+        Return True if the writer thread is running.
+        """
+        return self._thread is not None and self._thread.isAlive()
+
+    def qsize(self):
+        """
+        Return the number of queries waiting in the queue.
+        """
+        return self._queue.qsize()
+
+    def put(self, query, bindata=None):
+        """
+        Queue a write query (blocks while the queue is full).
+        :param query: The query to execute.
+        :param bindata: Data to bind to the given query.
+        :return: A WriteFuture resolved once the query has been executed.
+        """
+        future = WriteFuture()
+        self._queue.put((query, bindata, future))
+        return future
+
+    def _run(self):
+        """
+        Writer thread main loop.
+        """
+        self.console.info('Storage writer started')
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.maxBatch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Queue.Empty:
+                    break
+            if None in batch:
+                # sentinel queued by stop(): it comes after all the queries queued before it
+                batch = batch[:batch.index(None)]
+                running = False
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception, e:
+                    self.console.error('Storage writer failure: %s', e)
+                    for query, bindata, future in batch:
+                        if not future.done():
+                            future.setException(e)
+        self.console.info('Storage writer ended')
+
+    def _write(self, batch):
+        """
+        Execute a batch of queued queries in a single transaction.
+        A failing query is reported through its future and does not prevent the others from being applied: each query
+        runs within a savepoint which is rolled back if the query fails (PostgreSQL would otherwise abort the whole
+        transaction). Futures are resolved only once the transaction has been committed.
+        :param batch: A list of (query, bindata, future) tuples.
+        """
+        storage = self.storage
+        if not storage.getConnection():
+            raise Exception('lost connection with the storage layer during query')
+
+        results = []
+        with storage._lock:
+            transaction = len(batch) > 1
+            if transaction:
+                storage._execute('BEGIN').close()
+            try:
+                for query, bindata, future in batch:
+                    if transaction:
+                        storage._execute('SAVEPOINT b3_write').close()
+                    try:
+                        cursor = storage._execute(query, bindata)
+                        cursor.close()
+                    except Exception, e:
+                        self.console.error('Query failed [%s] %r: %s', query, bindata, e)
+                        if transaction:
+                            storage._execute('ROLLBACK TO SAVEPOINT b3_write').close()
+                        results.append((future, None, e))
+                    else:
+                        results.append((future, cursor, None))
+                    if transaction:
+                        storage._execute('RELEASE SAVEPOINT b3_write').close()
+                if transaction:
+                    storage._execute('COMMIT').close()
+            except Exception:
+                if transaction:
+                    try:
+                        storage._execute('ROLLBACK').close()
+                    except Exception:
+                        pass
+                raise
+
+        for future, cursor, exception in results:
+            try:
+                if exception is None:
+                    future.setResult(cursor)
+                else:
+                    future.setException(exception)
+            except Exception, e:
+                self.console.error('Storage writer callback failure: %s', e)
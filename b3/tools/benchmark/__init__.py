@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import sys
+import time
+
+
+def timeit(func, iterations=1, *args, **kwargs):
+    """
+    Run the given function and return the elapsed time (in seconds).
+    :param func: The function to be run
+    :param iterations: The number of times the function must be run
+    """
+    clock = time.clock if sys.platform == 'win32' else time.time
+    start = clock()
+    for _ in xrange(iterations):
+        func(*args, **kwargs)
+    return clock() - start
+
+
+def report(title, count, elapsed, unit='ops'):
+    """
+    Print a benchmark result line.
+    :param title: The benchmark title
+    :param count: The number of operations performed
+    :param elapsed: The time needed to perform the operations (in seconds)
+    :param unit: The unit of the operations performed
+    """
+    rate = count / elapsed if elapsed > 0 else float('inf')
+    print('%-45s %10d %s in %8.3fs : %12.1f %s/sec' % (title, count, unit, elapsed, rate, unit))
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+"""
+Measure the online clients lookup rate under constant join/leave churn.
+
+USAGE:
+    python -m b3.tools.benchmark.clients [<number of lookups>]
+
+64 clients are kept online while, every 10 lookups, one of them disconnects and a new one connects in the same slot.
+Lookups by name, exact name, GUID, truncated GUID (matched using fuzzy GUID matching) and partial name (as done by
+getByMagic when an admin command targets a player) are measured against the legacy implementation, which dropped its
+indexes on every connect/disconnect and fell back to linear scans.
+"""
+
+import random
+import re
+import sys
+
+from b3 import functions
+from b3.clients import Client
+from b3.clients import Clients
+from b3.tools.benchmark import report
+from b3.tools.benchmark import timeit
+
+SLOTS = 64
+
+
+class BenchmarkConsole(object):
+
+    clients = None
+
+    def time(self):
+        return 0
+
+    def stripColors(self, text):
+        return re.sub(r'\^[0-9a-z]', '', text)
+
+    def debug(self, msg, *args, **kwargs):
+        pass
+
+    def verbose(self, msg, *args, **kwargs):
+        pass
+
+
+class LegacyClients(Clients):
+    """
+    Online clients registry the way it used to be.
+    """
+
+    def __setitem__(self, cid, client):
+        dict.__setitem__(self, cid, client)
+        self.legacyResetIndex()
+
+    def __delitem__(self, cid):
+        dict.__delitem__(self, cid)
+        self.legacyResetIndex()
+
+    def legacyResetIndex(self):
+        self._nameIndex = {}
+        self._guidIndex = {}
+        self._exactNameIndex = {}
+
+    def getByName(self, name):
+        name = name.lower()
+        try:
+            return self[self._nameIndex[name]]
+        except Exception:
+            for cid, c in self.items():
+                if c.name and c.name.lower() == name:
+                    self._nameIndex[name] = c.cid
+                    return c
+        return None
+
+    def getByExactName(self, name):
+        name = name.lower() + '^7'
+        try:
+            return self[self._exactNameIndex[name]]
+        except Exception:
+            for cid, c in self.items():
+                if c.exactName and c.exactName.lower() == name:
+                    self._exactNameIndex[name] = c.cid
+                    return c
+        return None
+
+    def getClientsByName(self, name):
+        clist = []
+        needle = re.sub(r'\s', '', name.lower())
+        for cid, c in self.items():
+            cleanname = re.sub(r'\s', '', c.name.lower())
+            if not c.hide and needle in cleanname:
+                clist.append(c)
+        return clist
+
+    def getByGUID(self, guid):
+        guid = guid.upper()
+        try:
+            return self[self._guidIndex[guid]]
+        except Exception:
+            for cid, c in self.items():
+                if c.guid and c.guid == guid:
+                    self._guidIndex[guid] = c.cid
+                    return c
+                elif functions.fuzzyGuidMatch(c.guid, guid):
+                    return c
+        return None
+
+
+def make_guid(rnd):
+    return ''.join(rnd.choice('0123456789ABCDEF') for _ in xrange(32))
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 20000
+    rnd = random.Random(0)
+    # pre-generate the clients joining the server so that the benchmark measures only the registry
+    players = [('Player%d' % i, make_guid(rnd)) for i in xrange(SLOTS + count // 10 + 1)]
+
+    def run(title, cls, lookup, count):
+        console = BenchmarkConsole()
+        clients = console.clients = cls(console)
+        for i in xrange(SLOTS):
+            name, guid = players[i]
+            clients[str(i)] = Client(console=console, cid=str(i), name=name, guid=guid)
+
+        def churn():
+            joined = SLOTS
+            for n in xrange(count):
+                if n % 10 == 0:
+                    cid = str(n % SLOTS)
+                    del clients[cid]
+                    name, guid = players[joined]
+                    clients[cid] = Client(console=console, cid=cid, name=name, guid=guid)
+                    joined += 1
+                lookup(clients, players[joined - 1 - n % SLOTS])
+
+        report(title, count, timeit(churn), 'lookups')
+
+    # legacy fuzzy GUID matching computes a levenshtein distance against every online client: run fewer lookups
+    tests = [
+        ('getByName', lambda clients, (name, guid): clients.getByName(name), count),
+        ('getByExactName', lambda clients, (name, guid): clients.getByExactName(name), count),
+        ('getByGUID', lambda clients, (name, guid): clients.getByGUID(guid), count),
+        ('getClientsByName', lambda clients, (name, guid): clients.getClientsByName(name[2:]), count),
+        ('getByGUID (truncated)', lambda clients, (name, guid): clients.getByGUID(guid[:-1]), max(count // 100, 10)),
+    ]
+
+    for title, lookup, n in tests:
+        run('legacy %s' % title, LegacyClients, lookup, n)
+        run(title, Clients, lookup, n)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
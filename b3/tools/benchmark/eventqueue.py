@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+"""
+Measure the number of events per second the parser thread can queue.
+
+USAGE:
+    python -m b3.tools.benchmark.eventqueue [<number of events>]
+
+A synthetic log of kill events is queued while a consumer thread handles them: the legacy queueing (1ms sleep
+before every put) is measured against the FIFO event queue, queueing events one by one and in batches of 100
+(the way events produced by a single read of the game log are queued in batch read mode).
+"""
+
+import Queue
+import sys
+import thread
+import threading
+import time
+
+from b3.events import Event
+from b3.events import EventQueue
+from b3.parser import Parser
+from b3.tools.benchmark import report
+from b3.tools.benchmark import timeit
+
+
+class BenchmarkParser(Parser):
+
+    def __init__(self):
+        # skip parent class constructor
+        self._handlers = {1: []}
+        self.queue = EventQueue(50)
+
+    def getEventName(self, key):
+        return 'EVT_CLIENT_KILL'
+
+    def verbose(self, msg, *args, **kwargs):
+        pass
+
+    def legacyQueueEvent(self, event, expire=10):
+        """
+        Queue an event the way the parser used to.
+        """
+        if not hasattr(event, 'type'):
+            return False
+        elif event.type in self._handlers:
+            self.verbose('Queueing event %s : %s', self.getEventName(event.type), event.data)
+            try:
+                time.sleep(0.001)
+                self.queue.put((self.time(), self.time() + expire, event), True, 2)
+                return True
+            except Queue.Full:
+                return False
+        return False
+
+
+def consume(queue, count):
+    for _ in xrange(count):
+        queue.get(True)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 5000
+    events = [Event(1, (100, 'UT_MOD_LR300', 'body')) for _ in xrange(count)]
+
+    def run(title, produce):
+        parser = BenchmarkParser()
+        consumer = threading.Thread(target=consume, args=(parser.queue, count))
+        consumer.start()
+        elapsed = timeit(produce, 1, parser)
+        consumer.join()
+        report(title, count, elapsed, 'events')
+
+    def legacy(parser):
+        for event in events:
+            parser.legacyQueueEvent(event)
+
+    def fifo(parser):
+        for event in events:
+            parser.queueEvent(event)
+
+    def batched(parser):
+        parser._eventsBufferThread = thread.get_ident()
+        for i in xrange(0, count, 100):
+            parser._eventsBuffer = []
+            for event in events[i:i + 100]:
+                parser.queueEvent(event)
+            parser.flushEvents()
+
+    run('legacy queueEvent (1ms sleep)', legacy)
+    run('queueEvent', fifo)
+    run('queueEvent (batches of 100 events)', batched)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
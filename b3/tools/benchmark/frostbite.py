@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+"""
+Measure the Frostbite packet framing: encoding packets and cutting a TCP stream into decoded packets.
+
+USAGE:
+    python -m b3.tools.benchmark.frostbite [<number of players>]
+
+The stream is made of a large listPlayers response (the kind of reply spanning many reads) surrounded by small
+events, and is fed 8192 bytes at a time the way the asyncore dispatcher receives it. The current PacketBuffer is
+measured against the legacy string buffer sliced after every packet.
+"""
+
+import sys
+
+from struct import pack
+from struct import unpack
+from b3.parsers.frostbite.framing import PacketBuffer
+from b3.parsers.frostbite.framing import decodePacket
+from b3.parsers.frostbite.framing import encodePacket
+from b3.tools.benchmark import report
+from b3.tools.benchmark import timeit
+
+
+def legacy_encode(isFromServer, isResponse, sequence, words):
+    header = sequence & 0x3fffffff
+    if isFromServer:
+        header += 0x80000000
+    if isResponse:
+        header += 0x40000000
+    size = 0
+    encoded = ''
+    for word in words:
+        word = str(word)
+        encoded += pack('<I', len(word))
+        encoded += word
+        encoded += '\x00'
+        size += len(word) + 5
+    return pack('<I', header) + pack('<I', size + 12) + pack('<I', len(words)) + encoded
+
+
+def legacy_decode(data):
+    [header] = unpack('<I', data[0:4])
+    size = unpack('<I', data[4:8])[0] - 12
+    data = data[12:]
+    words = []
+    offset = 0
+    while offset < size:
+        length = unpack('<I', data[offset:offset + 4])[0]
+        words.append(data[offset + 4:offset + 4 + length])
+        offset += length + 5
+    return [header & 0x80000000, header & 0x40000000, header & 0x3fffffff, words]
+
+
+def legacy_frame(chunks):
+    buf = ''
+    packets = 0
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= 8 and len(buf) >= unpack('<I', buf[4:8])[0]:
+            size = unpack('<I', buf[4:8])[0]
+            legacy_decode(buf[0:size])
+            buf = buf[size:len(buf)]
+            packets += 1
+    return packets
+
+
+def current_frame(chunks):
+    buf = PacketBuffer()
+    packets = 0
+    for chunk in chunks:
+        buf.feed(chunk)
+        while buf.decodePacket():
+            packets += 1
+    return packets
+
+
+def main(argv):
+    players = int(argv[1]) if len(argv) > 1 else 2000
+    fields = ['name', 'guid', 'teamId', 'squadId', 'kills', 'deaths', 'score', 'rank', 'ping']
+    words = ['OK', len(fields)] + fields + [players]
+    for i in xrange(players):
+        words += ['Player%d' % i, 'EA_%032X' % i, 1 + i % 2, i % 8, i, i, 10 * i, i % 100, 50]
+
+    events = [encodePacket(True, False, i, ['player.onKill', 'Player%d' % i, 'Player%d' % (i + 1), 'M16A4', 'false'])
+              for i in xrange(100)]
+    stream = ''.join(events[:50]) + encodePacket(False, True, 1, words) + ''.join(events[50:])
+    chunks = [stream[i:i + 8192] for i in xrange(0, len(stream), 8192)]
+
+    assert legacy_encode(False, True, 1, words) == encodePacket(False, True, 1, words)
+    assert legacy_decode(stream[:len(events[0])]) == decodePacket(events[0])
+    assert legacy_frame(chunks) == current_frame(chunks) == 101
+
+    count = 20
+    report('frostbite legacy encode (%d words)' % len(words), count,
+           timeit(legacy_encode, count, False, True, 1, words), 'packets')
+    report('frostbite current encode (%d words)' % len(words), count,
+           timeit(encodePacket, count, False, True, 1, words), 'packets')
+    report('frostbite legacy framing (%d bytes)' % len(stream), count,
+           timeit(legacy_frame, count, chunks), 'streams')
+    report('frostbite current framing (%d bytes)' % len(stream), count,
+           timeit(current_frame, count, chunks), 'streams')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
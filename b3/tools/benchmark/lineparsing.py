@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+"""
+Measure the number of log lines per second the q3a parsers can dispatch.
+
+USAGE:
+    python -m b3.tools.benchmark.lineparsing [<game log>] [<parser name>]
+
+When no game log is given, a synthetic Urban Terror 4.3 log (made mostly of kill and hit lines) is used.
+The legacy dispatch (every line format tried with re.match, handler name built with string.capwords
+and looked up with hasattr/getattr) is measured against the precompiled dispatch tables.
+"""
+
+import random
+import re
+import string
+import sys
+
+from b3.tools.benchmark import report
+from b3.tools.benchmark import timeit
+
+
+def getParserClass(name):
+    """
+    Return the parser class given its name.
+    :param name: The parser name (i.e: iourt43)
+    """
+    module = __import__('b3.parsers.%s' % name, globals(), locals(), ['%sParser' % name.title()])
+    return getattr(module, '%sParser' % name.title())
+
+
+def generateLog(count=100000):
+    """
+    Generate a synthetic UrT 4.3 game log.
+    :param count: The number of lines to generate
+    """
+    lines = []
+    for i in xrange(count):
+        minutes, seconds = divmod(i / 10, 60)
+        cid, acid = random.sample(xrange(64), 2)
+        r = random.random()
+        if r < 0.55:
+            line = 'Hit: %s %s %s %s: Player%s hit Player%s in the Torso' % (cid, acid, random.randint(0, 5),
+                                                                             random.randint(1, 30), acid, cid)
+        elif r < 0.85:
+            line = 'Kill: %s %s %s: Player%s killed Player%s by UT_MOD_LR300' % (acid, cid, random.randint(1, 40),
+                                                                                 acid, cid)
+        elif r < 0.93:
+            line = 'say: %s Player%s: gg' % (cid, cid)
+        elif r < 0.97:
+            line = 'Item: %s ut_weapon_ump45' % cid
+        else:
+            line = 'Flag Return: RED'
+        lines.append('%3d:%02d %s' % (minutes, seconds, line))
+    return lines
+
+
+def legacyDispatch(parser, line):
+    """
+    Dispatch a log line the way q3a parsers used to.
+    """
+    line = re.sub(parser._lineClear, '', line, 1)
+    m = None
+    for f in parser._lineFormats:
+        m = re.match(f, line)
+        if m:
+            break
+    if m:
+        func = 'On%s' % string.capwords(m.group('action').lower()).replace(' ', '')
+        if hasattr(parser, func):
+            return getattr(parser, func)
+    return None
+
+
+def precompiledDispatch(parser, line):
+    """
+    Dispatch a log line using the precompiled dispatch tables.
+    """
+    line = parser._lineClear.sub('', line, 1)
+    m = parser.matchLine(line)
+    if m:
+        return parser.getLineHandler(m.group('action').lower())
+    return None
+
+
+def main(argv):
+    parser_name = argv[2] if len(argv) > 2 else 'iourt43'
+    if len(argv) > 1:
+        with open(argv[1], 'r') as f:
+            lines = f.read().splitlines()
+    else:
+        lines = generateLog()
+
+    # we only need the line formats and the event handlers: skip the parser initialization
+    cls = getParserClass(parser_name)
+    parser = cls.__new__(cls)
+
+    for title, dispatch in (('legacy dispatch (%s)' % parser_name, legacyDispatch),
+                            ('precompiled dispatch (%s)' % parser_name, precompiledDispatch)):
+        elapsed = timeit(lambda: [dispatch(parser, x) for x in lines])
+        report(title, len(lines), elapsed, 'lines')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+"""
+Measure the latency and the throughput of the q3a RCON client against a local fake game server.
+
+USAGE:
+    python -m b3.tools.benchmark.rcon [<number of commands>]
+
+The fake server answers 'status' with a 3 packets reply and every other command with a single packet, the way
+ioquake3 does. The current client is measured against the legacy behavior: waiting for a full socket timeout of
+silence to consider a reply complete, and waiting for the reply of the commands sent through writelines().
+"""
+
+import socket
+import sys
+import threading
+import time
+
+from b3.parsers.q3a.rcon import Rcon
+from b3.tools.benchmark import report
+from b3.tools.benchmark import timeit
+from b3.tools.benchmark.storage import BenchmarkConsole
+
+STATUS = ['map: ut4_turnpike\nnum score ping name            lastmsg address               qport rate\n'
+          '--- ----- ---- --------------- ------- --------------------- ----- -----\n'] + \
+         [''.join('%3d %5d %4d Player%-8d %7d 10.0.0.%d:27960 %5d 25000\n' % (i, i, 50, i, 0, i, i)
+                  for i in xrange(start, start + 10)) for start in (0, 10)]
+
+
+class BenchmarkRconConsole(BenchmarkConsole):
+
+    gameName = 'q3a'
+
+
+class FakeServer(object):
+    """
+    Reply to the RCON commands like a q3a game server.
+    """
+    def __init__(self):
+        self.socket = socket.socket(type=socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.host = self.socket.getsockname()
+        self.received = 0
+
+    def start(self):
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        while True:
+            data, address = self.socket.recvfrom(4096)
+            self.received += 1
+            command = data[4:].strip().split(' ', 2)[-1]
+            packets = STATUS if command == 'status' else ['broadcast: %s\n' % command]
+            for packet in packets:
+                self.socket.sendto('\377\377\377\377print\n' + packet, address)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 10
+    server = FakeServer()
+    server.start()
+    rcon = Rcon(BenchmarkRconConsole(), server.host, 'password')
+
+    def status():
+        for _ in xrange(count):
+            assert 'Player19' in rcon.write('status')
+
+    def writelines(legacy):
+        def run():
+            expected = server.received + count
+            if legacy:
+                for i in xrange(count):
+                    with rcon.lock:
+                        rcon.sendRcon('say %d' % i, maxRetries=1)
+            else:
+                rcon.writelines(['say %d' % i for i in xrange(count)])
+            while server.received < expected:
+                time.sleep(0.001)
+        return run
+
+    def mixed(legacy):
+        def run():
+            sender = threading.Thread(target=writelines(legacy))
+            sender.start()
+            status()
+            sender.join()
+        return run
+
+    for legacy in (True, False):
+        if legacy:
+            title = 'legacy'
+            rcon.reply_gap = rcon.rate_interval = None
+        else:
+            title = 'current'
+            rcon.reply_gap = Rcon.reply_gap
+            rcon.rate_interval = Rcon.rate_interval
+        report('rcon %s status' % title, count, timeit(status), 'calls')
+        report('rcon %s writelines' % title, count, timeit(writelines(legacy)), 'commands')
+        report('rcon %s status + writelines' % title, 2 * count, timeit(mixed(legacy)), 'commands')
+
+    rcon.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+"""
+Compare the default SQLite storage settings with the tuned profile (storage_sqlite_tuning).
+
+USAGE:
+    python -m b3.tools.benchmark.sqlite [<number of calls>] [<number of penalties and aliases>]
+
+Two databases are created (one per profile) from the b3.sql schema and filled with the same amount of penalties and
+aliases (1M by default, spread over one client every 10 rows). The most frequent storage writes (alias and penalty
+inserts, each one committed on its own) and reads are then measured on both of them, as well as the daily maintenance
+of the tuned database.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from b3 import functions
+from b3.clients import Alias
+from b3.clients import Client
+from b3.clients import ClientWarning
+from b3.storage.sqlite import SqliteStorage
+from b3.tools.benchmark import report
+from b3.tools.benchmark import timeit
+from b3.tools.benchmark.storage import BenchmarkConsole
+
+ROWS_PER_CLIENT = 10
+
+
+def populate(storage, rows):
+    """
+    Fill the storage with clients having ROWS_PER_CLIENT penalties and aliases each.
+    """
+    clients = max(1, rows // ROWS_PER_CLIENT)
+    db = storage.db
+    db.execute('BEGIN')
+    db.executemany('INSERT INTO clients (guid, name, ip, connections, time_add, time_edit) VALUES (?, ?, ?, 1, 0, 0)',
+                   (('%032x' % i, 'Player%d' % i, '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255))
+                    for i in xrange(1, clients + 1)))
+    db.executemany('INSERT INTO penalties (type, client_id, reason, keyword, time_add, time_edit, time_expire) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (('Warning' if i % 4 else 'Kick', i % clients + 1, '^7warned', 'spam', i, i, -1)
+                    for i in xrange(rows)))
+    db.executemany('INSERT INTO aliases (alias, client_id, num_used, time_add, time_edit) VALUES (?, ?, 1, ?, ?)',
+                   (('Alias%d' % i, i % clients + 1, i, i) for i in xrange(rows)))
+    db.execute('COMMIT')
+    return clients
+
+
+def run(tuned, tmpdir, count, rows):
+    """
+    Run the benchmark on a new database created with the given profile.
+    """
+    profile = 'tuned' if tuned else 'default'
+    dsn = 'sqlite://%s' % os.path.join(tmpdir, '%s.db' % profile)
+    storage = SqliteStorage(dsn, functions.splitDSN(dsn), BenchmarkConsole())
+    storage.tuned = tuned
+    try:
+        storage.connect()
+        report('sqlite %s populate' % profile, 2 * rows, timeit(populate, 1, storage, rows), 'rows')
+        clients = rows // ROWS_PER_CLIENT
+        randomize = random.Random(0)
+        ids = [randomize.randint(1, clients) for _ in xrange(count)]
+
+        def add_aliases():
+            for i, cid in enumerate(ids):
+                storage.setClientAlias(Alias(alias='New%d' % i, clientId=cid, numUsed=1, timeAdd=0, timeEdit=0))
+
+        def add_warnings():
+            for cid in ids:
+                storage.setClientPenalty(ClientWarning(clientId=cid, adminId=0, duration=0, reason='^7warned',
+                                                       keyword='spam', data='', timeAdd=0, timeEdit=0, timeExpire=-1))
+
+        def get_aliases():
+            for cid in ids:
+                storage.getClientAliases(Client(id=cid))
+
+        def get_warnings():
+            for cid in ids:
+                storage.getClientPenalties(Client(id=cid), type='Warning')
+
+        tests = [
+            ('setClientAlias', add_aliases),
+            ('setClientPenalty', add_warnings),
+            ('getClientAliases', get_aliases),
+            ('getClientPenalties', get_warnings),
+        ]
+
+        for title, call in tests:
+            report('sqlite %s %s' % (profile, title), count, timeit(call), 'calls')
+
+        if tuned:
+            report('sqlite %s maintenance' % profile, 1, timeit(storage.maintenance), 'runs')
+    finally:
+        storage.shutdown()
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 2000
+    rows = int(argv[2]) if len(argv) > 2 else 1000000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for tuned in (False, True):
+            run(tuned, tmpdir, count, rows)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
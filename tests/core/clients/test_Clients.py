@@ -23,8 +23,9 @@
 # ################################################################### #
 
 import b3
+import sqlite3
 
-from b3.clients import Clients, Client
+from b3.clients import Clients, Client, ClientBan
 from tests import B3TestCase
 from mock import Mock, patch
 
@@ -109,3 +110,144 @@ class TestClients(B3TestCase):
 
         # verify that an proper event was fired
         Event_mock.assert_called_once_with(b3.events.EVT_CLIENT_DISCONNECT, 1, joe, None)
+
+
+    def test_authorize(self):
+        # GIVEN
+        joe = self.clients[1]
+        ClientBan(clientId=joe.id, adminId=0, timeExpire=-1, reason='cheating').save(self.console)
+        joe_again = Client(console=self.console, cid=3, name='joe', guid='joe_guid')
+        bill = Client(console=self.console, cid=4, name='bill', guid='bill_guid')
+        # WHEN
+        with patch.object(self.console.storage, 'query', wraps=self.console.storage.query) as query_mock:
+            with patch.object(Client, 'reBan') as reBan_mock:
+                self.clients.authorize([joe_again, bill])
+        # THEN clients and penalties were loaded with one query each (the third query inserts the new client)
+        self.assertEqual(3, query_mock.call_count)
+        self.assertEqual(joe.id, joe_again.id)
+        self.assertEqual(2, joe_again.connections)
+        self.assertEqual(2, self.console.storage.getClient(Client(guid='joe_guid')).connections)
+        self.assertTrue(bill.id)
+        self.assertEqual(1, bill.connections)
+        self.assertTrue(bill.authed)
+        self.assertFalse(bill.authorizing)
+        self.assertEqual(1, reBan_mock.call_count)
+
+    def test_authorize_non_ascii_name(self):
+        # GIVEN two returning players, one of them having an accented name (read as bytes from the game log)
+        rene_id = self.console.storage.setClient(Client(name='rene', guid='rene_guid'))
+        joe_again = Client(console=self.console, cid=3, name='joe', guid='joe_guid')
+        rene = Client(console=self.console, cid=4, name='Ren\xe9', guid='rene_guid')
+        # WHEN
+        with patch.object(self.console.storage, 'setClient', wraps=self.console.storage.setClient) as setClient_mock:
+            self.clients.authorize([joe_again, rene])
+        # THEN both clients were saved at once (SQLite < 3.24 has no upsert: they are saved one by one)
+        if sqlite3.sqlite_version_info >= (3, 24, 0):
+            self.assertEqual(0, setClient_mock.call_count)
+        self.assertTrue(joe_again.authed)
+        self.assertTrue(rene.authed)
+        self.assertEqual(rene_id, rene.id)
+        stored = self.console.storage.getClient(Client(guid='rene_guid'))
+        self.assertEqual(u'Ren\xe9', stored.name)
+        self.assertEqual(1, stored.connections)
+
+class TestClients_indexes(B3TestCase):
+
+    GUID = '0123456789ABCDEF0123456789ABCDEF'
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        Clients.authorizeClients = Mock()
+        self.clients = self.console.clients
+        self.joe = self.clients.newClient('1', name='Joe', guid=self.GUID)
+        self.jack = self.clients.newClient('2', name='^1Jack', guid='jack_guid')
+
+    def test_getByName(self):
+        self.assertIs(self.joe, self.clients.getByName('joe'))
+        self.assertIs(self.jack, self.clients.getByName('JACK'))
+        self.assertIsNone(self.clients.getByName('bill'))
+
+    def test_getByExactName(self):
+        self.assertIs(self.jack, self.clients.getByExactName('^1jack'))
+        self.assertIsNone(self.clients.getByExactName('jack'))
+
+    def test_getByGUID(self):
+        self.assertIs(self.joe, self.clients.getByGUID(self.GUID.lower()))
+        self.assertIs(self.jack, self.clients.getByGUID('JACK_GUID'))
+        self.assertIsNone(self.clients.getByGUID('f00'))
+
+    def test_getByGUID_fuzzy(self):
+        # truncated GUIDs off by one char
+        self.assertIs(self.joe, self.clients.getByGUID(self.GUID[:-1]))
+        self.assertIs(self.joe, self.clients.getByGUID(self.GUID[1:]))
+        self.assertIs(self.joe, self.clients.getByGUID(self.GUID[:20] + self.GUID[21:]))
+        self.assertIsNone(self.clients.getByGUID(self.GUID[2:] + 'X'))
+        # a truncated GUID matches the full one too
+        bill = self.clients.newClient('3', name='Bill', guid='X' + self.GUID[2:])
+        self.assertIs(bill, self.clients.getByGUID('XY' + self.GUID[2:]))
+
+    def test_rename(self):
+        self.joe.name = 'Joey'
+        self.assertIsNone(self.clients.getByName('joe'))
+        self.assertIs(self.joe, self.clients.getByName('joey'))
+        self.assertIs(self.joe, self.clients.getByExactName('joey'))
+
+    def test_guid_change(self):
+        self.jack.guid = ''
+        self.assertIsNone(self.clients.getByGUID('jack_guid'))
+        self.jack.guid = 'new_jack_guid'
+        self.assertIs(self.jack, self.clients.getByGUID('new_jack_guid'))
+
+    def test_disconnect(self):
+        self.clients.disconnect(self.joe)
+        self.assertIsNone(self.clients.getByName('joe'))
+        self.assertIsNone(self.clients.getByGUID(self.GUID))
+        self.assertIsNone(self.clients.getByGUID(self.GUID[:-1]))
+        self.assertIs(self.jack, self.clients.getByName('jack'))
+
+    def test_slot_reused(self):
+        bill = Client(console=self.console, cid='1', name='Bill', guid='bill_guid')
+        self.clients['1'] = bill
+        self.assertIsNone(self.clients.getByName('joe'))
+        self.assertIs(bill, self.clients.getByName('bill'))
+
+    def test_same_name(self):
+        joe2 = self.clients.newClient('3', name='Joe', guid='joe2_guid')
+        self.clients.disconnect(self.joe)
+        self.assertIs(joe2, self.clients.getByName('joe'))
+
+    def test_getClientsByName(self):
+        self.assertListEqual([self.jack], self.clients.getClientsByName('ACK'))
+        self.assertListEqual([self.joe], self.clients.getClientsByName('j o e'))
+        self.assertListEqual([self.joe, self.jack], self.clients.getClientsByName('j'))
+        self.assertListEqual([], self.clients.getClientsByName('jacko'))
+
+    def test_getClientsByName_after_rename(self):
+        self.assertListEqual([self.joe], self.clients.getClientsByName('joe'))
+        self.joe.name = 'Big Jack'
+        self.assertListEqual([], self.clients.getClientsByName('joe'))
+        self.assertListEqual([self.joe, self.jack], self.clients.getClientsByName('jack'))
+        self.assertListEqual([self.joe], self.clients.getClientsByName('gjac'))
+
+    def test_getClientsByName_after_disconnect(self):
+        self.assertListEqual([self.jack], self.clients.getClientsByName('jack'))
+        self.clients.disconnect(self.jack)
+        self.assertListEqual([], self.clients.getClientsByName('jack'))
+        jacky = self.clients.newClient('3', name='Jacky', guid='jacky_guid')
+        self.assertListEqual([jacky], self.clients.getClientsByName('jack'))
+
+    def test_getClientsByName_hidden(self):
+        self.jack.hide = True
+        self.assertListEqual([], self.clients.getClientsByName('jack'))
+        self.jack.hide = False
+        self.assertListEqual([self.jack], self.clients.getClientsByName('jack'))
+
+    def test_clear(self):
+        self.clients.clear()
+        self.assertIsNone(self.clients.getByName('joe'))
+        self.assertDictEqual({}, self.clients._nameIndex)
+
+    def test_resetIndex(self):
+        self.joe._name = 'Joey'  # bypass the property
+        self.clients.resetIndex()
+        self.assertIs(self.joe, self.clients.getByName('joey'))
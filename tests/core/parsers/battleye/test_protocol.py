@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import binascii
+import socket
+import struct
+import threading
+import time
+import unittest2 as unittest
+
+from b3.parsers.battleye.protocol import BattleyeServer
+from b3.parsers.battleye.protocol import CommandFailedError
+from b3.parsers.battleye.protocol import CommandTimeoutError
+from mock import patch
+
+
+def encode(tp, seq, data=''):
+    """
+    Build a BattlEye packet as the game server would send it.
+    """
+    payload = chr(255) + chr(tp) + chr(seq) + data
+    return 'BE' + struct.pack('<I', binascii.crc32(payload) & 0xffffffff) + payload
+
+
+class FakeServer(threading.Thread):
+    """
+    Collect batch_size commands and then reply to all of them in reverse order.
+    The response to a command is 'OK' followed by the command, the 'multi' command response
+    is split over 3 packets sent in reverse order, the 'empty' command response is empty
+    and the 'unknown' command is unknown.
+    """
+    def __init__(self, batch_size=1, reply=True):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.batch_size = batch_size
+        self.reply = reply
+        self.commands = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+
+    def run(self):
+        batch = []
+        while True:
+            packet, address = self.sock.recvfrom(8192)
+            tp, seq, cmd = ord(packet[7]), ord(packet[8]), packet[9:]
+            if tp == 0:
+                # login
+                self.sock.sendto(encode(0, 1), address)
+            elif tp == 1:
+                self.commands.append(cmd)
+                batch.append((seq, cmd))
+                if self.reply and len(batch) >= self.batch_size:
+                    for seq, cmd in reversed(batch):
+                        for part in reversed(self.respond(seq, cmd)):
+                            self.sock.sendto(part, address)
+                    batch = []
+
+    def respond(self, seq, cmd):
+        if cmd == 'unknown':
+            return [encode(1, seq, 'Unknown command')]
+        elif cmd == 'multi':
+            return [encode(1, seq, chr(0) + chr(3) + chr(i) + 'part%s ' % i) for i in range(3)]
+        elif cmd == 'empty':
+            return [encode(1, seq)]
+        return [encode(1, seq, 'OK %s' % cmd)]
+
+
+class Test_BattleyeServer(unittest.TestCase):
+
+    def connect(self, **kwargs):
+        self.server = FakeServer(**kwargs)
+        self.server.start()
+        with patch('time.sleep'):
+            self.battleye = BattleyeServer('127.0.0.1', self.server.port, 'password')
+        # stands for the time.sleep() patched above
+        start = time.time()
+        while not self.battleye.connected and time.time() - start < 3:
+            time.sleep(0.01)
+        self.assertTrue(self.battleye.connected)
+
+    def tearDown(self):
+        self.battleye.stop()
+        self.battleye.join(15)
+
+    def test_command(self):
+        self.connect()
+        self.assertEqual('OK players', self.battleye.command('players'))
+        self.assertEqual('', self.battleye.command('empty'))
+        self.assertRaises(CommandFailedError, self.battleye.command, 'unknown')
+        self.assertDictEqual({}, self.battleye.pending_commands)
+
+    def test_command_with_no_response(self):
+        self.connect(reply=False)
+        self.assertIsNone(self.battleye.command('say -1 hello'))
+        start = time.time()
+        while not self.server.commands and time.time() - start < 2:
+            time.sleep(0.01)
+        self.assertListEqual(['say -1 hello'], self.server.commands)
+
+    def test_multipacket_response(self):
+        # the parts of the response are received in reverse order
+        self.connect()
+        self.assertEqual('part0 part1 part2 ', self.battleye.command('multi'))
+        self.assertDictEqual({}, self.battleye._multi_packet_response)
+
+    def test_stale_multipacket_parts_are_dropped(self):
+        self.connect(reply=False)
+        # late part of the response to a command which timed out
+        self.assertIsNone(self.battleye._handle_multipacket_part(0, 2, 1, 'A1'))
+        self.assertDictEqual({}, self.battleye._multi_packet_response)
+        # parts left over are forgotten when the sequence number is reused
+        self.battleye._multi_packet_response[0] = {1: 'A1'}
+        self.battleye.write_seq = 0
+        self.battleye._pending_slots.acquire()
+        pending = self.battleye._send_pending_command('cmd')
+        self.assertEqual(0, pending.sequence)
+        self.assertDictEqual({}, self.battleye._multi_packet_response)
+        self.assertIsNone(self.battleye._handle_multipacket_part(0, 2, 0, 'B0'))
+        self.assertEqual('B0B1', self.battleye._handle_multipacket_part(0, 2, 1, 'B1'))
+        self.battleye._release_pending_command(pending)
+
+    def test_commands_are_in_flight_at_once(self):
+        # the server replies only once the 4 commands are received
+        self.connect(batch_size=4)
+        self.assertListEqual(['OK players', 'part0 part1 part2 ', None, 'OK bans'],
+                             self.battleye.commands(['players', 'multi', 'say -1 hi', 'bans']))
+        self.assertDictEqual({}, self.battleye.pending_commands)
+
+    def test_commands_errors(self):
+        self.connect(batch_size=3)
+        self.assertRaises(CommandFailedError, self.battleye.commands, ['a', 'unknown', 'b'])
+        results = self.battleye.commands(['a', 'unknown', 'b'], raise_errors=False)
+        self.assertEqual('OK a', results[0])
+        self.assertIsInstance(results[1], CommandFailedError)
+        self.assertEqual('OK b', results[2])
+
+    def test_commands_more_than_max_pending(self):
+        self.connect(batch_size=2)
+        self.battleye.max_pending_commands = 2
+        self.battleye._pending_slots = threading.BoundedSemaphore(2)
+        cmds = ['cmd%s' % i for i in xrange(6)]
+        self.assertListEqual(['OK %s' % cmd for cmd in cmds], self.battleye.commands(cmds))
+
+    def test_concurrent_callers(self):
+        # every caller gets its own response, although they are sent in reverse order
+        self.connect(batch_size=5)
+        results = {}
+
+        def run(i):
+            results[i] = self.battleye.command('cmd%s' % i)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in xrange(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertDictEqual(dict((i, 'OK cmd%s' % i) for i in xrange(5)), results)
+
+    def test_timeout(self):
+        self.connect(reply=False)
+        self.assertRaises(CommandTimeoutError, self.battleye.command, 'players', timeout=0.2)
+        self.assertDictEqual({}, self.battleye.pending_commands)
+
+    def test_sequence_skips_pending_commands(self):
+        self.connect()
+        with self.battleye._pending_lock:
+            self.battleye.write_seq = 255
+            self.battleye.pending_commands[0] = None
+            self.assertEqual(255, self.battleye._next_sequence())
+            self.assertEqual(1, self.battleye._next_sequence())
+            del self.battleye.pending_commands[0]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import socket
+import unittest2 as unittest
+
+from struct import pack
+from b3.parsers.frostbite.framing import PacketBuffer
+from b3.parsers.frostbite.framing import decodePacket
+from b3.parsers.frostbite.framing import encodePacket
+from b3.parsers.frostbite.framing import encodeWords
+from b3.parsers.frostbite import protocol
+from b3.parsers.frostbite2 import protocol as protocol2
+
+
+class Test_codec(unittest.TestCase):
+
+    def test_encodeWords(self):
+        self.assertEqual((13, pack('<I', 2) + 'OK\x00' + pack('<I', 1) + '3\x00'), encodeWords(['OK', 3]))
+        self.assertEqual((0, ''), encodeWords([]))
+
+    def test_encodePacket(self):
+        packet = encodePacket(True, False, 5, ['player.onJoin', 'Joe'])
+        self.assertEqual(pack('<III', 0x80000005, len(packet), 2), packet[:12])
+        self.assertEqual([0x80000000, 0, 5, ['player.onJoin', 'Joe']], decodePacket(packet))
+
+    def test_decodePacket_offset(self):
+        packet = encodePacket(False, True, 0x3fffffff, ['OK', '', 'x' * 300])
+        self.assertEqual([0, 0x40000000, 0x3fffffff, ['OK', '', 'x' * 300]], decodePacket('junk' + packet, 4))
+
+    def test_protocol_modules(self):
+        for module in (protocol, protocol2):
+            packet = module.EncodePacket(False, False, 12, ('serverInfo',))
+            self.assertEqual([0, 0, 12, ['serverInfo']], module.DecodePacket(packet))
+            size, words = module.EncodeWords(['a', 'bc'])
+            self.assertEqual(['a', 'bc'], module.DecodeWords(size, words))
+
+
+class Test_PacketBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = PacketBuffer(size=64)
+        self.packets = [encodePacket(False, True, i, ['OK', 'x' * (i * 7)]) for i in xrange(20)]
+
+    def test_packet_split_across_reads(self):
+        data = ''.join(self.packets)
+        decoded = []
+        for i in xrange(0, len(data), 10):
+            self.buffer.feed(data[i:i + 10])
+            packet = self.buffer.decodePacket()
+            while packet:
+                decoded.append(packet)
+                packet = self.buffer.decodePacket()
+        self.assertListEqual([decodePacket(x) for x in self.packets], decoded)
+        self.assertEqual(0, len(self.buffer))
+
+    def test_many_packets_in_one_read(self):
+        self.buffer.feed(''.join(self.packets))
+        self.assertListEqual(self.packets, [self.buffer.popPacket() for _ in self.packets])
+        self.assertIsNone(self.buffer.popPacket())
+        self.assertFalse(self.buffer.hasPacket())
+
+    def test_incomplete_packet(self):
+        self.buffer.feed(self.packets[3][:-1])
+        self.assertFalse(self.buffer.hasPacket())
+        self.assertIsNone(self.buffer.decodePacket())
+        self.buffer.feed(self.packets[3][-1:])
+        self.assertEqual(decodePacket(self.packets[3]), self.buffer.decodePacket())
+
+    def test_invalid_packet_size(self):
+        self.buffer.feed(pack('<II', 0, 4))
+        self.assertRaises(ValueError, self.buffer.hasPacket)
+
+    def test_recvFrom(self):
+        a, b = socket.socketpair()
+        try:
+            a.sendall(self.packets[5] + self.packets[6][:10])
+            self.assertEqual(len(self.packets[5]) + 10, self.buffer.recvFrom(b))
+            self.assertEqual(self.packets[5], self.buffer.popPacket())
+            self.assertFalse(self.buffer.hasPacket())
+            a.close()
+            self.assertEqual(0, self.buffer.recvFrom(b))
+        finally:
+            a.close()
+            b.close()
+
+    def test_receivePacket(self):
+        a, b = socket.socketpair()
+        try:
+            a.sendall(''.join(self.packets[:2]))
+            packet, buf = protocol.receivePacket(b, self.buffer)
+            self.assertIs(self.buffer, buf)
+            self.assertEqual(self.packets[0], packet)
+            self.assertEqual(self.packets[1], protocol.receivePacket(b, self.buffer)[0])
+            a.close()
+            self.assertRaises(socket.error, protocol.receivePacket, b, self.buffer)
+        finally:
+            a.close()
+            b.close()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import socket
+import threading
+import time
+import unittest2 as unittest
+
+from b3.parsers.frostbite.framing import PacketBuffer
+from b3.parsers.frostbite.framing import encodePacket
+from b3.parsers.frostbite2.protocol import CommandFailedError
+from b3.parsers.frostbite2.protocol import CommandTimeoutError
+from b3.parsers.frostbite2.protocol import FrostbiteServer
+from b3.parsers.frostbite2.protocol import NetworkError
+from mock import patch
+
+
+class FakeServer(threading.Thread):
+    """
+    Collect batch_size command requests and then reply to all of them in reverse order.
+    The reply to a command is 'OK' followed by the command words, unless the command is 'fail'.
+    """
+    def __init__(self, batch_size=1, reply=True):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.batch_size = batch_size
+        self.reply = reply
+        self.requests = []
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        self.connection = None
+
+    def run(self):
+        # the first connection only tests the connectivity
+        self.listener.accept()[0].close()
+        self.connection = self.listener.accept()[0]
+        buf = PacketBuffer()
+        batch = []
+        while buf.recvFrom(self.connection):
+            packet = buf.decodePacket()
+            while packet:
+                self.requests.append(packet)
+                batch.append(packet)
+                packet = buf.decodePacket()
+            if self.reply and len(batch) >= self.batch_size:
+                for isFromServer, isResponse, sequence, words in reversed(batch):
+                    reply = ['InvalidArguments'] if words[0] == 'fail' else ['OK'] + words
+                    self.connection.sendall(encodePacket(False, True, sequence, reply))
+                batch = []
+
+
+class Test_FrostbiteServer(unittest.TestCase):
+
+    def connect(self, **kwargs):
+        self.server = FakeServer(**kwargs)
+        self.server.start()
+        with patch('time.sleep'):
+            self.frostbite = FrostbiteServer('127.0.0.1', self.server.port, command_timeout=2)
+        # stands for the time.sleep() patched above
+        while not self.server.connection or not self.frostbite.connected:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.frostbite.stop()
+        self.frostbite.join(5)
+
+    def test_command(self):
+        self.connect()
+        self.assertEqual(['serverInfo'], self.frostbite.command('serverInfo'))
+        self.assertEqual(['listPlayers', 'all'], self.frostbite.command(('listPlayers', 'all')))
+        self.assertRaises(CommandFailedError, self.frostbite.command, 'fail')
+        self.assertDictEqual({}, self.frostbite.pending_commands)
+
+    def test_commands_are_in_flight_at_once(self):
+        # the server replies only once the 3 commands are received
+        self.connect(batch_size=3)
+        self.assertListEqual([['a'], ['b', '1'], ['c', '2']],
+                             self.frostbite.commands(['a', ('b', 1), ['c', 2]]))
+        self.assertDictEqual({}, self.frostbite.pending_commands)
+
+    def test_commands_errors(self):
+        self.connect(batch_size=3)
+        self.assertRaises(CommandFailedError, self.frostbite.commands, ['a', 'fail', 'b'])
+        results = self.frostbite.commands(['a', 'fail', 'b'], raise_errors=False)
+        self.assertEqual(['a'], results[0])
+        self.assertIsInstance(results[1], CommandFailedError)
+        self.assertEqual(['b'], results[2])
+
+    def test_concurrent_callers(self):
+        # every caller gets its own reply, although they are sent in reverse order
+        self.connect(batch_size=5)
+        results = {}
+
+        def run(i):
+            results[i] = self.frostbite.command('cmd%s' % i)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in xrange(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertDictEqual(dict((i, ['cmd%s' % i]) for i in xrange(5)), results)
+
+    def test_timeout(self):
+        self.connect(reply=False)
+        self.frostbite.command_timeout = 0.2
+        self.assertRaises(CommandTimeoutError, self.frostbite.command, 'serverInfo')
+        self.assertDictEqual({}, self.frostbite.pending_commands)
+
+    def test_connection_lost(self):
+        self.connect(reply=False)
+        threading.Timer(0.2, self.server.connection.shutdown, (socket.SHUT_RDWR,)).start()
+        start = time.time()
+        self.assertRaises(NetworkError, self.frostbite.command, 'serverInfo')
+        self.assertLess(time.time() - start, 1.9)
@@ -54,6 +54,100 @@ class Test(unittest.TestCase):
         assertGetCvar('mapname', '"mapname" is:"ut4_abbey^7"', ("mapname", 'ut4_abbey', None))
 
 
+class Test_line_dispatch(unittest.TestCase):
+
+    def setUp(self):
+        from b3.parsers.iourt41 import Iourt41Parser
+        self.mock_parser = Mock(spec=Iourt41Parser)
+        self.mock_parser._lineFormats = Iourt41Parser._lineFormats
+        self.mock_parser._lineAction = AbstractParser._lineAction
+        self.mock_parser._reLiteralAction = AbstractParser._reLiteralAction
+        self.mock_parser._lineDispatchSize = AbstractParser._lineDispatchSize
+        self.mock_parser._lineFormatsByAction = None
+        self.mock_parser._lineHandlers = None
+        self.mock_parser.getLineFormats = lambda keyword: AbstractParser.getLineFormats(self.mock_parser, keyword)
+
+    def matchLine(self, line):
+        return AbstractParser.matchLine(self.mock_parser, line)
+
+    def test_getLineFormats_skips_literal_actions(self):
+        formats = self.mock_parser.getLineFormats('kill')
+        patterns = [f.pattern for f in formats]
+        self.assertEqual([f for f in self.mock_parser._lineFormats if f.pattern in patterns], list(formats))
+        self.assertFalse(any('Flag Return' in x or 'Bomb' in x or 'Pop' in x for x in patterns))
+        self.assertTrue(any('Flag Return' in f.pattern for f in self.mock_parser.getLineFormats('flag')))
+        self.assertTrue(any('Bombholder' in f.pattern for f in self.mock_parser.getLineFormats('bombholder')))
+        self.assertTrue(any('Pop' in f.pattern for f in self.mock_parser.getLineFormats('pop')))
+        self.assertFalse(any('Pop' in f.pattern for f in self.mock_parser.getLineFormats('bombholder')))
+
+    def test_matchLine_same_as_sequential_match(self):
+        for line in ('Hit: 12 7 1 19: BSTHanzo[FR] hit ercan in the Helmet',
+                     'Kill: 0 1 16: XLR8or killed =lvl1=Cheetah by UT_MOD_SPAS',
+                     'saytell: 15 16 repelSteeltje: nno',
+                     'say: 8 denzel: lol',
+                     'Flag: 2 0: team_CTF_redflag',
+                     'Flag Return: RED',
+                     'Bombholder is 2',
+                     'Bomb was tossed by 2',
+                     'Pop!',
+                     'Item: 0 ut_weapon_ump45',
+                     'ShutdownGame:',
+                     '------------------------------------------------------------'):
+            expected = None
+            for f in self.mock_parser._lineFormats:
+                expected = f.match(line)
+                if expected:
+                    break
+            m = self.matchLine(line)
+            if expected is None:
+                self.assertIsNone(m, line)
+            else:
+                self.assertIs(expected.re, m.re, line)
+                self.assertEqual(expected.groupdict(), m.groupdict(), line)
+
+    def test_matchLine_caches_formats(self):
+        self.matchLine('Kill: 0 1 16: XLR8or killed =lvl1=Cheetah by UT_MOD_SPAS')
+        self.assertIn('kill', self.mock_parser._lineFormatsByAction)
+
+    def test_getLineHandler(self):
+        self.mock_parser.OnKill = Mock()
+        self.mock_parser.OnFlagReturn = Mock()
+        self.assertIs(self.mock_parser.OnKill, AbstractParser.getLineHandler(self.mock_parser, 'kill'))
+        self.assertIs(self.mock_parser.OnFlagReturn, AbstractParser.getLineHandler(self.mock_parser, 'flag return'))
+        self.assertIsNone(AbstractParser.getLineHandler(self.mock_parser, 'foo'))
+        self.assertEqual({'kill': self.mock_parser.OnKill,
+                          'flag return': self.mock_parser.OnFlagReturn,
+                          'foo': None}, self.mock_parser._lineHandlers)
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
-    unittest.main()
\ No newline at end of file
+    unittest.main()
+
+class Test_status(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_parser = Mock(spec=AbstractParser)
+        self.mock_parser.PunkBuster = None
+        self.mock_parser._status = None
+        self.mock_parser._statusInterval = 1.0
+        self.mock_parser._regPlayer = AbstractParser._regPlayer
+        self.mock_parser._regPlayerShort = AbstractParser._regPlayerShort
+        self.mock_parser._reMapNameFromStatus = AbstractParser._reMapNameFromStatus
+        self.mock_parser.getStatus = lambda maxRetries=None: AbstractParser.getStatus(self.mock_parser, maxRetries)
+        self.mock_parser.write = Mock(return_value='''\
+map: ut4_casa
+num score ping guid   name            lastmsg address               qport rate
+--- ----- ---- ------ --------------- ------- --------------------- ----- -----
+  0     5   48 465030 Joe^7                 0 11.22.33.44:27961     1234 25000
+  1    -2   62 465031 Jack^7                0 55.66.77.88:27961     4321 25000
+''')
+
+    def test_methods_share_one_status_reply(self):
+        players = AbstractParser.getPlayerList(self.mock_parser)
+        self.assertEqual({'0', '1'}, set(players))
+        self.assertIsNone(players['0']['pbid'])
+        self.assertEqual({'0': 48, '1': 62}, AbstractParser.getPlayerPings(self.mock_parser))
+        self.assertEqual({'0': 5, '1': -2}, AbstractParser.getPlayerScores(self.mock_parser))
+        self.assertEqual('ut4_casa', AbstractParser.getMap(self.mock_parser))
+        self.mock_parser.write.assert_called_once_with('status', maxRetries=None)
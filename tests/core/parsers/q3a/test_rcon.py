@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import socket
+import threading
+import time
+import unittest2 as unittest
+
+from b3.parsers.q3a.rcon import Rcon
+from mock import Mock
+from mock import patch
+
+
+class FakeServer(threading.Thread):
+    """
+    Reply to RCON commands with the packets given for each command.
+    """
+    def __init__(self, replies):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.replies = replies
+        self.commands = []
+        self.socket = socket.socket(type=socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.host = self.socket.getsockname()
+
+    def run(self):
+        while True:
+            data, address = self.socket.recvfrom(4096)
+            command = data[4:].strip().split(' ', 2)[-1]
+            self.commands.append(command)
+            for packet in self.replies.get(command, []):
+                self.socket.sendto('\377\377\377\377print\n' + packet, address)
+
+
+class Test_Rcon(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer({'status': ['map: ut4_casa\n', 'num score ping name\n', '  0     0   48 Joe\n'],
+                                  'say hi': ['broadcast: print "hi"\n']})
+        self.server.start()
+        console = Mock(encoding=None)
+        console.config.has_option.return_value = False
+        self.rcon = Rcon(console, self.server.host, 'password')
+
+    def tearDown(self):
+        self.rcon.stop()
+        self.server.socket.close()
+
+    def test_per_server_lock(self):
+        other = Rcon(self.rcon.console, self.server.host, 'password')
+        other.stop()
+        self.assertIsNot(self.rcon.lock, other.lock)
+
+    def test_reply_framing(self):
+        start = time.time()
+        self.assertEqual('map: ut4_casa\nnum score ping name\n  0     0   48 Joe\n', self.rcon.write('status'))
+        # the reply is complete well before the socket timeout
+        self.assertLess(time.time() - start, self.rcon.socket_timeout)
+
+    def test_writelines_replies_discarded(self):
+        self.rcon.writelines(['say hi', 'say hi'])
+        while len(self.server.commands) < 2:
+            time.sleep(0.01)
+        self.assertEqual('map: ut4_casa\nnum score ping name\n  0     0   48 Joe\n', self.rcon.write('status'))
+
+    def test_throttle(self):
+        self.rcon.rate_burst = 2
+        self.rcon._allowance = 2
+        with patch('time.sleep') as sleep_mock:
+            for _ in xrange(4):
+                self.rcon._throttle()
+        # the burst is sent right away, then commands are spaced by rate_interval
+        self.assertEqual(2, sleep_mock.call_count)
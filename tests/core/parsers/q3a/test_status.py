@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import threading
+import unittest2 as unittest
+
+from b3.parsers.q3a.abstractParser import AbstractParser
+from b3.parsers.q3a.status import StatusService
+from b3.parsers.q3a.status import StatusSnapshot
+from mock import Mock
+from mock import patch
+
+STATUS = '''\
+map: ut4_casa
+num score ping guid   name            lastmsg address               qport rate
+--- ----- ---- ------ --------------- ------- --------------------- ----- -----
+  0     5   48 465030 Joe^7                 0 11.22.33.44:27961     1234 25000
+  1    -2   62 465031 Jack^7                0 55.66.77.88:27961     4321 25000
+'''
+
+
+class Test_StatusSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = StatusSnapshot(STATUS, AbstractParser._regPlayer,
+                                       regPlayerShort=AbstractParser._regPlayerShort,
+                                       regMap=AbstractParser._reMapNameFromStatus)
+
+    def test_map(self):
+        self.assertEqual('ut4_casa', self.snapshot.map)
+
+    def test_getPlayers(self):
+        players = self.snapshot.getPlayers()
+        self.assertListEqual(['0', '1'], [p['slot'] for p in players])
+        self.assertEqual('55.66.77.88', players[1]['ip'])
+        # callers get their own copies
+        players[0]['pbid'] = None
+        self.assertNotIn('pbid', self.snapshot.getPlayers()[0])
+
+    def test_getColumn(self):
+        self.assertListEqual([('0', '48'), ('1', '62')], self.snapshot.getColumn('ping'))
+        self.assertListEqual([('0', '5'), ('1', '-2')], self.snapshot.getColumn('score'))
+
+
+class Test_StatusService(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.console._regPlayer = AbstractParser._regPlayer
+        self.console._regPlayerShort = AbstractParser._regPlayerShort
+        self.console._reMapNameFromStatus = AbstractParser._reMapNameFromStatus
+        self.console.write = Mock(return_value=STATUS)
+        self.service = StatusService(self.console, interval=1)
+
+    def test_reused_within_interval(self):
+        with patch('time.time', return_value=1000.0):
+            snapshot = self.service.get()
+        with patch('time.time', return_value=1000.5):
+            self.assertIs(snapshot, self.service.get())
+        self.console.write.assert_called_once_with('status', maxRetries=None)
+
+    def test_refreshed_after_interval(self):
+        with patch('time.time', return_value=1000.0):
+            snapshot = self.service.get()
+        with patch('time.time', return_value=1001.0):
+            self.assertIsNot(snapshot, self.service.get())
+        self.assertEqual(2, self.console.write.call_count)
+
+    def test_invalidate(self):
+        self.service.get()
+        self.service.invalidate()
+        self.service.get()
+        self.assertEqual(2, self.console.write.call_count)
+
+    def test_refreshed_when_regular_expression_changes(self):
+        with patch('time.time', return_value=1000.0):
+            snapshot = self.service.get()
+            self.console._regPlayer = AbstractParser._regPlayerShort
+            self.assertIsNot(snapshot, self.service.get())
+        self.assertEqual(2, self.console.write.call_count)
+
+    def test_no_reply(self):
+        self.console.write.return_value = ''
+        self.assertIsNone(self.service.get())
+        self.assertIsNone(self.service.get())
+        self.assertEqual(2, self.console.write.call_count)
+
+    def test_concurrent_callers_share_the_refresh(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def write(cmd, maxRetries=None):
+            started.set()
+            release.wait(5)
+            return STATUS
+
+        self.console.write = Mock(side_effect=write)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.service.get())) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(1, self.console.write.call_count)
+        self.assertEqual(5, len(results))
+        self.assertEqual(1, len(set(id(x) for x in results)))
@@ -139,7 +139,7 @@ num score ping name            lastmsg  address              qport rate
         """
         For all connected players, fill the client object with properties allowing to find
         the user in the database (usualy guid, or punkbuster id, ip) and call the
-        Client.auth() method
+        Clients.authorize() method
         """
         superman = mock()
         self.console.clients = mock()
@@ -152,7 +152,7 @@ num score ping name            lastmsg  address              qport rate
 """)
         self.console.authorizeClients()
         verify(self.output_mock).write('status', maxRetries=anything())
-        verify(superman).auth()
+        verify(self.console.clients).authorize([superman])
 
 
     def test_sync(self):
@@ -244,14 +244,14 @@ num score ping name            lastmsg  address              qport rate
         """
         return the current map/level name
         """
-        when(self.output_mock).write('status').thenReturn("""\
+        when(self.output_mock).write('status', maxRetries=None).thenReturn("""\
 map: ut4_casa
 num score ping name            lastmsg  address              qport rate
 --- ----- ---- --------------- ------- --------------------- ----- -----
 12     0   10 superman         0       192.168.1.12:53039     9993 15000
 """)
         m = self.console.getMap()
-        verify(self.output_mock).write('status')
+        verify(self.output_mock).write('status', maxRetries=None)
         self.assertEqual("ut4_casa", m)
 
     def test_getMaps(self):
@@ -394,7 +394,7 @@ maps/ut4_village.bsp
         """
         returns a dict having players' id for keys and players' ping for values
         """
-        when(self.output_mock).write('status').thenReturn("""\
+        when(self.output_mock).write('status', maxRetries=None).thenReturn("""\
 map: ut4_casa
 num score ping name            lastmsg  address              qport rate
 --- ----- ---- --------------- ------- --------------------- ----- -----
@@ -408,7 +408,7 @@ num score ping name            lastmsg  address              qport rate
         """
         returns a dict having players' id for keys and players' scores for values
         """
-        when(self.output_mock).write('status').thenReturn("""\
+        when(self.output_mock).write('status', maxRetries=None).thenReturn("""\
 map: ut4_casa
 num score ping name            lastmsg  address              qport rate
 --- ----- ---- --------------- ------- --------------------- ----- -----
@@ -446,6 +446,8 @@ class Test_log_lines_parsing(Iourt41TestCase):
     def setUp(self):
         Iourt41TestCase.setUp(self)
         self.console.startup()
+        # simulate plugins listening for every event
+        self.console.isEventSubscribed = Mock(return_value=True)
         self.joe = FakeClient(self.console, name="Joe", guid="000000000000000")
 
     def test_SurvivorWinner_team(self):
@@ -131,6 +131,8 @@ class Test_log_lines_parsing(Iourt42TestCase):
     def setUp(self):
         Iourt42TestCase.setUp(self)
         self.console.startup()
+        # simulate plugins listening for every event
+        self.console.isEventSubscribed = Mock(return_value=True)
         self.joe = FakeClient(self.console, name="Joe", guid="000000000000000")
         self.bot = FakeClient(self.console, name="BOT", guid="BOT1", team=b3.TEAM_RED, bot=True)
 
@@ -195,6 +197,15 @@ class Test_log_lines_parsing(Iourt42TestCase):
             event_target=d4dou,
             event_data=(17, '19', '5'))
 
+    def test_Hit_not_subscribed(self):
+        fatmatic = FakeClient(self.console, name="Fat'Matic", guid="11111111111111")
+        d4dou = FakeClient(self.console, name="[FR]d4dou", guid="11111111111111")
+        fatmatic.connects('3')
+        d4dou.connects('6')
+        self.console.isEventSubscribed = Mock(return_value=False)
+        self.assertEvent(r'''Hit: 6 3 5 8: Fat'Matic hit [FR]d4dou in the Torso''', event_type=None)
+        self.assertNotIn('lastDamageTaken', d4dou.data)
+
     def test_Hit_2(self):
         fatmatic = FakeClient(self.console, name="Fat'Matic", guid="11111111111111")
         d4dou = FakeClient(self.console, name="[FR]d4dou", guid="11111111111111")
@@ -985,7 +996,7 @@ auth: id: 0 - name: ^7laCourge - login: courgette - notoriety: serious - level:
 
     def test_getMap(self):
         # GIVEN
-        when(self.console).write('status').thenReturn('''\
+        when(self.console).write('status', maxRetries=None).thenReturn('''\
 map: ut4_casa
 num score ping name            lastmsg address               qport rate
 --- ----- ---- --------------- ------- --------------------- ----- -----
@@ -1036,7 +1047,7 @@ maps/ut4_foo.bsp
 
     def test_getPlayerPings(self):
         # GIVEN
-        when(self.console).write('status').thenReturn('''\
+        when(self.console).write('status', maxRetries=None).thenReturn('''\
 map: ut4_casa
 num score ping name            lastmsg address               qport rate
 --- ----- ---- --------------- ------- --------------------- ----- -----
@@ -1051,7 +1062,7 @@ num score ping name            lastmsg address               qport rate
 
     def test_getPlayerScores(self):
         # GIVEN
-        when(self.console).write('status').thenReturn('''\
+        when(self.console).write('status', maxRetries=None).thenReturn('''\
 map: ut4_casa
 num score ping name            lastmsg address               qport rate
 --- ----- ---- --------------- ------- --------------------- ----- -----
@@ -34,6 +34,7 @@ from mockito import any as ANY
 class StorageAPITest(object):
 
     storage = None
+    upsert_supported = True  # whether the database server understands the upsert syntax
         
     def test_setClient(self):
         c1 = Client(ip="1.2.3.4", connections=2, guid="abcdefghijkl", pbid="123546abcdef", name="some dude", greeting="hi!", mask_level=20, group_bits=8, login="test login", password="test password")
@@ -447,6 +448,39 @@ class StorageAPITest(object):
         # when(self.storage).query(ANY()).thenRaise(KeyError())
         # self.assertRaises(KeyError, self.storage.numPenalties, c1)
 
+    def test_penalty_summary(self):
+        c1 = Mock()
+        c1.id = 15
+        Penalty(clientId=c1.id, adminId=0, timeAdd=1, timeExpire=-1, type='Ban', inactive=1, data='pA').save(self.console)
+        Penalty(clientId=c1.id, adminId=0, timeAdd=2, timeExpire=-1, type='TempBan', inactive=0, data='pB').save(self.console)
+        Penalty(clientId=c1.id, adminId=0, timeAdd=3, timeExpire=-1, type='Warning', inactive=0, data='pC').save(self.console)
+        Penalty(clientId=c1.id, adminId=0, timeAdd=4, timeExpire=-1, type='Kick', inactive=0, data='pD').save(self.console)
+        self.storage.loadPenaltySummary(c1)
+        query = self.storage.query
+        self.storage.query = Mock(wraps=query)
+        self.assertEqual(1, self.storage.numPenalties(c1, ('Ban', 'TempBan')))
+        self.assertEqual('pB', self.storage.getClientLastPenalty(c1, ('Ban', 'TempBan')).data)
+        self.assertEqual(['pC'], [p.data for p in self.storage.getClientPenalties(c1, 'Warning')])
+        self.assertEqual('pC', self.storage.getClientFirstPenalty(c1, 'Warning').data)
+        self.assertFalse(self.storage.query.called)
+        # kicks are not kept in the summary
+        self.assertEqual(1, self.storage.numPenalties(c1, ('Ban', 'Kick')))
+        self.assertTrue(self.storage.query.called)
+        self.storage.query = query
+        # saved penalties are reflected in the summary
+        warning = Penalty(clientId=c1.id, adminId=0, timeExpire=-1, type='Warning', inactive=0, data='pE')
+        warning.save(self.console)
+        self.assertEqual('pE', self.storage.getClientLastPenalty(c1, 'Warning').data)
+        warning.inactive = 1
+        warning.save(self.console)
+        self.assertEqual('pC', self.storage.getClientLastPenalty(c1, 'Warning').data)
+        self.storage.disableClientPenalties(c1, ('Ban', 'TempBan'))
+        self.assertEqual(0, self.storage.numPenalties(c1, ('Ban', 'TempBan')))
+        self.assertIsNone(self.storage.getClientLastPenalty(c1, ('Ban', 'TempBan')))
+        self.assertEqual(1, self.storage.numPenalties(c1, 'Warning'))
+        self.storage.dropPenaltySummary(c1)
+        self.assertEqual(1, self.storage.numPenalties(c1, 'Warning'))
+
     def test_getGroups(self):
         groups = self.storage.getGroups()
         self.assertEqual(8, len(groups))
@@ -471,6 +505,21 @@ class StorageAPITest(object):
         self.assertEquals(20, g.level)
         self.assertRaises(KeyError, self.storage.getGroup, Group(level='500'))
 
+    def test_getMaxGroup(self):
+        self.assertEqual('admin', self.storage.getMaxGroup(1 | 16).keyword)
+        self.assertEqual('superadmin', self.storage.getMaxGroup(255).keyword)
+        self.assertEqual('guest', self.storage.getMaxGroup(0).keyword)
+
+    def test_setGroup(self):
+        group = self.storage.getGroup(Group(keyword='mod'))
+        group.name = 'Moderator'
+        group.save(self.console)
+        self.assertEqual('Moderator', self.storage.getGroup(Group(level=20)).name)
+        self.assertEqual(8, len(self.storage.getGroups()))
+        Group(id=256, name='Owner', keyword='owner', level=120).save(self.console)
+        self.assertEqual(9, len(self.storage.getGroups()))
+        self.assertEqual('owner', self.storage.getMaxGroup(256 | 128).keyword)
+
     def test_getGroup_none(self):
         try:
             self.storage.getGroup(None)
@@ -544,4 +593,114 @@ class StorageAPITest(object):
 
     def test_truncateTables_invalid_table_name(self):
         self.assertRaises(KeyError, self.storage.truncateTable, 'invalid_table')
-        self.assertRaises(KeyError, self.storage.truncateTable, ['invalid_table1', ['invalid_table2']])
\ No newline at end of file
+        self.assertRaises(KeyError, self.storage.truncateTable, ['invalid_table1', ['invalid_table2']])
+
+    def test_upsertQueries(self):
+        if not self.upsert_supported:
+            self.skipTest("no upsert syntax support")
+        fields = ('id', 'alias', 'num_used', 'client_id')
+        self.storage.queryBatch(self.storage.upsertQueries('aliases', fields, [(1, 'foo', 1, 1), (2, 'bar', 1, 1)]))
+        self.storage.queryBatch(self.storage.upsertQueries('aliases', fields, [(2, 'bar', 5, 1), (3, 'baz', 1, 2)]))
+        cursor = self.storage.query("SELECT id, alias, num_used, client_id FROM aliases ORDER BY id")
+        rows = []
+        while not cursor.EOF:
+            r = cursor.getRow()
+            rows.append((r['id'], r['alias'], r['num_used'], r['client_id']))
+            cursor.moveNext()
+        self.assertListEqual([(1, 'foo', 1, 1), (2, 'bar', 5, 1), (3, 'baz', 1, 2)], rows)
+
+    def test_upsertQueries_chunks(self):
+        if not self.upsert_supported:
+            self.skipTest("no upsert syntax support")
+        self.storage.maxBindParams = 5
+        queries = self.storage.upsertQueries('aliases', ('id', 'alias'), [(1, 'a'), (2, 'b'), (3, 'c'), (4, 'd'), (5, 'e')])
+        self.assertListEqual([(1, 'a', 2, 'b'), (3, 'c', 4, 'd'), (5, 'e')], [bindata for _, bindata in queries])
+        self.storage.queryBatch(queries)
+        cursor = self.storage.query("SELECT COUNT(*) AS cnt FROM aliases")
+        self.assertEqual(5, cursor.getRow()['cnt'])
+
+    def test_setClient_non_ascii(self):
+        # player names are read from the game log as byte strings in the game server encoding
+        c1 = Client(name='caf\xe9', guid="abcdefghijkl", ip="1.2.3.4")
+        c1_id = self.storage.setClient(c1)
+        self.assertEqual(u'caf\xe9', self.storage.getClient(Client(guid="abcdefghijkl")).name)
+        alias = Alias(alias='J\xfcrgen', clientId=c1_id)
+        self.storage.setClientAlias(alias)
+        self.assertEqual(u'J\xfcrgen', self.storage.getClientAlias(Alias(id=alias.id)).alias)
+        self.assertListEqual([u'J\xfcrgen'], [a.alias for a in self.storage.getClientAliases(Client(id=c1_id))])
+        penalty_id = self.storage.setClientPenalty(Penalty(clientId=c1_id, adminId=0, type='Kick', reason='tr\xe8s mal'))
+        self.assertEqual(u'tr\xe8s mal', self.storage.getClientPenalty(Penalty(id=penalty_id, type='Kick')).reason)
+
+    def test_setClient_quotes(self):
+        c1 = Client(name='some "dude" \'with\' quotes\\', guid="abcdefghijkl")
+        c1_id = self.storage.setClient(c1)
+        c2 = self.storage.getClient(Client(guid="abcdefghijkl"))
+        self.assertEqual(c1_id, c2.id)
+        self.assertEqual('some "dude" \'with\' quotes\\', c2.name)
+
+    def test_cursor_rows(self):
+        for i in range(5):
+            self.storage.query("INSERT INTO aliases (alias, client_id) VALUES ('alias%s', %s)" % (i, i))
+        cursor = self.storage.query("SELECT id, alias, client_id FROM aliases ORDER BY id")
+        rows = list(cursor.rows(size=2))
+        self.assertTrue(cursor.EOF)
+        self.assertListEqual(['alias0', 'alias1', 'alias2', 'alias3', 'alias4'], [r['alias'] for r in rows])
+        self.assertEqual(4, rows[4]['client_id'])
+        self.assertEqual('alias4', rows[4][1])
+        self.assertEqual('default', rows[4].get('invalid', 'default'))
+        self.assertDictEqual({'id': 5, 'alias': 'alias4', 'client_id': 4}, rows[4].asDict())
+
+    def test_cursor_compatibility(self):
+        self.storage.query("INSERT INTO aliases (alias, client_id) VALUES ('foo', 1)")
+        self.storage.query("INSERT INTO aliases (alias, client_id) VALUES ('bar', 2)")
+        cursor = self.storage.query("SELECT alias, client_id FROM aliases ORDER BY id")
+        self.assertFalse(cursor.EOF)
+        self.assertEqual('foo', cursor.getValue('alias'))
+        self.assertIsNone(cursor.getValue('invalid'))
+        cursor.moveNext()
+        self.assertDictEqual({'alias': 'bar', 'client_id': 2}, cursor.getRow())
+        # iteration starts from the current row
+        self.assertListEqual(['bar'], [r['alias'] for r in cursor])
+        self.assertTrue(cursor.EOF)
+        self.assertDictEqual({}, cursor.getRow())
+        cursor = self.storage.query("SELECT * FROM aliases WHERE id = -1")
+        self.assertTrue(cursor.EOF)
+        self.assertListEqual([], list(cursor))
+
+    def test_queryAsync_without_writer(self):
+        future = self.storage.queryAsync("INSERT INTO aliases (alias, client_id) VALUES ('foo', 1)")
+        self.assertTrue(future.done())
+        self.assertEqual(1, future.result().lastrowid)
+
+    def test_writer(self):
+        self.storage.startWriter(10)
+        c1 = Client(name="some dude", guid="abcdefghijkl", connections=1)
+        c1_id = self.storage.setClient(c1)
+        self.assertEqual(1, c1_id)
+        c1.connections = 2
+        self.storage.setClient(c1)
+        futures = [self.storage.queryAsync("INSERT INTO aliases (alias, client_id) VALUES ('alias%s', 1)" % i) for i in range(20)]
+        self.storage.stopWriter()
+        self.assertListEqual(range(1, 21), [f.result(timeout=0).lastrowid for f in futures])
+        self.assertEqual(2, self.storage.getClient(Client(id=c1_id)).connections)
+
+    def test_writer_survives_reconnection(self):
+        self.storage.startWriter(10)
+        self.storage.shutdown()
+        self.storage.connect()
+        future = self.storage.queryAsync("INSERT INTO aliases (alias, client_id) VALUES ('foo', 1)")
+        self.storage.stopWriter()
+        self.assertIsNone(future.exception(timeout=0))
+
+    def test_writer_failing_query(self):
+        self.storage.startWriter(10)
+        f1 = self.storage.queryAsync("INSERT INTO aliases (alias, client_id) VALUES ('foo', 1)")
+        f2 = self.storage.queryAsync("INSERT INTO invalid_table (alias) VALUES ('bar')")
+        f3 = self.storage.queryAsync("INSERT INTO aliases (alias, client_id) VALUES ('baz', 1)")
+        self.storage.stopWriter()
+        self.assertIsNone(f1.exception(timeout=0))
+        self.assertIsNotNone(f2.exception(timeout=0))
+        self.assertRaises(Exception, f2.result, 0)
+        self.assertIsNone(f3.exception(timeout=0))
+        cursor = self.storage.query("SELECT COUNT(*) AS cnt FROM aliases")
+        self.assertEqual(2, cursor.getRow()['cnt'])
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import threading
+import unittest2 as unittest
+
+from mock import Mock
+from b3.storage.pool import ConnectionPool
+
+
+class FakeStorage(object):
+
+    def __init__(self):
+        self.console = Mock()
+        self.opened = []
+        self.closed = []
+        self.broken = set()
+        self.fail = False
+
+    def _newConnection(self):
+        if self.fail:
+            raise Exception('connection refused')
+        db = object()
+        self.opened.append(db)
+        return db
+
+    def _closeConnection(self, db):
+        self.closed.append(db)
+
+    def _ping(self, db):
+        return db not in self.broken
+
+
+class Test_ConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.pool = ConnectionPool(self.storage, 2)
+        self.pool.checkoutTimeout = 0.2
+
+    def test_connection_reused(self):
+        with self.pool.connection() as db1:
+            pass
+        with self.pool.connection() as db2:
+            pass
+        self.assertIs(db1, db2)
+        self.assertEqual(1, self.pool.size())
+
+    def test_nested_checkout_same_thread(self):
+        with self.pool.connection() as db1:
+            with self.pool.connection() as db2:
+                self.assertIs(db1, db2)
+        self.assertEqual(1, self.pool.size())
+
+    def test_pool_full(self):
+        release = threading.Event()
+        ready = threading.Event()
+        def hold():
+            with self.pool.connection():
+                ready.set()
+                release.wait(5)
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for t in threads:
+            ready.clear()
+            t.start()
+            ready.wait(5)
+        try:
+            self.assertRaises(Exception, self.pool.connection().__enter__)
+        finally:
+            release.set()
+            for t in threads:
+                t.join()
+        with self.pool.connection():
+            pass
+        self.assertEqual(2, len(self.storage.opened))
+
+    def test_broken_connection_discarded(self):
+        try:
+            with self.pool.connection() as db1:
+                self.storage.broken.add(db1)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertListEqual([db1], self.storage.closed)
+        with self.pool.connection() as db2:
+            self.assertIsNot(db1, db2)
+
+    def test_health_check(self):
+        with self.pool.connection() as db1:
+            pass
+        with self.pool.connection() as db2:
+            self.assertIs(db1, db2)
+        self.storage.broken.add(db1)
+        self.pool.healthCheckInterval = -1
+        with self.pool.connection() as db3:
+            self.assertIsNot(db1, db3)
+        self.assertListEqual([db1], self.storage.closed)
+
+    def test_reconnect_backoff(self):
+        self.storage.fail = True
+        self.assertRaises(Exception, self.pool.connection().__enter__)
+        self.storage.fail = False
+        # too soon for another attempt
+        self.assertRaises(Exception, self.pool.connection().__enter__)
+        self.assertListEqual([], self.storage.opened)
+        self.assertEqual(0, self.pool.size())
+        self.pool._retryTime = 0
+        with self.pool.connection():
+            pass
+        self.assertEqual(1, len(self.storage.opened))
+
+    def test_close(self):
+        with self.pool.connection() as db:
+            pass
+        self.pool.close()
+        self.assertListEqual([db], self.storage.closed)
+        self.assertEqual(0, self.pool.size())
+        self.assertRaises(Exception, self.pool.connection().__enter__)
@@ -94,6 +94,8 @@ class Test_PostgreSQL(B3TestCase, StorageAPITest):
             dsn = "postgresql://%s:%s@%s/%s" % (POSTGRESQL_TEST_USER, POSTGRESQL_TEST_PASSWORD, POSTGRESQL_TEST_HOST, POSTGRESQL_TEST_DB)
             self.storage = self.console.storage = PostgresqlStorage(dsn, splitDSN(dsn), self.console)
             self.storage.connect()
+            # ON CONFLICT is available since PostgreSQL 9.5
+            self.upsert_supported = self.storage.getConnection().server_version >= 90500
 
             tables = self.storage.getTables()
             if tables:
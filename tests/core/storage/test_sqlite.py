@@ -23,8 +23,13 @@
 # ################################################################### #
 
 import nose
+import os
+import shutil
+import sqlite3
+import tempfile
 
 from b3.functions import splitDSN
+from mock import patch
 from b3.storage.sqlite import SqliteStorage
 from tests import B3TestCase
 from tests.core.storage.common import StorageAPITest
@@ -34,6 +39,9 @@ SQLITE_DB = ":memory:"
 
 class Test_sqlite(B3TestCase, StorageAPITest):
 
+    # ON CONFLICT is available since SQLite 3.24
+    upsert_supported = sqlite3.sqlite_version_info >= (3, 24, 0)
+
     def setUp(self):
         """this method is called before each test"""
         B3TestCase.setUp(self)
@@ -57,6 +65,100 @@ class Test_sqlite(B3TestCase, StorageAPITest):
              'data',
             ]), set(self.storage.getTables()))
 
+    def test_queryBatch_rollback(self):
+        queries = self.storage.upsertQueries('aliases', ('id', 'alias'), [(1, 'foo')])
+        queries.append(("SELECT * FROM invalid_table", ()))
+        self.assertRaises(Exception, self.storage.queryBatch, queries)
+        cursor = self.storage.query("SELECT COUNT(*) AS cnt FROM aliases")
+        self.assertEqual(0, cursor.getRow()['cnt'])
+
+
+class Test_sqlite_pool(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.tmpdir = tempfile.mkdtemp()
+        dsn = 'sqlite://' + os.path.join(self.tmpdir, 'b3.db')
+        self.storage = self.console.storage = SqliteStorage(dsn, splitDSN(dsn), self.console)
+        self.storage.tuned = True
+        self.storage.connect()
+        self.storage.startPool(3)
+
+    def tearDown(self):
+        B3TestCase.tearDown(self)
+        self.storage.stopPool()
+        self.storage.shutdown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_wal_mode(self):
+        self.assertIsNotNone(self.storage._pool)
+        self.assertEqual('wal', self.storage.query("PRAGMA journal_mode").getValue('journal_mode'))
+
+    def test_read_while_writing(self):
+        self.storage.query("INSERT INTO aliases (alias, client_id) VALUES ('foo', 1)")
+        # the main connection is busy writing: reads go through the pool
+        with self.storage._lock:
+            self.storage.db.execute("BEGIN")
+            self.storage.db.execute("INSERT INTO aliases (alias, client_id) VALUES ('bar', 1)")
+            cursor = self.storage.query("SELECT COUNT(*) AS cnt FROM aliases")
+            self.assertEqual(1, cursor.getRow()['cnt'])
+            self.storage.db.execute("COMMIT")
+        cursor = self.storage.query("SELECT COUNT(*) AS cnt FROM aliases")
+        self.assertEqual(2, cursor.getRow()['cnt'])
+
+    def test_journal_mode_not_switched(self):
+        dsn = 'sqlite://' + os.path.join(self.tmpdir, 'untuned.db')
+        storage = SqliteStorage(dsn, splitDSN(dsn), self.console)
+        storage.connect()
+        storage.startPool(3)
+        self.assertIsNone(storage._pool)
+        self.assertEqual('delete', storage.query("PRAGMA journal_mode").getValue('journal_mode'))
+        storage.shutdown()
+
+    def test_memory_database_not_pooled(self):
+        storage = SqliteStorage('sqlite://:memory:', splitDSN('sqlite://:memory:'), self.console)
+        storage.connect()
+        storage.startPool(3)
+        self.assertIsNone(storage._pool)
+        storage.shutdown()
+
+
+class Test_sqlite_tuning(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.tmpdir = tempfile.mkdtemp()
+        dsn = 'sqlite://' + os.path.join(self.tmpdir, 'b3.db')
+        self.storage = self.console.storage = SqliteStorage(dsn, splitDSN(dsn), self.console)
+        self.storage.tuned = True
+        self.storage.connect()
+
+    def tearDown(self):
+        B3TestCase.tearDown(self)
+        self.storage.shutdown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_pragmas(self):
+        self.assertEqual('wal', self.storage.query("PRAGMA journal_mode").getValue('journal_mode'))
+        self.assertEqual(1, self.storage.query("PRAGMA synchronous").getValue('synchronous'))
+        self.assertEqual(-65536, self.storage.query("PRAGMA cache_size").getValue('cache_size'))
+        self.assertEqual(2, self.storage.query("PRAGMA auto_vacuum").getValue('auto_vacuum'))
+        self.assertIn('aliases', self.storage.getTables())
+
+    def test_maintenance(self):
+        self.storage.queryBatch([("INSERT INTO aliases (alias, client_id) VALUES (?, 1)", ('alias%s' % i,))
+                                 for i in xrange(5000)])
+        self.storage.truncateTable('aliases')
+        self.assertGreater(self.storage.query("PRAGMA freelist_count").getValue('freelist_count'), 0)
+        self.storage.maintenance()
+        self.assertEqual(0, self.storage.query("PRAGMA freelist_count").getValue('freelist_count'))
+
+    def test_startMaintenance(self):
+        with patch.object(self.console, '_cron') as cron_mock:
+            self.storage.startMaintenance()
+        self.assertEqual(1, cron_mock.add.call_count)
+        self.assertEqual(self.storage.maintenance, cron_mock.add.call_args[0][0].command)
+
 if __name__ == '__main__':
     nose.main()
     
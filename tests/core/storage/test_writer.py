@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import threading
+import unittest2 as unittest
+
+from b3.storage.writer import WriteFuture
+from b3.storage.writer import WriteQueue
+from mock import Mock
+
+
+class FakeStorage(object):
+    """
+    Storage applying the PostgreSQL transaction rules: once a query fails, the following ones fail as well until the
+    transaction (or the savepoint) is rolled back, and committing an aborted transaction rolls it back.
+    """
+    def __init__(self):
+        self.console = Mock()
+        self._lock = threading.Lock()
+        self.committed = []
+        self.pending = None
+        self.savepoint = None
+        self.aborted = False
+        self.fail_commit = False
+
+    def getConnection(self):
+        return True
+
+    def _execute(self, query, bindata=None):
+        if query == 'BEGIN':
+            self.pending = []
+        elif query == 'ROLLBACK':
+            self.pending = None
+            self.aborted = False
+        elif query == 'ROLLBACK TO SAVEPOINT b3_write':
+            del self.pending[self.savepoint:]
+            self.aborted = False
+        elif self.aborted:
+            raise Exception('current transaction is aborted')
+        elif query == 'SAVEPOINT b3_write':
+            self.savepoint = len(self.pending)
+        elif query == 'RELEASE SAVEPOINT b3_write':
+            pass
+        elif query == 'COMMIT':
+            if self.fail_commit:
+                raise Exception('could not commit')
+            self.committed.extend(self.pending)
+            self.pending = None
+        elif 'fail' in query:
+            self.aborted = self.pending is not None
+            raise Exception('query failed')
+        elif self.pending is not None:
+            self.pending.append(query)
+        else:
+            self.committed.append(query)
+        return Mock()
+
+
+class Test_WriteQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.writer = WriteQueue(self.storage)
+
+    def test_failing_query_does_not_abort_the_batch(self):
+        futures = [WriteFuture() for _ in range(3)]
+        self.writer._write(zip(['q1', 'fail', 'q3'], [None] * 3, futures))
+        self.assertListEqual(['q1', 'q3'], self.storage.committed)
+        self.assertIsNone(futures[0].exception(timeout=0))
+        self.assertIsNotNone(futures[1].exception(timeout=0))
+        self.assertIsNone(futures[2].exception(timeout=0))
+
+    def test_futures_are_resolved_once_committed(self):
+        self.storage.fail_commit = True
+        futures = [WriteFuture() for _ in range(2)]
+        self.assertRaises(Exception, self.writer._write, zip(['q1', 'q2'], [None] * 2, futures))
+        self.assertFalse(any(f.done() for f in futures))
+        self.assertListEqual([], self.storage.committed)
+
+    def test_commit_failure_is_reported_to_every_query(self):
+        self.storage.fail_commit = True
+        futures = [self.writer.put('q%s' % i) for i in range(3)]
+        self.writer.start()
+        self.assertTrue(self.writer.stop(timeout=5))
+        self.assertTrue(all(f.exception(timeout=0) is not None for f in futures))
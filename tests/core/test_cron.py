@@ -22,10 +22,13 @@
 #                                                                     #
 # ################################################################### #
 
+import calendar
+import threading
 import time
 import unittest2 as unittest
 from mock import sentinel, Mock
 from b3.cron import CronTab, OneTimeCronTab, PluginCronTab, Cron
+from b3.cron import OVERLAP_PARALLEL, OVERLAP_QUEUE, OVERLAP_SKIP
 from tests import B3TestCase
 
 class Test_Crontab(unittest.TestCase):
@@ -110,6 +113,59 @@ class Test_Crontab(unittest.TestCase):
         self.assertTrue(tab.match(time.gmtime()))
 
 
+class Test_Crontab_nextTime(unittest.TestCase):
+
+    def t(self, tab, *after):
+        ts = tab.nextTime(calendar.timegm(after + (0, 0, 0)))
+        return time.gmtime(ts)[:6] if ts is not None else None
+
+    def test_every_second(self):
+        tab = CronTab(None, second='*')
+        self.assertEqual((2015, 3, 1, 12, 0, 1), self.t(tab, 2015, 3, 1, 12, 0, 0))
+        self.assertEqual((2016, 1, 1, 0, 0, 0), self.t(tab, 2015, 12, 31, 23, 59, 59))
+
+    def test_every_minute(self):
+        tab = CronTab(None)
+        self.assertEqual((2015, 3, 1, 12, 1, 0), self.t(tab, 2015, 3, 1, 12, 0, 0))
+        self.assertEqual((2015, 3, 1, 12, 1, 0), self.t(tab, 2015, 3, 1, 12, 0, 30))
+
+    def test_steps(self):
+        tab = CronTab(None, second=30, minute='*/15')
+        self.assertEqual((2015, 3, 1, 12, 0, 30), self.t(tab, 2015, 3, 1, 12, 0, 0))
+        self.assertEqual((2015, 3, 1, 12, 15, 30), self.t(tab, 2015, 3, 1, 12, 0, 30))
+        self.assertEqual((2015, 3, 1, 13, 0, 30), self.t(tab, 2015, 3, 1, 12, 45, 30))
+
+    def test_hour_day_month(self):
+        tab = CronTab(None, second=0, minute=0, hour='3,20', day=15, month=6)
+        self.assertEqual((2015, 6, 15, 3, 0, 0), self.t(tab, 2015, 3, 1, 12, 0, 0))
+        self.assertEqual((2015, 6, 15, 20, 0, 0), self.t(tab, 2015, 6, 15, 3, 0, 0))
+        self.assertEqual((2016, 6, 15, 3, 0, 0), self.t(tab, 2015, 6, 15, 20, 0, 0))
+
+    def test_dow(self):
+        tab = CronTab(None, second=0, minute=0, hour=0, dow=0)  # monday (in crontab 0 is Mon)
+        self.assertEqual((2015, 3, 2, 0, 0, 0), self.t(tab, 2015, 2, 26, 12, 0, 0))
+
+    def test_never(self):
+        tab = CronTab(None, day=30, month=2)  # february 30th
+        self.assertIsNone(self.t(tab, 2015, 1, 1, 0, 0, 0))
+
+    def test_matches(self):
+        for tab in (CronTab(None, second='*/7', minute='5-40/3'), CronTab(None, second=59, hour='*/5', dow='1,3')):
+            ts = calendar.timegm((2015, 3, 1, 0, 0, 0, 0, 0, 0))
+            for _ in range(50):
+                nxt = tab.nextTime(ts)
+                self.assertTrue(tab.match(time.gmtime(nxt)))
+                for x in range(ts + 1, min(nxt, ts + 7200)):
+                    self.assertFalse(tab.match(time.gmtime(x)))
+                ts = nxt
+
+    def test_modified_tab_is_rescheduled(self):
+        tab = CronTab(None)
+        tab._cron = Mock()
+        tab.second = 30
+        tab._cron.reschedule.assert_called_once_with(tab)
+
+
 class Test_OneTimeCrontab(unittest.TestCase):
 
     def test_constructor(self):
@@ -253,5 +309,139 @@ class Test_Cron(B3TestCase):
         self.assertEqual(CronTab, type(self.cron._tabs[crontab_id]))
 
 
+def wait_for(condition, timeout=5):
+    """
+    Wait for a condition to become true (the cron threads may be slow to get scheduled).
+    """
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(.01)
+    return condition()
+
+
+class Test_Cron_run(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.cron = Cron(self.console)
+        self.cron.start()
+
+    def tearDown(self):
+        self.cron.stop()
+        B3TestCase.tearDown(self)
+
+    def test_one_time_tab(self):
+        ran = threading.Event()
+        tab = OneTimeCronTab(ran.set, second='*')
+        self.cron.add(tab)
+        self.assertTrue(ran.wait(3))
+        self.assertTrue(wait_for(lambda: id(tab) not in self.cron._tabs))
+        self.assertEqual(1, tab.numRuns)
+        self.assertListEqual([], [x for x in self.cron._heap if x[1] is not None])
+
+    def test_add_wakes_up_scheduler(self):
+        # a tab scheduled in the far future must not delay tabs added later
+        self.cron.create(Mock(), second=0, minute=0, hour=0, day=0, month=0)
+        time.sleep(.1)
+        ran = threading.Event()
+        self.cron.create(ran.set, second='*')
+        self.assertTrue(ran.wait(3))
+
+    def test_cancel(self):
+        command = Mock()
+        tab_id = self.cron.create(command, second='*')
+        self.cron.cancel(tab_id)
+        time.sleep(1.5)
+        self.assertFalse(command.called)
+        self.assertDictEqual({}, self.cron._entries)
+
+    def test_clock_change(self):
+        self.cron.create(Mock(), second=0, minute=0, hour=0)
+        self.assertTrue(wait_for(lambda: self.cron._waker._pipe is not None))
+        time.sleep(.2)  # let the cron thread go to sleep
+        tab = CronTab(Mock(), second=0, minute=0, hour=12)
+        self.cron._tabs[id(tab)] = tab  # not scheduled yet
+        self.cron.time = lambda: time.time() + 3600
+        self.cron._waker.wake()
+        self.assertTrue(wait_for(lambda: id(tab) in self.cron._entries))
+
+    def test_exception_in_command(self):
+        ran = threading.Event()
+        self.cron.create(Mock(side_effect=ValueError), second='*')
+        self.cron.create(ran.set, second='*')
+        self.assertTrue(ran.wait(3))
+
+
+class Test_Cron_workers(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.cron = Cron(self.console, workers=2)
+        self.cron.start()
+        self.release = threading.Event()
+        self.runs = []
+
+    def tearDown(self):
+        self.release.set()
+        self.cron.stop()
+        B3TestCase.tearDown(self)
+
+    def slow_command(self):
+        self.runs.append(time.time())
+        self.release.wait(5)
+
+    def submit_twice(self, overlap):
+        tab = CronTab(self.slow_command)
+        tab.overlap = overlap
+        tab_id = self.cron.add(tab)
+        results = [self.cron._submit(tab_id, tab)]
+        self.assertTrue(wait_for(lambda: len(self.runs) == 1))
+        results.append(self.cron._submit(tab_id, tab))
+        return results
+
+    def test_overlap_skip(self):
+        self.assertListEqual([True, False], self.submit_twice(OVERLAP_SKIP))
+        self.release.set()
+        self.assertTrue(wait_for(lambda: self.cron.getStats()['running'] == 0))
+        self.assertEqual(1, len(self.runs))
+        self.assertDictEqual({'Test_Cron_workers.slow_command': 1}, self.cron.getStats()['skipped'])
+
+    def test_overlap_queue(self):
+        self.assertListEqual([True, True], self.submit_twice(OVERLAP_QUEUE))
+        time.sleep(.1)
+        self.assertEqual(1, len(self.runs))
+        self.release.set()
+        self.assertTrue(wait_for(lambda: len(self.runs) == 2))
+
+    def test_overlap_parallel(self):
+        self.assertListEqual([True, True], self.submit_twice(OVERLAP_PARALLEL))
+        self.assertTrue(wait_for(lambda: len(self.runs) == 2))
+
+    def test_slow_job_does_not_delay_other_jobs(self):
+        tab = CronTab(self.slow_command)
+        self.cron._submit(self.cron.add(tab), tab)
+        done = threading.Event()
+        tab2 = CronTab(done.set)
+        self.cron._submit(self.cron.add(tab2), tab2)
+        self.assertTrue(done.wait(3))
+
+    def test_run_times(self):
+        self.cron.slowJob = 0
+        self.console.warning = Mock()
+        self.submit_twice(OVERLAP_SKIP)
+        self.release.set()
+        self.assertTrue(wait_for(lambda: self.console.warning.called))
+        self.assertTrue(wait_for(lambda: self.cron.getStats()['running'] == 0))
+        self.assertEqual(1, self.cron.getStats()['jobs']['Test_Cron_workers.slow_command']['count'])
+
+    def test_inline(self):
+        cron = Cron(self.console)
+        tab = CronTab(self.slow_command)
+        self.release.set()
+        self.assertTrue(cron._submit(id(tab), tab))
+        self.assertEqual(1, len(self.runs))
+        self.assertEqual(1, cron.getStats()['jobs']['Test_Cron_workers.slow_command']['count'])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
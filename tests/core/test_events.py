@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import Queue
+import threading
+import time
+import unittest2 as unittest
+from mock import Mock
+from b3.events import Event
+from b3.events import EventQueue
+from b3.events import EventsStats
+from b3.events import LatencyHistogram
+from b3.events import EventWorkers
+
+
+class Test_EventQueue(unittest.TestCase):
+
+    def test_put_many(self):
+        queue = EventQueue()
+        self.assertEqual(3, queue.put_many([1, 2, 3]))
+        queue.put(4)
+        self.assertListEqual([1, 2, 3, 4], [queue.get(False) for _ in range(4)])
+
+    def test_put_many_full(self):
+        queue = EventQueue(2)
+        self.assertRaises(Queue.Full, queue.put_many, [1, 2, 3], False)
+        self.assertEqual(2, queue.qsize())
+        self.assertRaises(Queue.Full, queue.put_many, [3], True, 0.01)
+
+    def test_put_many_waits_for_consumer(self):
+        queue = EventQueue(2)
+        consumed = []
+
+        def consume():
+            for _ in range(10):
+                consumed.append(queue.get(True, 2))
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        self.assertEqual(10, queue.put_many(range(10), True, 2))
+        consumer.join()
+        self.assertListEqual(range(10), consumed)
+
+
+class Test_EventWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.lock = threading.Lock()
+        self.console = Mock()
+        self.console.handleEvent = self.handleEvent
+        self.workers = EventWorkers(self.console, 4)
+
+    def tearDown(self):
+        self.workers.stop()
+
+    def handleEvent(self, added, expire, event):
+        if event.data == 'slow':
+            time.sleep(.05)
+        with self.lock:
+            self.handled.append((event.client.cid if event.client else None, event.data))
+
+    def dispatch(self, client, data, target=None):
+        self.workers.dispatch(time.time(), time.time() + 10, Event(1, data, client, target))
+
+    def test_events_of_a_client_are_handled_in_order(self):
+        clients = [Mock(cid=str(x)) for x in range(8)]
+        for i in range(20):
+            for client in clients:
+                self.dispatch(client, 'slow' if i == 0 else i)
+        self.workers.join()
+        for client in clients:
+            self.assertListEqual(['slow'] + range(1, 20), [d for (cid, d) in self.handled if cid == client.cid])
+
+    def test_events_without_client_wait_for_previous_events(self):
+        self.dispatch(Mock(cid='1'), 'slow')
+        self.dispatch(Mock(cid='2'), 'slow')
+        self.dispatch(None, 'round end')
+        self.assertEqual((None, 'round end'), self.handled[-1])
+        self.assertEqual(3, len(self.handled))
+
+    def test_events_with_target_are_handled_in_order_for_the_target(self):
+        # pick a victim handled by another worker than the killer
+        killer = Mock(cid='1')
+        victim = [Mock(cid=str(x)) for x in range(2, 20)
+                  if self.workers._queueFor(Mock(cid=str(x))) is not self.workers._queueFor(killer)][0]
+        self.dispatch(killer, 'slow')
+        self.dispatch(killer, 'kill', victim)
+        self.dispatch(victim, 'disconnect')
+        self.workers.join()
+        self.assertListEqual(['slow', 'kill', 'disconnect'], [d for (cid, d) in self.handled])
+
+    def test_events_with_target_on_the_same_worker(self):
+        killer = Mock(cid='1')
+        self.dispatch(killer, 'slow')
+        self.dispatch(killer, 'suicide', killer)
+        self.workers.join()
+        self.assertListEqual(['slow', 'suicide'], [d for (cid, d) in self.handled])
+
+    def test_stop_handles_pending_events(self):
+        for i in range(10):
+            self.dispatch(Mock(cid='1'), i)
+        self.workers.stop()
+        self.assertListEqual(range(10), [d for (cid, d) in self.handled])
+
+
+class Test_LatencyHistogram(unittest.TestCase):
+
+    def setUp(self):
+        self.histogram = LatencyHistogram()
+
+    def test_empty(self):
+        self.assertDictEqual({'count': 0, 'min': 0, 'max': 0, 'mean': 0, 'stddev': 0, 'p50': 0, 'p95': 0, 'p99': 0},
+                             self.histogram.summary())
+
+    def test_percentiles(self):
+        for x in range(1, 1001):
+            self.histogram.record(x)
+        self.assertEqual(1000, self.histogram.count)
+        self.assertEqual(1, self.histogram.min)
+        self.assertEqual(1000, self.histogram.max)
+        self.assertAlmostEqual(500.5, self.histogram.mean())
+        self.assertAlmostEqual(288.8194, self.histogram.stddev(), places=3)
+        # log-linear buckets: relative error below 1/16
+        for percent in (50, 95, 99):
+            self.assertAlmostEqual(percent * 10, self.histogram.percentile(percent), delta=percent * 10 / 16.0)
+        self.assertEqual(1000, self.histogram.percentile(100))
+
+    def test_small_values_are_exact(self):
+        for x in (0.001, 0.002, 0.003, 0.004):
+            self.histogram.record(x)
+        self.assertAlmostEqual(0.002, self.histogram.percentile(50))
+        self.assertAlmostEqual(0.004, self.histogram.percentile(99))
+
+    def test_out_of_range_values(self):
+        self.histogram.record(-1)
+        self.histogram.record(10 ** 8)
+        self.assertEqual(2, self.histogram.count)
+        self.assertEqual(10 ** 8, self.histogram.percentile(100))
+
+    def test_bucket_ranges(self):
+        for value in (0, 1, 31, 32, 33, 63, 64, 1000, 123456, 2 ** 32 - 1):
+            lowest, highest = self.histogram._bucketRange(self.histogram._bucketIndex(value))
+            self.assertLessEqual(lowest, value)
+            self.assertGreaterEqual(highest, value)
+
+
+class Test_EventsStats(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.console.queue = EventQueue(50)
+        self.stats = EventsStats(self.console)
+
+    def test_getStats(self):
+        self.console.queue.put(1)
+        self.stats.add_event_handled('AdminPlugin', 'EVT_CLIENT_SAY', 2)
+        self.stats.add_event_handled('AdminPlugin', 'EVT_CLIENT_SAY', 4)
+        self.stats.add_event_wait(3)
+        self.stats.add_event_expired('EVT_CLIENT_KILL')
+        self.stats.add_event_expired('EVT_CLIENT_KILL')
+        self.stats.add_event_vetoed('SpamcontrolPlugin', 'EVT_CLIENT_SAY')
+        stats = self.stats.getStats()
+        self.assertEqual(1, stats['queue']['size'])
+        self.assertEqual(50, stats['queue']['maxsize'])
+        self.assertEqual(1, stats['queue']['wait']['count'])
+        self.assertEqual(2, stats['handlers']['AdminPlugin']['EVT_CLIENT_SAY']['count'])
+        self.assertEqual(4, stats['handlers']['AdminPlugin']['EVT_CLIENT_SAY']['max'])
+        self.assertDictEqual({'EVT_CLIENT_KILL': 2}, stats['expired'])
+        self.assertDictEqual({'SpamcontrolPlugin': {'EVT_CLIENT_SAY': 1}}, stats['vetoed'])
+
+    def test_dumpStats(self):
+        self.stats.add_event_handled('AdminPlugin', 'EVT_CLIENT_SAY', 2)
+        self.stats.add_event_wait(3)
+        self.stats.dumpStats()
+        self.assertEqual(1, self.console.verbose.call_count)
+        self.assertEqual(1, self.console.debug.call_count)
+
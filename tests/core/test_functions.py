@@ -242,4 +242,11 @@ class Test_topologicalSort(unittest.TestCase):
                     ('myplugin1', {}),
                     ('myplugin5', {'myplugin1', 'myplugin3', 'myplugin4'})]
         sorted_list = [x for x in functions.topological_sort(dep_list)]
-        self.assertListEqual(sorted_list, ['myplugin3', 'myplugin1', 'myplugin2', 'myplugin4', 'myplugin5'])
\ No newline at end of file
+        self.assertListEqual(sorted_list, ['myplugin3', 'myplugin1', 'myplugin2', 'myplugin4', 'myplugin5'])
+
+class Test_monotonic(unittest.TestCase):
+
+    def test_monotonic(self):
+        values = [functions.monotonic() for _ in range(100)]
+        self.assertListEqual(sorted(values), values)
+        self.assertIsInstance(values[0], float)
@@ -23,8 +23,15 @@
 # ################################################################### #
 
 import logging
+import os
+import sys
+import tempfile
 import unittest2 as unittest
+from mock import Mock
 from b3.clients import Client
+from b3.events import Event
+from b3.events import VetoEvent
+from b3.functions import monotonic
 from b3.parser import Parser
 
 
@@ -173,4 +180,174 @@ class Test_getWrap(unittest.TestCase):
 
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
+
+
+class Test_read_input_batch(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = DummyParser()
+        self.parser._linesPending = []
+        self.parser._lineBuffer = ''
+        self.parser.batchMaxLines = 3
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.writer = open(self.path, 'a')
+        self.reader = open(self.path, 'r')
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+        os.unlink(self.path)
+
+    def write(self, data):
+        self.writer.write(data)
+        self.writer.flush()
+
+    def read(self):
+        return self.parser._Parser__read_input_batch(self.reader)
+
+    def test_nothing_new(self):
+        self.assertListEqual([], self.read())
+
+    def test_complete_lines(self):
+        self.write('0:00 InitGame: \\sv_maxclients\\16\n0:01 Item: 0 ut_weapon_ump45\n')
+        self.assertListEqual(['0:00 InitGame: \\sv_maxclients\\16', '0:01 Item: 0 ut_weapon_ump45'], self.read())
+        self.assertListEqual([], self.read())
+
+    def test_incomplete_line_kept_for_next_read(self):
+        self.write('0:00 Item: 0 ut_weapon_ump45\n0:01 Kill: 0 1 16: Jo')
+        self.assertListEqual(['0:00 Item: 0 ut_weapon_ump45'], self.read())
+        self.write('e killed Jack by UT_MOD_SPAS\n')
+        self.assertListEqual(['0:01 Kill: 0 1 16: Joe killed Jack by UT_MOD_SPAS'], self.read())
+
+    def test_max_lines_per_batch(self):
+        self.write(''.join('0:%02d Item: 0 ut_weapon_ump45\n' % i for i in range(7)))
+        self.assertEqual(3, len(self.read()))
+        self.write('0:07 Item: 0 ut_weapon_ump45\n')
+        self.assertEqual(3, len(self.read()))
+        lines = self.read()
+        self.assertListEqual(['0:06 Item: 0 ut_weapon_ump45', '0:07 Item: 0 ut_weapon_ump45'], lines)
+        self.assertListEqual([], self.read())
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on Linux')
+class Test_FileWatcher(unittest.TestCase):
+
+    def setUp(self):
+        from b3.lib.inotify import FileWatcher
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.watcher = FileWatcher(self.path)
+
+    def tearDown(self):
+        self.watcher.close()
+        os.unlink(self.path)
+
+    def test_wait_timeout(self):
+        self.assertFalse(self.watcher.wait(0.01))
+
+    def test_wait_file_modified(self):
+        with open(self.path, 'a') as f:
+            f.write('0:00 Item: 0 ut_weapon_ump45\n')
+        self.assertTrue(self.watcher.wait(1))
+        self.assertFalse(self.watcher.wait(0.01))
+
+
+class Test_handleEvent(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = DummyParser()
+        self.parser._eventsStats = Mock()
+        self.parser.getEventName = Mock(return_value='EVT_CUSTOM')
+        self.handler1 = Mock()
+        self.handler2 = Mock()
+        self.parser._handlers = {1: [self.handler1, self.handler2]}
+
+    def test_handlers_called(self):
+        event = Event(1, 'f00')
+        self.parser.handleEvent(monotonic(), monotonic() + 10, event)
+        self.handler1.parseEvent.assert_called_once_with(event)
+        self.handler2.parseEvent.assert_called_once_with(event)
+
+    def test_veto(self):
+        self.handler1.parseEvent.side_effect = VetoEvent
+        self.parser.handleEvent(monotonic(), monotonic() + 10, Event(1, 'f00'))
+        self.assertFalse(self.handler2.parseEvent.called)
+        self.parser._eventsStats.add_event_vetoed.assert_called_once_with('Mock', 'EVT_CUSTOM')
+
+    def test_expired(self):
+        self.parser.handleEvent(monotonic() - 20, monotonic() - 10, Event(1, 'f00'))
+        self.assertFalse(self.handler1.parseEvent.called)
+        self.assertFalse(self.handler2.parseEvent.called)
+        self.parser._eventsStats.add_event_expired.assert_called_once_with('EVT_CUSTOM')
+
+
+class Test_queueEvent(unittest.TestCase):
+
+    def setUp(self):
+        from b3.events import EventQueue
+        self.parser = DummyParser()
+        self.parser.getEventName = Mock(return_value='EVT_CUSTOM')
+        self.parser._handlers = {1: [Mock()]}
+        self.parser.queue = EventQueue(10)
+
+    def test_no_handler(self):
+        self.assertFalse(self.parser.queueEvent(Event(2, 'f00')))
+        self.assertEqual(0, self.parser.queue.qsize())
+
+    def test_events_queued_in_order(self):
+        events = [Event(1, x) for x in range(5)]
+        for event in events:
+            self.assertTrue(self.parser.queueEvent(event))
+        self.assertListEqual(events, [self.parser.queue.get(False)[2] for _ in range(5)])
+
+    def test_buffered_events(self):
+        import thread
+        self.parser._eventsBufferThread = thread.get_ident()
+        self.parser._eventsBuffer = []
+        events = [Event(1, x) for x in range(5)]
+        for event in events:
+            self.assertTrue(self.parser.queueEvent(event))
+        self.assertEqual(0, self.parser.queue.qsize())
+        self.parser.flushEvents()
+        self.assertIsNone(self.parser._eventsBuffer)
+        self.assertListEqual(events, [self.parser.queue.get(False)[2] for _ in range(5)])
+
+
+class Test_events_subscriptions(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = DummyParser()
+        self.parser._handlers = {}
+        self.parser.Events = Mock()
+        self.parser._events = {'EVT_CLIENT_KILL': 16, 'EVT_CLIENT_DAMAGE': 22}
+        self.plugin1 = Mock()
+        self.plugin1.isEnabled.return_value = True
+        self.plugin2 = Mock()
+        self.plugin2.isEnabled.return_value = True
+
+    def test_nothing_subscribed(self):
+        self.assertFalse(self.parser.isEventSubscribed('EVT_CLIENT_KILL'))
+        self.assertFalse(self.parser.isEventSubscribed(16))
+
+    def test_register_unregister(self):
+        self.parser.registerHandler(16, self.plugin1)
+        self.parser.registerHandler(16, self.plugin2)
+        self.assertTrue(self.parser.isEventSubscribed('EVT_CLIENT_KILL'))
+        self.assertTrue(self.parser.isEventSubscribed(16))
+        self.assertFalse(self.parser.isEventSubscribed('EVT_CLIENT_DAMAGE'))
+        self.assertTrue(self.parser.isEventSubscribed('EVT_CLIENT_DAMAGE', 'EVT_CLIENT_KILL'))
+        self.parser.unregisterHandler(self.plugin1)
+        self.assertTrue(self.parser.isEventSubscribed('EVT_CLIENT_KILL'))
+        self.parser.unregisterHandler(self.plugin2)
+        self.assertFalse(self.parser.isEventSubscribed('EVT_CLIENT_KILL'))
+
+    def test_disabled_handlers(self):
+        self.parser.registerHandler(16, self.plugin1)
+        self.plugin1.isEnabled.return_value = False
+        self.parser.updateEventsSubscriptions()
+        self.assertFalse(self.parser.isEventSubscribed('EVT_CLIENT_KILL'))
+        self.plugin1.isEnabled.return_value = True
+        self.parser.updateEventsSubscriptions()
+        self.assertTrue(self.parser.isEventSubscribed('EVT_CLIENT_KILL'))
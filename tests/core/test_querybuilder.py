@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import unittest2 as unittest
+
+from b3.querybuilder import QueryBuilder
+
+
+class Test_QueryBuilder_escaped(unittest.TestCase):
+
+    def setUp(self):
+        self.qb = QueryBuilder()
+
+    def test_SelectQuery(self):
+        self.assertEqual('SELECT * FROM clients WHERE `id` = 3 LIMIT 1',
+                         self.qb.SelectQuery('*', 'clients', {'id': 3}, None, 1))
+        self.assertIsNone(self.qb.bindata())
+
+    def test_FieldClause(self):
+        self.assertEqual('`name` = "foo \\"bar\\""', self.qb.FieldClause('name', 'foo "bar"'))
+        self.assertEqual('`name` LIKE \'%foo%\'', self.qb.FieldClause('%name%', 'foo'))
+        self.assertEqual('`name` LIKE \'foo%\'', self.qb.FieldClause('name%', 'foo'))
+        self.assertEqual('`type` IN("Ban","TempBan")', self.qb.FieldClause('type', ('Ban', 'TempBan')))
+        self.assertEqual('`name` = ""', self.qb.FieldClause('name', None))
+
+    def test_InsertQuery(self):
+        self.assertEqual('INSERT INTO aliases(`alias`) VALUES ("None")', self.qb.InsertQuery({'alias': None}, 'aliases'))
+
+
+class Test_QueryBuilder_bind_parameters(unittest.TestCase):
+
+    def setUp(self):
+        self.qb = QueryBuilder(placeholder='?')
+
+    def test_SelectQuery(self):
+        self.assertEqual('SELECT * FROM clients WHERE `id` = ? LIMIT 1',
+                         self.qb.SelectQuery('*', 'clients', {'id': 3}, None, 1))
+        self.assertTupleEqual((3,), self.qb.bindata())
+
+    def test_FieldClause(self):
+        self.assertEqual('`name` = ?', self.qb.FieldClause('name', 'foo "bar"'))
+        self.assertEqual('`name` LIKE ?', self.qb.FieldClause('%name%', 'foo'))
+        self.assertEqual('`name` LIKE ?', self.qb.FieldClause('name%', 'foo'))
+        self.assertEqual('`type` IN(?,?)', self.qb.FieldClause('type', ('Ban', 'TempBan')))
+        self.assertEqual('`name` = ?', self.qb.FieldClause('name', None))
+        self.assertTupleEqual(('foo "bar"', '%foo%', 'foo%', 'Ban', 'TempBan', ''), self.qb.bindata())
+
+    def test_UpdateQuery(self):
+        self.assertEqual('UPDATE clients SET `name` = ? WHERE `id` = ?',
+                         self.qb.UpdateQuery({'name': 'foo'}, 'clients', {'id': 3}))
+        self.assertTupleEqual(('foo', 3), self.qb.bindata())
+
+    def test_InsertQuery(self):
+        self.assertEqual('INSERT INTO aliases(`alias`) VALUES (?)', self.qb.InsertQuery({'alias': None}, 'aliases'))
+        self.assertTupleEqual(('None',), self.qb.bindata())
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# ################################################################### #
+#                                                                     #
+#  BigBrotherBot(B3) (www.bigbrotherbot.net)                          #
+#  Copyright (C) 2005 Michael "ThorN" Thornton                        #
+#                                                                     #
+#  This program is free software; you can redistribute it and/or      #
+#  modify it under the terms of the GNU General Public License        #
+#  as published by the Free Software Foundation; either version 2     #
+#  of the License, or (at your option) any later version.             #
+#                                                                     #
+#  This program is distributed in the hope that it will be useful,    #
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of     #
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the       #
+#  GNU General Public License for more details.                       #
+#                                                                     #
+#  You should have received a copy of the GNU General Public License  #
+#  along with this program; if not, write to the Free Software        #
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA      #
+#  02110-1301, USA.                                                   #
+#                                                                     #
+# ################################################################### #
+
+import json
+import urllib2
+import unittest2 as unittest
+from mock import Mock
+from b3.statsserver import StatsServer
+
+
+class Test_StatsServer(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.stats = Mock(return_value={'queue': {'size': 3}})
+        self.cron = Mock(return_value={'tabs': 2})
+        self.server = StatsServer(self.console, {'stats': self.stats, 'cron': self.cron}, '127.0.0.1', 0)
+        self.server.start()
+        self.url = 'http://127.0.0.1:%s' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_get_stats(self):
+        response = urllib2.urlopen(self.url + '/stats', timeout=5)
+        self.assertEqual('application/json', response.info().gettype())
+        self.assertDictEqual({'queue': {'size': 3}}, json.loads(response.read()))
+
+    def test_default_path(self):
+        response = urllib2.urlopen(self.url, timeout=5)
+        self.assertDictEqual({'queue': {'size': 3}}, json.loads(response.read()))
+
+    def test_get_cron(self):
+        response = urllib2.urlopen(self.url + '/cron', timeout=5)
+        self.assertDictEqual({'tabs': 2}, json.loads(response.read()))
+
+    def test_not_found(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            urllib2.urlopen(self.url + '/foo', timeout=5)
+        self.assertEqual(404, cm.exception.code)
+
+    def test_read_only(self):
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            urllib2.urlopen(self.url + '/stats', data='foo', timeout=5)
+        self.assertEqual(501, cm.exception.code)
+        self.assertFalse(self.stats.called)
@@ -66,7 +66,7 @@ class Bf3TestCase(unittest.TestCase):
             self.console = Bf3Parser(self.parser_conf)
 
         # alter a few settings to speed up the tests
-        self.console.sayqueue_get_timeout = 0
+        self.console.sayqueue_get_timeout = 0.01
         self.console._message_delay = 0
 
         with logging_disabled():
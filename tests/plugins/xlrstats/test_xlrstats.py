@@ -24,6 +24,7 @@
 
 import logging
 import os
+import sqlite3
 from textwrap import dedent
 
 from mock import Mock
@@ -35,6 +36,7 @@ from b3 import __file__ as b3_module__file__
 from b3 import TEAM_RED
 from b3 import TEAM_BLUE
 from b3.config import CfgConfigParser
+from b3.plugins.xlrstats import PlayerStats
 from b3.plugins.xlrstats import XlrstatsPlugin
 from b3.fake import FakeClient
 from b3.plugins.admin import AdminPlugin
@@ -351,6 +353,154 @@ class Test_kill(XlrstatsTestCase):
         self.console.verbose.assert_called_with("XlrstatsPlugin: bot involved: do not process!")
 
 
+class Test_stats_cache(XlrstatsTestCase):
+    """
+    Validates that the stats are read from and written to the database only when needed
+    """
+
+    def setUp(self):
+        XlrstatsTestCase.setUp(self)
+        self.init()
+        self.p1 = FakeClient(console=self.console, name="P1", guid="P1_GUID", team=TEAM_BLUE)
+        self.p1.connects("1")
+        self.p1.says("!register")
+        self.p2 = FakeClient(console=self.console, name="P2", guid="P2_GUID", team=TEAM_RED)
+        self.p2.connects("2")
+        self.p2.says("!register")
+        self.p._xlrstats_active = True
+
+    def stored_kills(self, client):
+        cursor = self.console.storage.query("SELECT kills FROM %s WHERE client_id = %s" % (self.p.playerstats_table, client.id))
+        return cursor.getRow()['kills']
+
+    def test_kill_does_not_read_database(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p.query = Mock(wraps=self.p.query)
+        # WHEN
+        self.p1.kills(self.p2)
+        # THEN
+        self.assertListEqual([], self.p.query.mock_calls)
+        self.assertEqual(2, self.p.get_PlayerStats(self.p1).kills)
+
+    def test_changes_are_written_on_flush(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p1.kills(self.p2)
+        self.assertEqual(1, self.stored_kills(self.p1))
+        # WHEN
+        self.p.flushStats()
+        # THEN
+        self.assertEqual(2, self.stored_kills(self.p1))
+
+    def test_changes_are_written_on_round_end(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p1.kills(self.p2)
+        # WHEN
+        self.console.queueEvent(self.console.getEvent('EVT_GAME_ROUND_END'))
+        # THEN
+        self.assertEqual(2, self.stored_kills(self.p1))
+
+    def test_changes_are_written_on_disconnect(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p1.kills(self.p2)
+        p1_id = self.p1.id
+        # WHEN
+        self.p1.disconnects()
+        # THEN
+        self.assertEqual(2, self.stored_kills(self.p1))
+        self.assertIsNone(self.p._statsCache.get((PlayerStats, (p1_id,))))
+        self.assertIsNotNone(self.p._statsCache.get((PlayerStats, (self.p2.id,))))
+
+    def test_flush_single_transaction(self):
+        # GIVEN
+        self.console.game.mapName = 'ut4_turnpike'
+        self.p1.kills(self.p2, weapon='mp5', hit_location='head')
+        self.p1.kills(self.p2, weapon='mp5', hit_location='head')
+        self.console.storage.queryBatch = Mock(wraps=self.console.storage.queryBatch)
+        # WHEN
+        self.p.flushStats()
+        # THEN
+        self.assertEqual(1, self.console.storage.queryBatch.call_count)
+        queries = self.console.storage.queryBatch.call_args[0][0]
+        tables = sorted(q.split()[2] for q, _ in queries)
+        self.assertListEqual(sorted(['xlr_playerstats', 'xlr_opponents', 'xlr_weaponstats', 'xlr_weaponusage',
+                                     'xlr_bodyparts', 'xlr_playerbody', 'xlr_mapstats', 'xlr_playermaps']), tables)
+        self.assertEqual(2, self.stored_kills(self.p1))
+
+    def test_flush_non_ascii_name(self):
+        # GIVEN a player whose fixed name has non-ASCII bytes
+        self.p1.kills(self.p2)
+        self.p.flushStats()
+        playerstats = self.p.get_PlayerStats(self.p1)
+        playerstats.fixed_name = 'Ren\xe9'
+        self.p.save_Stat(playerstats)
+        self.p1.kills(self.p2)
+        self.console.storage.queryBatch = Mock(wraps=self.console.storage.queryBatch)
+        # WHEN
+        with patch.object(self.p, 'warning') as warning_mock:
+            self.p.flushStats()
+        # THEN the rows are still written with the multi-row upserts
+        if sqlite3.sqlite_version_info >= (3, 24, 0):
+            self.assertEqual(1, self.console.storage.queryBatch.call_count)
+            self.assertEqual(0, warning_mock.call_count)
+        self.assertEqual(2, self.stored_kills(self.p1))
+        cursor = self.console.storage.query("SELECT fixed_name FROM %s WHERE client_id = %s" %
+                                            (self.p.playerstats_table, self.p1.id))
+        self.assertEqual(u'Ren\xe9', cursor.getRow()['fixed_name'])
+
+    def test_flush_falls_back_to_single_updates(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p1.kills(self.p2)
+        self.console.storage.queryBatch = Mock(side_effect=Exception('no upsert support'))
+        # WHEN
+        self.p.flushStats()
+        # THEN
+        self.assertEqual(2, self.stored_kills(self.p1))
+
+    def test_write_immediately(self):
+        # GIVEN
+        self.p.flush_interval = 0
+        # WHEN
+        self.p1.kills(self.p2)
+        self.p1.kills(self.p2)
+        # THEN
+        self.assertEqual(2, self.stored_kills(self.p1))
+
+    def test_flush_interval_is_a_divisor_of_60(self):
+        for value, expected in (('0', 0), ('-5', 0), ('15', 15), ('45', 30), ('59', 30), ('90', 30), ('7', 6)):
+            self.conf.set('settings', 'flush_interval', value)
+            self.p.onLoadConfig()
+            self.assertEqual(expected, self.p.flush_interval)
+
+    def test_unsaved_changes_are_discarded(self):
+        # GIVEN
+        s = self.p.get_PlayerStats(self.p1)
+        s.kills = 99
+        # WHEN
+        s2 = self.p.get_PlayerStats(self.p1)
+        # THEN
+        self.assertEqual(0, s2.kills)
+
+    def test_new_row_inserted_once(self):
+        # GIVEN two copies of a new row
+        s1 = self.p.get_WeaponStats('the weapon')
+        s2 = self.p.get_WeaponStats('the weapon')
+        # WHEN
+        s1.kills += 1
+        self.p.save_Stat(s1)
+        s2.kills += 2
+        self.p.save_Stat(s2)
+        self.p.flushStats()
+        # THEN
+        self.assertEqual(s1.id, s2.id)
+        cursor = self.console.storage.query("SELECT COUNT(*) AS cnt FROM %s WHERE name = 'the weapon'" % self.p.weaponstats_table)
+        self.assertEqual(1, cursor.getRow()['cnt'])
+
+
 class Test_storage(XlrstatsTestCase):
 
     def setUp(self):